@@ -0,0 +1,147 @@
+import collections
+import concurrent.futures
+import datetime
+import logging
+import queue
+import threading
+from typing import Callable, Optional, Sequence
+
+import numpy
+
+from . import _clips
+
+logger = logging.getLogger(__name__)
+
+# Alerts are rare (each one triggers a cooldown), so a handful of slots is
+# plenty to absorb one being encoded while another is detected.
+_DEFAULT_QUEUE_SIZE = 4
+
+_Alert = collections.namedtuple(
+    "_Alert", ("matcher_name", "detected_at", "samples", "samplerate", "segments")
+)
+
+# An encoded alert clip, and the name and mime type to attach it as
+Clip = collections.namedtuple("Clip", ("filename", "data", "mime_type"))
+
+
+class Alerter:
+    """Encode alert clips and deliver notifications on a background thread.
+
+    Alerts are handed over through a bounded queue so the analysis loop never
+    waits on encoding or delivery. If the queue is full the new alert is
+    dropped (and logged): the alerts already queued cover the same audio.
+    """
+
+    def __init__(
+        self,
+        stream_name: str,
+        problem_callback: Callable[[str, str, Clip], None],
+        *,
+        queue_size: int = _DEFAULT_QUEUE_SIZE,
+        clip_settings: _clips.ClipSettings = _clips.DEFAULT_SETTINGS,
+    ) -> None:
+        self._stream_name = stream_name
+        self._clip_settings = clip_settings
+        self._problem_callback = problem_callback
+        self._queue: "queue.Queue[Optional[_Alert]]" = queue.Queue(maxsize=queue_size)
+
+        # How many alerts were delivered, dropped or failed to be delivered
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self._thread = threading.Thread(
+            target=self._run, name=f"alerter-{stream_name}", daemon=True
+        )
+        self._thread.start()
+
+    def submit(
+        self,
+        matcher_name: str,
+        samples: numpy.ndarray,
+        samplerate: int,
+        segments: Sequence[concurrent.futures.Future] = (),
+    ) -> bool:
+        """Queue an alert, with the clip to attach.
+
+        The clip is either encoded from the samples, or made of segments
+        already encoded (see clips.SegmentEncoder) followed by the samples.
+        """
+
+        alert = _Alert(
+            matcher_name=matcher_name,
+            detected_at=datetime.datetime.now(),
+            samples=samples,
+            samplerate=samplerate,
+            segments=segments,
+        )
+
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(
+                f"Dropping alert for stream '{self._stream_name}' flagged by "
+                f"{matcher_name}: too many alerts are already pending"
+            )
+            return False
+
+        return True
+
+    def close(self) -> None:
+        """Deliver any pending alerts and stop the worker thread."""
+
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            alert = self._queue.get()
+            if alert is None:
+                return
+
+            try:
+                self._deliver(alert)
+                self.sent += 1
+            except Exception:
+                self.failed += 1
+                logger.exception(
+                    f"Unable to deliver alert for stream '{self._stream_name}'"
+                )
+
+    def _deliver(self, alert: _Alert) -> None:
+        datestamp = alert.detected_at.strftime("%Y-%m-%d")
+        timestamp = alert.detected_at.strftime("%H:%M:%S")
+        tags = {
+            "artist": "Stream Monitor",
+            "title": f"Problematic audio from stream {self._stream_name} on {datestamp} at {timestamp}",
+        }
+
+        settings = self._clip_settings
+        if alert.segments:
+            # Clips in these formats can simply be concatenated. Only MP3
+            # frames can be tagged after the fact.
+            chunks = list()
+            if settings.format == "mp3":
+                chunks.append(_clips.id3_tag(tags))
+            chunks.extend(segment.result() for segment in alert.segments)
+            if len(alert.samples):
+                chunks.append(
+                    _clips.encode(
+                        self._stream_name, alert.samples, alert.samplerate, settings
+                    )
+                )
+            data = b"".join(chunks)
+        else:
+            data = _clips.encode(
+                self._stream_name, alert.samples, alert.samplerate, settings, tags
+            )
+
+        clip_format = _clips.FORMATS[settings.format]
+        clip = Clip(
+            f"{self._stream_name}_{datestamp}_{timestamp}.{clip_format.extension}",
+            data,
+            clip_format.mime_type,
+        )
+        self._problem_callback(self._stream_name, alert.matcher_name, clip)
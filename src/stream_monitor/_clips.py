@@ -0,0 +1,219 @@
+import collections
+import concurrent.futures
+import struct
+import subprocess
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy
+
+from . import _errors, _window
+
+
+# How to encode each clip format: the ffmpeg codec and muxer, the extension
+# and mime type to attach it with, and whether separately encoded pieces can
+# be concatenated
+ClipFormat = collections.namedtuple(
+    "ClipFormat", ("codec", "muxer", "extension", "mime_type", "concatenable")
+)
+
+FORMATS = {
+    "mp3": ClipFormat("libmp3lame", "mp3", "mp3", "audio/mpeg", True),
+    # Concatenated Ogg streams are simply chained
+    "opus": ClipFormat("libopus", "ogg", "opus", "audio/ogg", True),
+    "flac": ClipFormat("flac", "flac", "flac", "audio/flac", False),
+}
+
+# Opus only supports a few samplerates; this is the one it works at internally
+_OPUS_SAMPLERATE = 48000
+
+# Format, bitrate (kbit/s, or None for the codec's default) and channels
+ClipSettings = collections.namedtuple("ClipSettings", ("format", "bitrate", "channels"))
+DEFAULT_SETTINGS = ClipSettings("mp3", None, 1)
+
+
+def _ffmpeg_command(
+    samplerate: int, settings: ClipSettings, tags: Optional[Dict[str, str]]
+) -> List[str]:
+    clip_format = FORMATS[settings.format]
+    command = [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-f",
+        "s16le",
+        "-ar",
+        str(samplerate),
+        "-ac",
+        "1",
+        "-i",
+        "pipe:0",
+        "-c:a",
+        clip_format.codec,
+        "-ac",
+        str(settings.channels),
+    ]
+    if settings.bitrate and settings.format != "flac":
+        command.extend(["-b:a", f"{settings.bitrate}k"])
+    if settings.format == "opus":
+        command.extend(["-ar", str(_OPUS_SAMPLERATE)])
+
+    for key, value in (tags or dict()).items():
+        command.extend(["-metadata", f"{key}={value}"])
+    if settings.format == "mp3":
+        if tags is None:
+            # A bare stream of frames, so it can be concatenated with others
+            command.extend(["-id3v2_version", "0", "-write_xing", "0"])
+        else:
+            command.extend(["-id3v2_version", "3"])
+
+    command.extend(["-f", clip_format.muxer, "pipe:1"])
+    return command
+
+
+def encode(
+    stream_name: str,
+    samples: numpy.ndarray,
+    samplerate: int,
+    settings: ClipSettings = DEFAULT_SETTINGS,
+    tags: Optional[Dict[str, str]] = None,
+) -> bytes:
+    """Encode samples as a clip, in memory.
+
+    Float samples are piped to ffmpeg as 16-bit PCM, converted just like
+    aubio's wav sink would. Without tags, an MP3 has no headers at all.
+    """
+
+    pcm = numpy.zeros(len(samples), dtype="<i2")
+    if samples.dtype == numpy.int16:
+        pcm[:] = samples
+    else:
+        _window.Int16Encoder()(samples, len(samples), pcm)
+
+    try:
+        result = subprocess.run(
+            _ffmpeg_command(samplerate, settings, tags),
+            input=pcm.tobytes(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    except FileNotFoundError as e:
+        raise _errors.FfmpegNotAvailableError("encoding alert clips") from e
+
+    if result.returncode != 0:
+        raise _errors.ClipEncodingError(
+            stream_name, result.stderr.decode(errors="replace").strip()
+        )
+
+    return result.stdout
+
+
+_ID3_FRAMES = {"artist": "TPE1", "title": "TIT2"}
+
+
+def id3_tag(tags: Dict[str, str]) -> bytes:
+    """Build an ID3v2.3 tag, to put in front of concatenated MP3 frames."""
+
+    frames = b""
+    for key, value in tags.items():
+        # Text encoding 1 is UTF-16 with a byte order mark
+        data = b"\x01" + value.encode("utf-16")
+        frames += _ID3_FRAMES[key].encode() + struct.pack(">IH", len(data), 0) + data
+
+    # The tag's size is "syncsafe": seven bits per byte
+    size = len(frames)
+    syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b"ID3\x03\x00\x00" + syncsafe + frames
+
+
+class SegmentEncoder:
+    """Keep the most recent audio of a stream encoded, in segments.
+
+    Audio is collected into segments of segment_size samples, each of which is
+    encoded on a background thread as soon as it's complete. Enough segments
+    are kept to cover capacity samples. A clip can then be put together from
+    the segments already encoded, plus the short tail not yet in a segment.
+    This only works for formats that can be concatenated.
+    """
+
+    def __init__(
+        self,
+        stream_name: str,
+        samplerate: int,
+        segment_size: int,
+        capacity: int,
+        settings: ClipSettings = DEFAULT_SETTINGS,
+    ) -> None:
+        assert FORMATS[settings.format].concatenable
+        self._stream_name = stream_name
+        self._samplerate = samplerate
+        self._capacity = capacity
+        self._settings = settings
+
+        self._encoder = _window.Int16Encoder()
+        self._pending = numpy.zeros(segment_size, dtype=numpy.int16)
+        self._pending_count = 0
+
+        self._segments: Deque[
+            Tuple[concurrent.futures.Future, int]
+        ] = collections.deque()
+        self._segment_sample_count = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"segments-{stream_name}"
+        )
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    def write(self, samples: numpy.ndarray, sample_count: int) -> None:
+        start = 0
+        while start < sample_count:
+            count = min(sample_count - start, len(self._pending) - self._pending_count)
+            end = self._pending_count + count
+            self._encoder(
+                samples[start:], count, self._pending[self._pending_count : end]
+            )
+            self._pending_count = end
+            start += count
+
+            if self._pending_count == len(self._pending):
+                self._encode_pending()
+
+    def snapshot(
+        self, sample_count: int
+    ) -> Tuple[Sequence[concurrent.futures.Future], numpy.ndarray]:
+        """Return what covers the last sample_count samples.
+
+        That's the encoded segments (some of which may still be encoding),
+        followed by the samples not yet in a segment. The first segment may
+        start a little earlier than requested.
+        """
+
+        tail = self._pending[: self._pending_count].copy()
+
+        segments: List[concurrent.futures.Future] = list()
+        covered = len(tail)
+        for segment, count in reversed(self._segments):
+            if covered >= sample_count:
+                break
+            segments.insert(0, segment)
+            covered += count
+
+        return segments, tail
+
+    def _encode_pending(self) -> None:
+        segment = self._executor.submit(
+            encode,
+            self._stream_name,
+            self._pending.copy(),
+            self._samplerate,
+            self._settings,
+        )
+        self._segments.append((segment, self._pending_count))
+        self._segment_sample_count += self._pending_count
+        self._pending_count = 0
+
+        # Drop the segments that have gone out of the window entirely
+        while self._segment_sample_count - self._segments[0][1] >= self._capacity:
+            _, count = self._segments.popleft()
+            self._segment_sample_count -= count
@@ -1,6 +1,6 @@
 import configparser
 import pathlib
-from typing import Collection, Iterable
+from typing import Collection, Iterable, Union
 
 from .. import _errors
 
@@ -78,6 +78,22 @@ class StreamConfigToSmsEmailsFormatError(StreamConfigEmailsFormatError):
         super().__init__("to_sms_emails", to_sms_emails)
 
 
+class StreamConfigInvalidValueError(ConfigurationError):
+    def __init__(
+        self, key: str, value: str, valid_values: Union[str, Collection[str]]
+    ) -> None:
+        self.key = key
+        self.value = value
+        self.valid_values = valid_values
+
+        # Valid values are either listed, or described (e.g. for a range)
+        if isinstance(valid_values, str):
+            expected = valid_values
+        else:
+            expected = _humanize_iterable(valid_values, "or")
+        super().__init__(f"invalid '{key}': {value}. It should be {expected}")
+
+
 class ConfigFileParsingError(InvalidConfigError):
     def __init__(
         self, config_file_path: pathlib.Path, error: configparser.Error
@@ -1,6 +1,6 @@
 import configparser
 import json
-from typing import List
+from typing import Callable, List, Optional, Union
 
 from . import _errors
 
@@ -18,11 +18,41 @@ _THRESHOLD_KEY = "threshold"
 _PRECEDING_DURATION_KEY = "preceding_duration"
 _TIMEOUT_KEY = "timeout"
 _COOLDOWN_KEY = "cooldown"
+_READ_AHEAD_KEY = "read_ahead"
+_SOURCE_KEY = "source"
+_ANALYSIS_SAMPLERATE_KEY = "analysis_samplerate"
+_MAX_LAG_KEY = "max_lag"
+_PREGATE_INTERVAL_KEY = "pregate_interval"
+_WINDOW_STORAGE_KEY = "window_storage"
+_CLIP_SEGMENT_DURATION_KEY = "clip_segment_duration"
+_CLIP_FORMAT_KEY = "clip_format"
+_CLIP_BITRATE_KEY = "clip_bitrate"
+_CLIP_CHANNELS_KEY = "clip_channels"
+_DIGEST_WINDOW_KEY = "digest_window"
+_DIGEST_ATTACHMENTS_KEY = "digest_attachments"
+_DIGEST_MAX_ATTACHMENT_SIZE_KEY = "digest_max_attachment_size"
 
 _DEFAULT_THRESHOLD = 0.7  # Pitch confidence
 _DEFAULT_PRECEDING_DURATION = 30.0  # Thirty seconds
 _DEFAULT_TIMEOUT = 60.0  # One minute
 _DEFAULT_COOLDOWN = 3600.0  # One hour
+_DEFAULT_READ_AHEAD = 0  # Hops; read in the analysis thread
+_DEFAULT_SOURCE = "aubio"
+_DEFAULT_MAX_LAG = 0.0  # Seconds; never shed load
+_DEFAULT_PREGATE_INTERVAL = 1  # Hops; run every matcher on every hop
+_DEFAULT_WINDOW_STORAGE = "float32"
+_DEFAULT_CLIP_SEGMENT_DURATION = 0.0  # Seconds; encode clips when alerting
+_DEFAULT_CLIP_FORMAT = "mp3"
+_DEFAULT_CLIP_CHANNELS = 1
+_DEFAULT_DIGEST_WINDOW = 0.0  # Seconds; notify of each problem on its own
+_DEFAULT_DIGEST_ATTACHMENTS = "all"
+_DEFAULT_DIGEST_MAX_ATTACHMENT_SIZE = 10.0  # Megabytes
+
+_SOURCES = {"aubio", "ffmpeg"}
+_WINDOW_STORAGES = {"float32", "int16", "zlib"}
+_CLIP_FORMATS = {"mp3", "opus", "flac"}
+_CLIP_CHANNELS = {"1", "2"}
+_DIGEST_ATTACHMENTS = {"all", "first", "none"}
 
 _REQUIRED_KEYS = {
     _URL_KEY,
@@ -38,6 +68,19 @@ _OPTIONAL_KEYS = {
     _PRECEDING_DURATION_KEY,
     _TIMEOUT_KEY,
     _COOLDOWN_KEY,
+    _READ_AHEAD_KEY,
+    _SOURCE_KEY,
+    _ANALYSIS_SAMPLERATE_KEY,
+    _MAX_LAG_KEY,
+    _PREGATE_INTERVAL_KEY,
+    _WINDOW_STORAGE_KEY,
+    _CLIP_SEGMENT_DURATION_KEY,
+    _CLIP_FORMAT_KEY,
+    _CLIP_BITRATE_KEY,
+    _CLIP_CHANNELS_KEY,
+    _DIGEST_WINDOW_KEY,
+    _DIGEST_ATTACHMENTS_KEY,
+    _DIGEST_MAX_ATTACHMENT_SIZE_KEY,
     _TO_SMS_EMAILS_KEY,
 }
 
@@ -66,9 +109,79 @@ def _load_config(config_section: configparser.SectionProxy):
         except json.decoder.JSONDecodeError as e:
             raise _errors.StreamConfigToSmsEmailsFormatError(to_emails) from e
 
+    source = config_section.get(_SOURCE_KEY, _DEFAULT_SOURCE)
+    if source not in _SOURCES:
+        raise _errors.StreamConfigInvalidValueError(_SOURCE_KEY, source, _SOURCES)
+
+    window_storage = config_section.get(_WINDOW_STORAGE_KEY, _DEFAULT_WINDOW_STORAGE)
+    if window_storage not in _WINDOW_STORAGES:
+        raise _errors.StreamConfigInvalidValueError(
+            _WINDOW_STORAGE_KEY, window_storage, _WINDOW_STORAGES
+        )
+
+    clip_format = config_section.get(_CLIP_FORMAT_KEY, _DEFAULT_CLIP_FORMAT)
+    if clip_format not in _CLIP_FORMATS:
+        raise _errors.StreamConfigInvalidValueError(
+            _CLIP_FORMAT_KEY, clip_format, _CLIP_FORMATS
+        )
+
+    clip_channels = config_section.get(_CLIP_CHANNELS_KEY, str(_DEFAULT_CLIP_CHANNELS))
+    if clip_channels not in _CLIP_CHANNELS:
+        raise _errors.StreamConfigInvalidValueError(
+            _CLIP_CHANNELS_KEY, clip_channels, _CLIP_CHANNELS
+        )
+
+    digest_attachments = config_section.get(
+        _DIGEST_ATTACHMENTS_KEY, _DEFAULT_DIGEST_ATTACHMENTS
+    )
+    if digest_attachments not in _DIGEST_ATTACHMENTS:
+        raise _errors.StreamConfigInvalidValueError(
+            _DIGEST_ATTACHMENTS_KEY, digest_attachments, _DIGEST_ATTACHMENTS
+        )
+
+    _check_number(config_section, _READ_AHEAD_KEY, int, 0, "a non-negative integer")
+    _check_number(
+        config_section, _ANALYSIS_SAMPLERATE_KEY, int, 1, "a positive integer"
+    )
+    _check_number(config_section, _MAX_LAG_KEY, float, 0, "a non-negative number")
+    _check_number(config_section, _PREGATE_INTERVAL_KEY, int, 1, "a positive integer")
+    _check_number(config_section, _DIGEST_WINDOW_KEY, float, 0, "a non-negative number")
+    _check_number(config_section, _CLIP_BITRATE_KEY, int, 1, "a positive integer")
+
+    # 0 (the default) turns segmenting off
+    _check_number(
+        config_section, _CLIP_SEGMENT_DURATION_KEY, float, 0, "a non-negative number"
+    )
+    _check_number(
+        config_section,
+        _DIGEST_MAX_ATTACHMENT_SIZE_KEY,
+        float,
+        0,
+        "a non-negative number",
+    )
+
     return config_section
 
 
+def _check_number(
+    config_section: configparser.SectionProxy,
+    key: str,
+    type_: Callable[[str], Union[int, float]],
+    minimum: Union[int, float],
+    description: str,
+) -> None:
+    value = config_section.get(key)
+    if value is None:
+        return
+
+    try:
+        valid = type_(value) >= minimum
+    except ValueError:
+        valid = False
+    if not valid:
+        raise _errors.StreamConfigInvalidValueError(key, value, description)
+
+
 class StreamConfig:
     def __init__(self, config_section: configparser.SectionProxy) -> None:
         self._config = _load_config(config_section)
@@ -111,3 +224,46 @@ class StreamConfig:
 
     def cooldown(self) -> float:
         return self._config.getfloat(_COOLDOWN_KEY, _DEFAULT_COOLDOWN)
+
+    def read_ahead(self, default: int = _DEFAULT_READ_AHEAD) -> int:
+        return self._config.getint(_READ_AHEAD_KEY, default)
+
+    def source(self) -> str:
+        return self._config.get(_SOURCE_KEY, _DEFAULT_SOURCE)
+
+    def analysis_samplerate(self) -> Optional[int]:
+        return self._config.getint(_ANALYSIS_SAMPLERATE_KEY, None)
+
+    def max_lag(self) -> float:
+        return self._config.getfloat(_MAX_LAG_KEY, _DEFAULT_MAX_LAG)
+
+    def pregate_interval(self) -> int:
+        return self._config.getint(_PREGATE_INTERVAL_KEY, _DEFAULT_PREGATE_INTERVAL)
+
+    def window_storage(self) -> str:
+        return self._config.get(_WINDOW_STORAGE_KEY, _DEFAULT_WINDOW_STORAGE)
+
+    def clip_segment_duration(self) -> float:
+        return self._config.getfloat(
+            _CLIP_SEGMENT_DURATION_KEY, _DEFAULT_CLIP_SEGMENT_DURATION
+        )
+
+    def clip_format(self) -> str:
+        return self._config.get(_CLIP_FORMAT_KEY, _DEFAULT_CLIP_FORMAT)
+
+    def clip_bitrate(self) -> Optional[int]:
+        return self._config.getint(_CLIP_BITRATE_KEY, None)
+
+    def clip_channels(self) -> int:
+        return self._config.getint(_CLIP_CHANNELS_KEY, _DEFAULT_CLIP_CHANNELS)
+
+    def digest_window(self) -> float:
+        return self._config.getfloat(_DIGEST_WINDOW_KEY, _DEFAULT_DIGEST_WINDOW)
+
+    def digest_attachments(self) -> str:
+        return self._config.get(_DIGEST_ATTACHMENTS_KEY, _DEFAULT_DIGEST_ATTACHMENTS)
+
+    def digest_max_attachment_size(self) -> float:
+        return self._config.getfloat(
+            _DIGEST_MAX_ATTACHMENT_SIZE_KEY, _DEFAULT_DIGEST_MAX_ATTACHMENT_SIZE
+        )
@@ -0,0 +1,72 @@
+from typing import Tuple
+
+import numpy
+
+# Filter length, per unit of decimation factor. Longer filters have a
+# sharper cutoff but cost more per output sample.
+_TAPS_PER_FACTOR = 16
+
+
+def _lowpass(factor: int) -> numpy.ndarray:
+    # Blackman-windowed sinc, cutting off at the new Nyquist frequency, with a
+    # gain of one at DC so levels are unchanged
+    tap_count = _TAPS_PER_FACTOR * factor + 1
+    n = numpy.arange(tap_count) - (tap_count - 1) / 2
+    taps = numpy.sinc(n / factor) * numpy.blackman(tap_count)
+    return (taps / taps.sum()).astype(numpy.float32)
+
+
+class Decimator:
+    """Low-pass filter and downsample audio by an integer factor.
+
+    The filter's history is carried over between pushes, so pushing a stream
+    in any number of pieces gives the same output as pushing it in one go.
+    The returned samples are a view into an internal buffer, so they are only
+    valid until the next push.
+    """
+
+    def __init__(self, factor: int, max_input_size: int) -> None:
+        self.factor = factor
+
+        # Reversed, so each output sample is a plain dot product
+        self._taps = _lowpass(factor)[::-1].copy()
+        self._history = len(self._taps) - 1
+
+        self._buffer = numpy.zeros(self._history + max_input_size, dtype=numpy.float32)
+        self._output = numpy.zeros(max_input_size // factor + 1, dtype=numpy.float32)
+
+        # Offset of the next output sample into the samples pushed next
+        self._phase = 0
+
+    def push(
+        self, samples: numpy.ndarray, sample_count: int
+    ) -> Tuple[numpy.ndarray, int]:
+        """Add samples, and return the decimated samples now available."""
+
+        length = self._history + sample_count
+        if length > len(self._buffer):
+            buffer = numpy.zeros(length, dtype=numpy.float32)
+            buffer[: self._history] = self._buffer[: self._history]
+            self._buffer = buffer
+        self._buffer[self._history : length] = samples[:sample_count]
+
+        output_count = max(0, (sample_count - self._phase - 1) // self.factor + 1)
+        if output_count > len(self._output):
+            self._output = numpy.zeros(output_count, dtype=numpy.float32)
+        output = self._output[:output_count]
+
+        if output_count:
+            # Each row ends at the input sample an output is taken at
+            itemsize = self._buffer.itemsize
+            windows = numpy.lib.stride_tricks.as_strided(
+                self._buffer[self._phase :],
+                shape=(output_count, len(self._taps)),
+                strides=(self.factor * itemsize, itemsize),
+                writeable=False,
+            )
+            numpy.dot(windows, self._taps, out=output)
+
+        self._phase += output_count * self.factor - sample_count
+        self._buffer[: self._history] = self._buffer[sample_count:length]
+
+        return output, output_count
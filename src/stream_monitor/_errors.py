@@ -8,6 +8,13 @@ class EndOfStreamError(StreamMonitorError):
         super().__init__(f"Stream with name {stream_name!r} ended unexpectedly")
 
 
+class StreamFailedError(StreamMonitorError):
+    def __init__(self, stream_name: str, error: Exception) -> None:
+        self.stream_name = stream_name
+        self.error = error
+        super().__init__(f"Stream with name {stream_name!r} failed: {error!s}")
+
+
 class NoStreamsConfiguredError(StreamMonitorError):
     def __init__(self) -> None:
         super().__init__("No streams configured, check config file")
@@ -18,6 +25,24 @@ class PlottingNotAvailableError(StreamMonitorError):
         super().__init__("matplotlib is not installed; plotting is not available")
 
 
+class FfmpegNotAvailableError(StreamMonitorError):
+    def __init__(self, feature: str = "the ffmpeg source") -> None:
+        super().__init__(f"ffmpeg is not installed; {feature} is not available")
+
+
+class OpensslNotAvailableError(StreamMonitorError):
+    def __init__(self, feature: str) -> None:
+        super().__init__(f"openssl is not installed; {feature} is not available")
+
+
+class ClipEncodingError(StreamMonitorError):
+    def __init__(self, stream_name: str, message: str) -> None:
+        self.stream_name = stream_name
+        super().__init__(
+            f"Unable to encode alert clip for stream '{stream_name}': {message}"
+        )
+
+
 class EmailAttachmentMimeTypeError(StreamMonitorError):
     def __init__(self, attachment) -> None:
         self.attachment = attachment
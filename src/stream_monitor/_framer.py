@@ -0,0 +1,82 @@
+import numpy
+
+
+class Framer:
+    """Re-chunk incoming hops into frames of a fixed size and hop.
+
+    Frames are returned as read-only views into an internal buffer, so they are
+    only valid until the next push. Only the samples left over from the
+    previous push (fewer than one frame) are ever moved.
+    """
+
+    def __init__(self, frame_size: int, hop_size: int, max_input_size: int) -> None:
+        self.frame_size = frame_size
+        self.hop_size = hop_size
+
+        self._buffer = numpy.zeros(frame_size + max_input_size, dtype=numpy.float32)
+        self._length = 0
+        self._offset = 0
+
+        # Where the first frame returned by the last push ends, relative to the
+        # start of the samples pushed
+        self.first_frame_end = 0
+
+    def push(self, samples: numpy.ndarray, sample_count: int) -> numpy.ndarray:
+        """Add samples, and return all frames that are now complete.
+
+        The frames are returned as a 2-D array of shape (frames, frame_size).
+        Pushing more than max_input_size samples at once is supported, but
+        grows the buffer.
+        """
+
+        # Fast path: the input already is exactly one frame
+        if (
+            self._length == 0
+            and sample_count == self.frame_size == self.hop_size
+            and len(samples) == sample_count
+        ):
+            self.first_frame_end = self.frame_size
+            return samples[numpy.newaxis, :]
+
+        # Drop the samples consumed by previous frames
+        pushed_start = self._length
+        if self._offset >= self._length:
+            skip = min(self._offset - self._length, sample_count)
+            self._offset -= self._length + skip
+            self._length = 0
+            samples = samples[skip:sample_count]
+            sample_count -= skip
+            pushed_start = -skip
+        elif self._offset:
+            retained = self._length - self._offset
+            self._buffer[:retained] = self._buffer[self._offset : self._length]
+            self._length = retained
+            self._offset = 0
+            pushed_start = retained
+
+        if self._length + sample_count > len(self._buffer):
+            buffer = numpy.zeros(self._length + sample_count, dtype=numpy.float32)
+            buffer[: self._length] = self._buffer[: self._length]
+            self._buffer = buffer
+
+        self._buffer[self._length : self._length + sample_count] = samples[
+            :sample_count
+        ]
+        self._length += sample_count
+
+        available = self._length - self._offset
+        if available < self.frame_size:
+            return self._buffer[:0].reshape(0, self.frame_size)
+
+        self.first_frame_end = self._offset + self.frame_size - pushed_start
+        frame_count = (available - self.frame_size) // self.hop_size + 1
+        itemsize = self._buffer.itemsize
+        frames = numpy.lib.stride_tricks.as_strided(
+            self._buffer[self._offset :],
+            shape=(frame_count, self.frame_size),
+            strides=(self.hop_size * itemsize, itemsize),
+            writeable=False,
+        )
+        self._offset += frame_count * self.hop_size
+
+        return frames
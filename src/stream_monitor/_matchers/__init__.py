@@ -1,3 +1,4 @@
+from ._features import Features  # noqa: F401
 from ._matcher import Matcher  # noqa: F401
 from ._sound_pressure_level_rate import (  # noqa: F401
     SoundPressureLevelRateOfChangeMatcher,
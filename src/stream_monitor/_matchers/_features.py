@@ -0,0 +1,74 @@
+from typing import Callable, Dict
+
+import numpy
+
+_windows: Dict[int, numpy.ndarray] = dict()
+
+
+def _hann_window(size: int) -> numpy.ndarray:
+    # Periodic Hann window, the same one aubio's phase vocoder uses
+    try:
+        return _windows[size]
+    except KeyError:
+        window = 0.5 - 0.5 * numpy.cos(2 * numpy.pi * numpy.arange(size) / size)
+        _windows[size] = window.astype(numpy.float32)
+        return _windows[size]
+
+
+class Features:
+    """Features of one frame of samples, shared between matchers.
+
+    Every feature is computed on first access and cached, so it costs the
+    same no matter how many matchers use it.
+    """
+
+    def __init__(self, samples: numpy.ndarray, sample_count: int) -> None:
+        self.samples = samples
+        self.sample_count = sample_count
+
+        self._cache: Dict[str, numpy.ndarray] = dict()
+
+    def _cached(self, name: str, compute: Callable[[], numpy.ndarray]):
+        try:
+            return self._cache[name]
+        except KeyError:
+            value = self._cache[name] = compute()
+            return value
+
+    @property
+    def energy(self) -> numpy.ndarray:
+        """Mean square of the samples."""
+
+        def _compute():
+            samples = self.samples.astype(numpy.float64)
+            return numpy.einsum("...i,...i->...", samples, samples) / samples.shape[-1]
+
+        return self._cached("energy", _compute)
+
+    @property
+    def rms(self) -> numpy.ndarray:
+        return self._cached("rms", lambda: numpy.sqrt(self.energy))
+
+    @property
+    def db_spl(self) -> numpy.ndarray:
+        """Sound pressure level in dB, as calculated by aubio.db_spl()."""
+
+        def _compute():
+            with numpy.errstate(divide="ignore"):
+                return 10 * numpy.log10(self.energy)
+
+        return self._cached("db_spl", _compute)
+
+    @property
+    def spectrum(self) -> numpy.ndarray:
+        """Magnitude spectrum of the Hann-windowed samples."""
+
+        def _compute():
+            window = _hann_window(self.samples.shape[-1])
+            return numpy.abs(numpy.fft.rfft(self.samples * window))
+
+        return self._cached("spectrum", _compute)
+
+    @property
+    def power_spectrum(self) -> numpy.ndarray:
+        return self._cached("power_spectrum", lambda: numpy.square(self.spectrum))
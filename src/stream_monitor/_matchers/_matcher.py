@@ -1,25 +1,124 @@
 import abc
-from typing import Tuple
+from typing import Optional, Sequence, Tuple
 
 import aubio
+import numpy
 
+from . import _features
 from .. import _config
 
 
 class Matcher(abc.ABC):
+    """Base class for all matchers.
+
+    Subclasses implement either _process_features(), to make use of the
+    feature cache shared between matchers, or _process_samples().
+
+    Subclasses may also declare the frames they want to be given: frame_size
+    samples at a time, advancing by hop_size samples between frames. By default
+    they are given the stream's hops as-is.
+
+    Matchers that are costly to run are marked as expensive. Streams may then
+    skip them on hops that look healthy. Either way, resynchronize() is called
+    before a matcher runs again after skipping hops.
+    """
+
+    frame_size: Optional[int] = None
+    hop_size: Optional[int] = None
+    expensive = False
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+
+        # One of these must be implemented, which abc can't express
+        if (
+            cls._process_features is Matcher._process_features
+            and cls._process_samples is Matcher._process_samples
+        ):
+            raise TypeError(
+                f"{cls.__name__} must implement _process_features() or "
+                "_process_samples()"
+            )
+
     def __init__(self, stream_config: _config.StreamConfig):
         self._config = stream_config
 
     def process_samples(
         self, samples: aubio.fvec, sample_count: int
     ) -> Tuple[float, bool]:
-        return self._process_samples(samples, sample_count)
+        return self.process_features(_features.Features(samples, sample_count))
+
+    def process_features(self, features: _features.Features) -> Tuple[float, bool]:
+        return self._process_features(features)
+
+    def _process_features(self, features: _features.Features) -> Tuple[float, bool]:
+        return self._process_samples(features.samples, features.sample_count)
 
-    @abc.abstractmethod
     def _process_samples(
         self, samples: aubio.fvec, sample_count: int
     ) -> Tuple[float, bool]:
-        pass
+        # Never called: subclasses implement this or _process_features()
+        raise NotImplementedError()
+
+    def resynchronize(self, samples: numpy.ndarray, sample_count: int) -> None:
+        """Catch up on audio that wasn't analyzed, e.g. during a cooldown.
+
+        Called with each hop skipped just before the next frame. Stateless
+        matchers have nothing to do.
+        """
+
+    def process_batch(
+        self, frames: numpy.ndarray, sample_count: int
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """Process a block of consecutive frames in one go.
+
+        Returns an array of values and an array of matches, one per frame.
+        """
+
+        if not len(frames):
+            return numpy.empty(0), numpy.empty(0, dtype=bool)
+
+        return self._process_batch(_features.Features(frames, sample_count))
+
+    def _process_batch(
+        self, features: _features.Features
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        # Subclasses can override this with a vectorized implementation
+        values = numpy.empty(len(features.samples))
+        matches = numpy.empty(len(features.samples), dtype=bool)
+        for index, frame in enumerate(features.samples):
+            values[index], matches[index] = self.process_features(
+                _features.Features(frame, features.sample_count)
+            )
+
+        return values, matches
+
+    @classmethod
+    def process_streams(
+        cls, matchers: Sequence["Matcher"], features: _features.Features
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """Process one frame from each of several streams in one go.
+
+        Row i of the features' samples is the current frame of the stream that
+        matchers[i] belongs to. Each matcher keeps its own state. Returns an
+        array of values and an array of matches, one per stream.
+        """
+
+        return cls._process_streams(matchers, features)
+
+    @classmethod
+    def _process_streams(
+        cls, matchers: Sequence["Matcher"], features: _features.Features
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        # Subclasses can override this with a vectorized implementation
+        values = numpy.empty(len(matchers))
+        matches = numpy.empty(len(matchers), dtype=bool)
+        for index, (matcher, frame) in enumerate(zip(matchers, features.samples)):
+            values[index], matches[index] = matcher.process_features(
+                _features.Features(frame, features.sample_count)
+            )
+
+        return values, matches
 
     @abc.abstractproperty
     def name(self) -> str:
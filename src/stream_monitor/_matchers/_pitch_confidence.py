@@ -1,29 +1,139 @@
-from typing import Tuple
+from typing import Sequence, Tuple, cast
 
 import aubio
+import numpy
 
-from . import _matcher
+from . import _features, _matcher
 from .. import _config
 
 
 _WINDOW_SIZE = 4096
 _HOP_SIZE = 2048
 
+# aubio's default YIN tolerance
+_TOLERANCE = 0.15
+
+
+def _yin_confidence(windows: numpy.ndarray) -> numpy.ndarray:
+    """Calculate the YIN pitch confidence of each row of windows.
+
+    This gives the same results as aubio's YIN, but uses FFTs for the
+    difference function and handles many windows in one go.
+    """
+
+    windows = windows.astype(numpy.float64)
+    window_size = windows.shape[-1]
+    length = window_size // 2
+    batch_shape = windows.shape[:-1]
+
+    # Difference function: d(tau) = sum_j (x[j] - x[j + tau])^2 for j < length,
+    # expanded into energy terms and an autocorrelation
+    fft_size = 2 * window_size
+    correlation = numpy.fft.irfft(
+        numpy.conj(numpy.fft.rfft(windows[..., :length], fft_size))
+        * numpy.fft.rfft(windows, fft_size),
+        fft_size,
+    )[..., :length]
+    cumulative = numpy.concatenate(
+        (numpy.zeros(batch_shape + (1,)), numpy.cumsum(numpy.square(windows), axis=-1)),
+        axis=-1,
+    )
+    shifted_energy = cumulative[..., length : 2 * length] - cumulative[..., :length]
+    difference = cumulative[..., length : length + 1] + shifted_energy - 2 * correlation
+
+    # Cumulative mean normalized difference
+    running = numpy.cumsum(difference[..., 1:], axis=-1)
+    tau = numpy.arange(1, length)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        normalized = numpy.where(running != 0, difference[..., 1:] * tau / running, 1)
+    yin = numpy.concatenate((numpy.ones(batch_shape + (1,)), normalized), axis=-1)
+
+    # Like aubio, take the first dip below the tolerance, or the global minimum
+    candidates = yin[..., 2 : length - 3]
+    dips = (candidates < _TOLERANCE) & (candidates < yin[..., 3 : length - 2])
+    peak = numpy.where(
+        dips.any(axis=-1), numpy.argmax(dips, axis=-1) + 2, numpy.argmin(yin, axis=-1)
+    )
+
+    return 1 - numpy.take_along_axis(yin, peak[..., numpy.newaxis], axis=-1)[..., 0]
+
 
 class PitchConfidenceMatcher(_matcher.Matcher):
     name = "Pitch confidence"
 
+    # YIN keeps its own window of history, so it's fed one hop at a time
+    frame_size = _HOP_SIZE
+    hop_size = _HOP_SIZE
+
+    expensive = True
+
     def __init__(self, stream_config: _config.StreamConfig):
         super().__init__(stream_config)
 
         self._pitch = aubio.pitch("yin", _WINDOW_SIZE, _HOP_SIZE)
         self._threshold = self._config.threshold()
 
+        # The last hop analyzed, so batches can be given the same history as
+        # aubio's YIN (and vice versa)
+        self._previous_hop = numpy.zeros(_HOP_SIZE, dtype=numpy.float32)
+        self._pitch_outdated = False
+
     def _process_samples(
         self, samples: aubio.fvec, sample_count: int
     ) -> Tuple[float, bool]:
+        if self._pitch_outdated:
+            self._pitch(self._previous_hop)
+            self._pitch_outdated = False
+
         # Process some samples and then retrieve confidence
         self._pitch(samples)
+        self._previous_hop[:] = samples
         confidence = self._pitch.get_confidence()
 
         return confidence, confidence < self._threshold
+
+    def resynchronize(self, samples: numpy.ndarray, sample_count: int) -> None:
+        # YIN's window reaches back a hop, so give it the audio it missed
+        samples = samples[:sample_count][-_HOP_SIZE:]
+        self._previous_hop[: _HOP_SIZE - len(samples)] = self._previous_hop[
+            len(samples) :
+        ]
+        self._previous_hop[_HOP_SIZE - len(samples) :] = samples
+        self._pitch_outdated = True
+
+    def _process_batch(
+        self, features: _features.Features
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        hops = features.samples
+        history = numpy.concatenate((self._previous_hop[numpy.newaxis, :], hops))
+        windows = numpy.lib.stride_tricks.as_strided(
+            history,
+            shape=(len(hops), _WINDOW_SIZE),
+            strides=(history.strides[0], history.strides[1]),
+            writeable=False,
+        )
+        confidence = _yin_confidence(windows)
+
+        self._previous_hop[:] = hops[-1]
+        self._pitch_outdated = True
+
+        return confidence, confidence < self._threshold
+
+    @classmethod
+    def _process_streams(
+        cls, matchers: Sequence[_matcher.Matcher], features: _features.Features
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        pitch_matchers = cast(Sequence[PitchConfidenceMatcher], matchers)
+        hops = features.samples
+        windows = numpy.concatenate(
+            (numpy.stack([matcher._previous_hop for matcher in pitch_matchers]), hops),
+            axis=1,
+        )
+        confidence = _yin_confidence(windows)
+
+        for matcher, hop in zip(pitch_matchers, hops):
+            matcher._previous_hop[:] = hop
+            matcher._pitch_outdated = True
+
+        thresholds = numpy.array([matcher._threshold for matcher in pitch_matchers])
+        return confidence, confidence < thresholds
@@ -1,8 +1,8 @@
-from typing import Tuple
+from typing import Optional, Sequence, Tuple, cast
 
-import aubio
+import numpy
 
-from . import _matcher
+from . import _features, _matcher
 from .. import _config
 
 
@@ -13,12 +13,10 @@ class SoundPressureLevelRateOfChangeMatcher(_matcher.Matcher):
         super().__init__(stream_config)
 
         self._threshold = self._config.threshold()
-        self._previous_value = None
+        self._previous_value: Optional[float] = None
 
-    def _process_samples(
-        self, samples: aubio.fvec, sample_count: int
-    ) -> Tuple[float, bool]:
-        db = aubio.db_spl(samples)
+    def _process_features(self, features: _features.Features) -> Tuple[float, bool]:
+        db = float(features.db_spl)
 
         if self._previous_value is None:
             self._previous_value = db
@@ -28,3 +26,40 @@ class SoundPressureLevelRateOfChangeMatcher(_matcher.Matcher):
         self._previous_value = db
 
         return output, abs(output) < self._threshold
+
+    def _process_batch(
+        self, features: _features.Features
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        db = features.db_spl
+        previous = numpy.empty_like(db)
+        previous[0] = (
+            float("NaN") if self._previous_value is None else self._previous_value
+        )
+        previous[1:] = db[:-1]
+        self._previous_value = float(db[-1])
+
+        output = db - previous
+        with numpy.errstate(invalid="ignore"):
+            return output, numpy.abs(output) < self._threshold
+
+    @classmethod
+    def _process_streams(
+        cls, matchers: Sequence[_matcher.Matcher], features: _features.Features
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        spl_matchers = cast(Sequence[SoundPressureLevelRateOfChangeMatcher], matchers)
+        db = features.db_spl
+        previous = numpy.array(
+            [
+                float("NaN")
+                if matcher._previous_value is None
+                else matcher._previous_value
+                for matcher in spl_matchers
+            ]
+        )
+        for matcher, value in zip(spl_matchers, db):
+            matcher._previous_value = float(value)
+
+        output = db - previous
+        thresholds = numpy.array([matcher._threshold for matcher in spl_matchers])
+        with numpy.errstate(invalid="ignore"):
+            return output, numpy.abs(output) < thresholds
@@ -1,10 +1,8 @@
-from typing import Tuple
+from typing import Sequence, Tuple
 
-import aubio
 import numpy
 
-from . import _matcher
-from .. import _config
+from . import _features, _matcher
 
 
 _WINDOW_SIZE = 512
@@ -14,18 +12,31 @@ _HOP_SIZE = _WINDOW_SIZE // 2
 class VocoderMatcher(_matcher.Matcher):
     name = "Frequency analysis"
 
-    def __init__(self, stream_config: _config.StreamConfig):
-        super().__init__(stream_config)
+    frame_size = _WINDOW_SIZE
+    hop_size = _HOP_SIZE
 
-        self._vocoder = aubio.pvoc(_WINDOW_SIZE, _HOP_SIZE)
-        self._previous_value = None
+    expensive = True
 
-    def _process_samples(
-        self, samples: aubio.fvec, sample_count: int
-    ) -> Tuple[float, bool]:
-        pv = self._vocoder(samples)
-        std_dev = numpy.std(pv.norm)
-        average = numpy.average(pv.norm)
+    def _process_features(self, features: _features.Features) -> Tuple[float, bool]:
+        return float(_spectral_spread(features.spectrum)), False
 
-        value = std_dev / average
-        return value, False
+    def _process_batch(
+        self, features: _features.Features
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        values = _spectral_spread(features.spectrum)
+        return values, numpy.zeros(len(values), dtype=bool)
+
+    @classmethod
+    def _process_streams(
+        cls, matchers: Sequence[_matcher.Matcher], features: _features.Features
+    ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        # This matcher is stateless, so streams batch just like frames do
+        values = _spectral_spread(features.spectrum)
+        return values, numpy.zeros(len(values), dtype=bool)
+
+
+def _spectral_spread(spectrum: numpy.ndarray) -> numpy.ndarray:
+    std_dev = numpy.std(spectrum, axis=-1)
+    average = numpy.average(spectrum, axis=-1)
+
+    return std_dev / average
@@ -0,0 +1,73 @@
+from typing import Dict, Iterable, List, Tuple
+
+# Buckets are powers of two of nanoseconds: the first holds everything up to
+# about a microsecond, the last everything over about half an hour.
+_FIRST_BUCKET_BITS = 10
+_BUCKET_COUNT = 32
+
+
+class Histogram:
+    """A latency histogram with fixed, logarithmic buckets.
+
+    Recording a latency only increments counters, so it's cheap enough to
+    leave on in production and never grows.
+    """
+
+    # Upper bound of each bucket, in seconds (the last one is unbounded)
+    bounds: Tuple[float, ...] = tuple(
+        2 ** (index + _FIRST_BUCKET_BITS) / 1e9 for index in range(_BUCKET_COUNT - 1)
+    ) + (float("inf"),)
+
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * _BUCKET_COUNT
+        self.count = 0
+        self.sum = 0.0
+
+    def record(self, seconds: float) -> None:
+        bucket = int(seconds * 1e9).bit_length() - _FIRST_BUCKET_BITS
+        self.counts[min(max(bucket, 0), _BUCKET_COUNT - 1)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, quantile: float) -> float:
+        """Estimate a quantile, as the upper bound of the bucket it falls in."""
+
+        rank = quantile * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if count and seen >= rank:
+                return bound
+        return 0.0
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        return list(self.counts), self.sum
+
+
+class StreamMetrics:
+    """Where a stream spends its time, and how often things go wrong."""
+
+    def __init__(self, matcher_names: Iterable[str]) -> None:
+        self.read = Histogram()
+        self.window = Histogram()
+        self.alert = Histogram()
+        self.matchers = {name: Histogram() for name in matcher_names}
+
+        self.hops = 0
+        self.reconnects = 0
+        self.cooldown_skipped_hops = 0
+
+    def snapshot(self) -> Dict:
+        return {
+            "hops": self.hops,
+            "reconnects": self.reconnects,
+            "cooldown_skipped_hops": self.cooldown_skipped_hops,
+            "stages": {
+                "read": self.read.snapshot(),
+                "window": self.window.snapshot(),
+                "alert": self.alert.snapshot(),
+            },
+            "matchers": {
+                name: histogram.snapshot() for name, histogram in self.matchers.items()
+            },
+        }
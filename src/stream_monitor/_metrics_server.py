@@ -0,0 +1,375 @@
+import http.server
+import logging
+import multiprocessing
+import socketserver
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import _metrics, _stream
+
+logger = logging.getLogger(__name__)
+
+# Seconds between metrics snapshots pushed by each stream
+_PUBLISH_INTERVAL = 5.0
+
+_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_Snapshots = Dict[str, Tuple[float, Dict]]
+
+
+class Publisher:
+    """Push snapshots of streams' metrics to a MetricsServer's queue.
+
+    Snapshots are only taken every few seconds, so calling publish() every
+    hop costs a clock read.
+    """
+
+    def __init__(
+        self, metrics_queue: multiprocessing.Queue, interval: float = _PUBLISH_INTERVAL
+    ) -> None:
+        self._queue = metrics_queue
+        self._interval = interval
+        self._next_publish = 0.0
+
+    def publish(self, streams: Iterable[_stream.Stream]) -> None:
+        now = time.monotonic()
+        if now < self._next_publish:
+            return
+
+        self._next_publish = now + self._interval
+        for stream in streams:
+            self._queue.put((stream.name, stream.metrics_snapshot()))
+
+
+class MetricsServer:
+    """Serve the metrics of all streams over HTTP, in Prometheus' text format.
+
+    Streams push snapshots through a queue (see Publisher), which a thread
+    collects as they arrive. Scraping renders the latest snapshot of each
+    stream without talking to the streams at all, along with the
+    notifications' and the supervisor's metrics if given a way to take
+    snapshots of them.
+    """
+
+    def __init__(
+        self,
+        metrics_queue: multiprocessing.Queue,
+        port: int,
+        address: str = "127.0.0.1",
+        notifications: Optional[Callable[[], Dict]] = None,
+        supervision: Optional[Callable[[], Dict]] = None,
+    ) -> None:
+        self._queue = metrics_queue
+        self._notifications = notifications
+        self._supervision = supervision
+
+        self._snapshots: _Snapshots = dict()
+        self._lock = threading.Lock()
+
+        self._server = _HTTPServer((address, port), _Handler)
+        self._server.render = self.render
+
+        self._collector = threading.Thread(
+            target=self._collect, name="metrics-collector", daemon=True
+        )
+        self._server_thread = threading.Thread(
+            target=self._server.serve_forever, name="metrics-server", daemon=True
+        )
+        self._collector.start()
+        self._server_thread.start()
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._queue.put(None)
+        self._collector.join()
+
+    def render(self) -> str:
+        with self._lock:
+            snapshots = dict(self._snapshots)
+        notifications = self._notifications() if self._notifications else None
+        supervision = self._supervision() if self._supervision else None
+        return render(snapshots, notifications, supervision)
+
+    def _collect(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            stream_name, snapshot = item
+            with self._lock:
+                self._snapshots[stream_name] = (time.time(), snapshot)
+
+
+class _HTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    render: Callable[[], str]
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+
+        body = self.server.render().encode()  # type: ignore
+        self.send_response(200)
+        self.send_header("Content-Type", _CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        logger.debug(f"Metrics request from {self.client_address[0]}: {format % args}")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(**labels: str) -> str:
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+def _number(value: float) -> str:
+    if isinstance(value, int):
+        return str(int(value))
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Family:
+    def __init__(self, name: str, metric_type: str, help_text: str) -> None:
+        self.name = name
+        self.lines = [
+            f"# HELP {name} {help_text}",
+            f"# TYPE {name} {metric_type}",
+        ]
+
+    def add(self, labels: str, value: float, suffix: str = "") -> None:
+        self.lines.append(f"{self.name}{suffix}{_braced(labels)} {_number(value)}")
+
+    def add_histogram(self, labels: str, snapshot: Tuple[List[int], float]) -> None:
+        counts, total = snapshot
+        cumulative = 0
+        for bound, count in zip(_metrics.Histogram.bounds, counts):
+            cumulative += count
+            le = _labels(le="+Inf" if bound == float("inf") else f"{bound:.9g}")
+            bucket_labels = f"{labels},{le}" if labels else le
+            self.lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+        self.add(labels, total, "_sum")
+        self.lines.append(f"{self.name}_count{_braced(labels)} {cumulative}")
+
+
+def _braced(labels: str) -> str:
+    return f"{{{labels}}}" if labels else ""
+
+
+def render(
+    snapshots: _Snapshots,
+    notifications: Optional[Dict] = None,
+    supervision: Optional[Dict] = None,
+) -> str:
+    """Render the latest snapshot of each stream in Prometheus' text format.
+
+    The notifications' and the supervisor's metrics are rendered too, if
+    given.
+    """
+
+    families = {
+        "updated": _Family(
+            "stream_monitor_last_update_timestamp_seconds",
+            "gauge",
+            "When the stream last reported its metrics.",
+        ),
+        "hops": _Family(
+            "stream_monitor_hops_total", "counter", "Hops read from the stream."
+        ),
+        "lag": _Family(
+            "stream_monitor_lag_seconds",
+            "gauge",
+            "How far the stream has fallen behind live.",
+        ),
+        "matcher_values": _Family(
+            "stream_monitor_matcher_value", "gauge", "Latest value of each matcher."
+        ),
+        "match_seconds": _Family(
+            "stream_monitor_match_seconds",
+            "gauge",
+            "How long the stream has been matching a problem.",
+        ),
+        "in_cooldown": _Family(
+            "stream_monitor_in_cooldown",
+            "gauge",
+            "Whether the stream is in cooldown after an alert.",
+        ),
+        "shed_level": _Family(
+            "stream_monitor_shed_level",
+            "gauge",
+            "How much load the stream is shedding to catch up (0 for none).",
+        ),
+        "shed_events": _Family(
+            "stream_monitor_shed_events_total",
+            "counter",
+            "Times the stream started shedding more load.",
+        ),
+        "shed_hops": _Family(
+            "stream_monitor_shed_hops_total",
+            "counter",
+            "Hops not analyzed to catch up.",
+        ),
+        "pregated_hops": _Family(
+            "stream_monitor_pregated_hops_total",
+            "counter",
+            "Hops the expensive matchers skipped, as the pre-gate found them healthy.",
+        ),
+        "cooldown_skipped_hops": _Family(
+            "stream_monitor_cooldown_skipped_hops_total",
+            "counter",
+            "Hops skipped during cooldown.",
+        ),
+        "reconnects": _Family(
+            "stream_monitor_reconnects_total",
+            "counter",
+            "Times the stream was reopened after an error.",
+        ),
+        "reader_depth": _Family(
+            "stream_monitor_read_ahead_depth",
+            "gauge",
+            "Hops read ahead of their analysis, waiting in the queue.",
+        ),
+        "reader_capacity": _Family(
+            "stream_monitor_read_ahead_capacity",
+            "gauge",
+            "Hops the stream can read ahead of their analysis.",
+        ),
+        "reader_underruns": _Family(
+            "stream_monitor_read_ahead_underruns_total",
+            "counter",
+            "Times the read-ahead queue ran dry, waiting on the source.",
+        ),
+        "alerts": _Family(
+            "stream_monitor_alerts_total",
+            "counter",
+            "Alerts for the stream, by outcome.",
+        ),
+        "stages": _Family(
+            "stream_monitor_stage_duration_seconds",
+            "histogram",
+            "Time spent in each stage of processing a hop.",
+        ),
+        "matchers": _Family(
+            "stream_monitor_matcher_duration_seconds",
+            "histogram",
+            "Time spent in each matcher.",
+        ),
+    }
+
+    for stream_name, (updated, snapshot) in sorted(snapshots.items()):
+        stream = _labels(stream=stream_name)
+        families["updated"].add(stream, updated)
+        for key in (
+            "hops",
+            "lag",
+            "match_seconds",
+            "in_cooldown",
+            "shed_level",
+            "shed_events",
+            "shed_hops",
+            "pregated_hops",
+            "cooldown_skipped_hops",
+            "reconnects",
+        ):
+            if key in snapshot:
+                families[key].add(stream, snapshot[key])
+
+        for matcher_name, value in snapshot["matcher_values"].items():
+            families["matcher_values"].add(
+                _labels(stream=stream_name, matcher=matcher_name), value
+            )
+        for key, value in snapshot.get("reader", dict()).items():
+            families[f"reader_{key}"].add(stream, value)
+        for outcome, count in snapshot["alerts"].items():
+            families["alerts"].add(_labels(stream=stream_name, outcome=outcome), count)
+        for stage, histogram in snapshot.get("stages", dict()).items():
+            families["stages"].add_histogram(
+                _labels(stream=stream_name, stage=stage), histogram
+            )
+        for matcher_name, histogram in snapshot.get("matchers", dict()).items():
+            families["matchers"].add_histogram(
+                _labels(stream=stream_name, matcher=matcher_name), histogram
+            )
+
+    if notifications is not None:
+        families.update(_notification_families(notifications))
+    if supervision is not None:
+        families.update(_supervision_families(supervision))
+
+    return "".join("\n".join(family.lines) + "\n" for family in families.values())
+
+
+def _notification_families(snapshot: Dict) -> Dict[str, _Family]:
+    families = {
+        "outbox_depth": _Family(
+            "stream_monitor_outbox_depth",
+            "gauge",
+            "Notifications waiting in the outbox to be delivered.",
+        ),
+        "notifications": _Family(
+            "stream_monitor_notifications_total",
+            "counter",
+            "Attempts to deliver a notification, by outcome.",
+        ),
+        "digests": _Family(
+            "stream_monitor_notification_digests_total",
+            "counter",
+            "Digests sent, each notifying of several problems at once.",
+        ),
+        "delivery": _Family(
+            "stream_monitor_notification_delivery_seconds",
+            "histogram",
+            "Time from detecting a problem to delivering its notification.",
+        ),
+    }
+
+    families["outbox_depth"].add("", snapshot["outbox_depth"])
+    for outcome, count in snapshot["notifications"].items():
+        families["notifications"].add(_labels(outcome=outcome), count)
+    families["digests"].add("", snapshot.get("digests", 0))
+    families["delivery"].add_histogram("", snapshot["delivery"])
+    return families
+
+
+def _supervision_families(snapshot: Dict) -> Dict[str, _Family]:
+    families = {
+        "uptime": _Family(
+            "stream_monitor_uptime_seconds",
+            "gauge",
+            "How long the stream has been monitored since it was last (re)started.",
+        ),
+        "restarts": _Family(
+            "stream_monitor_restarts_total",
+            "counter",
+            "Times the stream's monitor was restarted after crashing.",
+        ),
+        "crash_looping": _Family(
+            "stream_monitor_crash_looping",
+            "gauge",
+            "Whether the stream's monitor keeps crashing.",
+        ),
+    }
+
+    for stream_name, stream_snapshot in sorted(snapshot.items()):
+        stream = _labels(stream=stream_name)
+        for key, family in families.items():
+            family.add(stream, stream_snapshot[key])
+    return families
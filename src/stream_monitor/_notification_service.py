@@ -0,0 +1,329 @@
+import concurrent.futures
+import configparser
+import heapq
+import itertools
+import logging
+import multiprocessing
+import queue
+import random
+import smtplib
+import threading
+import time
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+from . import _alerter, _errors, _metrics, _notifier, _outbox
+
+logger = logging.getLogger(__name__)
+
+# Notifications sent at once. Each SMTP server also limits how many sessions
+# are open to it (see SmtpPool).
+_SENDER_COUNT = 8
+
+# Seconds before retrying a failed notification, doubling with every failure
+# up to the maximum. Each delay is jittered, so retries don't come in bursts.
+_RETRY_DELAY = 5.0
+_MAX_RETRY_DELAY = 600.0
+
+
+class Forwarder:
+    """Forward the problems streams detect to a NotificationService's queue.
+
+    This is the problem callback of streams running in other processes; it
+    returns as soon as the problem is queued.
+    """
+
+    def __init__(self, notification_queue: multiprocessing.Queue) -> None:
+        self._queue = notification_queue
+
+    def problem_detected_callback(
+        self, stream_name: str, matcher_name: str, clip: _alerter.Clip
+    ) -> None:
+        self._queue.put((stream_name, matcher_name, clip, time.time()))
+
+
+class NotificationService:
+    """Send the notifications of all streams, from one process.
+
+    Streams forward the problems they detect through a queue (see Forwarder).
+    A thread collects them into an outbox, which is synced (and compacted)
+    once per batch. Another hands them to a few senders as they're due, one
+    each at a time, and failed notifications are retried with exponential
+    backoff until they're delivered, surviving restarts if the outbox has a
+    journal. A retry only sends the channels (SMS or email) that failed.
+
+    The senders share a single Notifier, so its SMTP sessions are reused
+    across streams: when many streams alert at once, the notifications go
+    out over a handful of sessions instead of a new one for each. Streams can
+    also have their problems held for a digest window, for the problems of
+    other streams notifying the same recipients to be sent along with them
+    in one digest.
+    """
+
+    def __init__(
+        self,
+        notifier: _notifier.Notifier,
+        notification_queue: multiprocessing.Queue,
+        outbox: Optional[_outbox.Outbox] = None,
+        senders: int = _SENDER_COUNT,
+    ) -> None:
+        self._notifier = notifier
+        self._queue = notification_queue
+        self._outbox = outbox if outbox is not None else _outbox.Outbox()
+
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.rejected = 0
+        self.digests = 0
+        self.delivery = _metrics.Histogram()
+
+        # Entries by when they're due (monotonic), in order of arrival
+        self._schedule: List[Tuple[float, int, _outbox.Entry]] = list()
+        self._sequence = itertools.count()
+        self._scheduled = threading.Condition(self._lock)
+        self._closing = False
+
+        # Only as many notifications as there are senders are handed to them
+        # at once, so the rest stay scheduled (and can join digests)
+        self._sender_count = senders
+        self._in_flight = 0
+        with self._scheduled:
+            for entry in self._outbox.entries():
+                self._reschedule(entry, 0.0)
+
+        self._senders = concurrent.futures.ThreadPoolExecutor(
+            max_workers=senders, thread_name_prefix="notification-sender"
+        )
+        self._collector = threading.Thread(
+            target=self._collect, name="notification-collector", daemon=True
+        )
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, name="notification-dispatcher", daemon=True
+        )
+        self._collector.start()
+        self._dispatcher.start()
+
+    def close(self) -> None:
+        """Stop, once the notifications being sent are done.
+
+        Notifications not sent yet are left in the outbox.
+        """
+
+        self._queue.put(None)
+        self._collector.join()
+        with self._scheduled:
+            self._closing = True
+            self._scheduled.notify()
+        self._dispatcher.join()
+        self._senders.shutdown(wait=True)
+        self._outbox.close()
+        self._notifier.close()
+
+    def metrics_snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "outbox_depth": len(self._outbox),
+                "notifications": {
+                    "sent": self.sent,
+                    "failed": self.failed,
+                    "rejected": self.rejected,
+                },
+                "digests": self.digests,
+                "delivery": self.delivery.snapshot(),
+            }
+
+    def _collect(self) -> None:
+        while True:
+            items = [self._queue.get()]
+
+            # Take the rest of a burst too, so it's synced all at once
+            while items[-1] is not None:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._enqueue([item for item in items if item is not None])
+            except Exception:
+                # Keep collecting the notifications of other streams
+                logger.exception("Unable to queue notifications")
+
+            if items[-1] is None:
+                return
+
+    def _enqueue(self, items: Sequence[Tuple]) -> None:
+        entries = [self._outbox.add(*item) for item in items]
+        for entry in entries:
+            self._log_problem(entry)
+        try:
+            self._outbox.sync()
+            self._outbox.compact()
+        except OSError:
+            # They can still be sent, they just won't survive a restart
+            logger.exception("Unable to sync the outbox")
+
+        with self._scheduled:
+            for entry in entries:
+                self._reschedule(entry, self._digest_window(entry))
+
+    def _dispatch(self) -> None:
+        with self._scheduled:
+            while not self._closing:
+                if not self._schedule or self._in_flight >= self._sender_count:
+                    self._scheduled.wait()
+                    continue
+
+                due, _, entry = self._schedule[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._scheduled.wait(delay)
+                    continue
+
+                heapq.heappop(self._schedule)
+                entries = [entry]
+
+                # Everything else waiting for the same recipients goes with it
+                digest_key = self._digest_key(entry)
+                if digest_key is not None:
+                    schedule = list()
+                    for item in self._schedule:
+                        if self._digest_key(item[2]) == digest_key:
+                            entries.append(item[2])
+                        else:
+                            schedule.append(item)
+                    heapq.heapify(schedule)
+                    self._schedule = schedule
+
+                self._in_flight += 1
+                self._senders.submit(self._send, entries)
+
+    def _send(self, entries: Sequence[_outbox.Entry]) -> None:
+        try:
+            self._deliver(entries)
+        except Exception:
+            # Park them rather than losing them
+            stream_names = ", ".join(entry.stream_name for entry in entries)
+            logger.exception(f"Unable to handle notification for {stream_names}")
+            with self._scheduled:
+                for entry in entries:
+                    self._reschedule(entry, _MAX_RETRY_DELAY)
+        finally:
+            with self._scheduled:
+                self._in_flight -= 1
+                self._scheduled.notify()
+
+    def _deliver(self, entries: Sequence[_outbox.Entry]) -> None:
+        stream_names = ", ".join(entry.stream_name for entry in entries)
+        try:
+            # Each channel only goes out to the entries it hasn't reached yet,
+            # so a retry doesn't send again what already went out
+            for channel in _notifier.CHANNELS:
+                pending = [entry for entry in entries if channel not in entry.channels]
+                if not pending:
+                    continue
+
+                self._notifier.notify(
+                    channel,
+                    [
+                        (entry.stream_name, entry.matcher_name, entry.clip)
+                        for entry in pending
+                    ],
+                )
+                for entry in pending:
+                    entry.channels.add(channel)
+        except Exception as e:
+            if _permanent(e):
+                logger.exception(f"Dropping notification for {stream_names}")
+                for entry in entries:
+                    self._outbox.remove(entry)
+                with self._lock:
+                    self.rejected += len(entries)
+                return
+
+            attempts = max(entry.attempts for entry in entries) + 1
+            delay = min(_RETRY_DELAY * 2 ** (attempts - 1), _MAX_RETRY_DELAY)
+            delay *= random.uniform(0.5, 1)
+            logger.warning(
+                f"Unable to send notification for {stream_names} (attempt "
+                f"{attempts}): {e!s}; retrying in {delay:.0f} second(s)"
+            )
+            for entry in entries:
+                entry.attempts = attempts
+                self._outbox.update(entry)
+            with self._scheduled:
+                self.failed += len(entries)
+                for entry in entries:
+                    self._reschedule(entry, delay)
+        else:
+            for entry in entries:
+                self._outbox.remove(entry)
+            now = time.time()
+            with self._lock:
+                self.sent += len(entries)
+                if len(entries) > 1:
+                    self.digests += 1
+                for entry in entries:
+                    self.delivery.record(max(now - entry.created, 0.0))
+
+    def _log_problem(self, entry: _outbox.Entry) -> None:
+        # Once, as it's queued, rather than on every attempt to send it
+        try:
+            self._notifier.log_problem(entry.stream_name, entry.matcher_name)
+        except Exception:
+            logger.exception(
+                f"Stream '{entry.stream_name}' has been flagged by "
+                f"{entry.matcher_name}"
+            )
+
+    def _digest_key(self, entry: _outbox.Entry) -> Optional[Hashable]:
+        try:
+            return self._notifier.digest_key(entry.stream_name)
+        except _errors.StreamMonitorError:
+            # The stream is no longer configured; sending will say so
+            return None
+        except Exception:
+            logger.exception(
+                f"Unable to tell who to notify for stream '{entry.stream_name}'; "
+                "notifying on its own"
+            )
+            return None
+
+    def _digest_window(self, entry: _outbox.Entry) -> float:
+        try:
+            return self._notifier.digest_window(entry.stream_name)
+        except _errors.StreamMonitorError:
+            return 0.0
+        except Exception:
+            logger.exception(
+                f"Unable to get the digest window of stream '{entry.stream_name}'; "
+                "notifying right away"
+            )
+            return 0.0
+
+    def _reschedule(self, entry: _outbox.Entry, delay: float) -> None:
+        # Called with the lock held
+        heapq.heappush(
+            self._schedule, (time.monotonic() + delay, next(self._sequence), entry)
+        )
+        self._scheduled.notify()
+
+
+def _permanent(error: Exception) -> bool:
+    """Whether retrying a notification that failed this way is pointless."""
+
+    if isinstance(error, _errors.StreamMonitorError):
+        return True
+
+    # So does a value in the stream's configuration that can't be used (a
+    # digest attachment size that isn't a number, say): it's only read on start
+    if isinstance(error, (ValueError, configparser.Error)):
+        return True
+
+    # SMTP servers reply with 5xx codes to what will never succeed (failing to
+    # log in could be fixed without restarting the service, though)
+    return (
+        isinstance(error, smtplib.SMTPResponseException)
+        and 500 <= error.smtp_code < 600
+        and not isinstance(error, smtplib.SMTPAuthenticationError)
+    )
@@ -1,36 +1,127 @@
 from email.message import EmailMessage
 import logging
-import mimetypes
-import pathlib
-import smtplib
-import ssl
-from typing import List, Optional, Union
+from typing import Hashable, Iterable, List, Optional, Sequence, Set, Tuple
 
-from . import _config, _errors
+from . import _alerter, _config, _errors, _smtp_pool
 
 logger = logging.getLogger(__name__)
 
+# A stream, the matcher that flagged it and its clip
+Problem = Tuple[str, str, _alerter.Clip]
+
+# The channels problems are notified of over, in the order they're sent
+SMS = "sms"
+EMAIL = "email"
+CHANNELS = (SMS, EMAIL)
+
 
 class Notifier:
-    def __init__(self, config: _config.Config) -> None:
+    """Notify of problems by SMS and email.
+
+    Both go out over the same SMTP session, which is kept open to be reused by
+    the next notification. Each channel is sent on its own, so a channel that
+    failed can be retried without sending the other again.
+    """
+
+    def __init__(
+        self, config: _config.Config, pool: Optional[_smtp_pool.SmtpPool] = None
+    ) -> None:
         self._config = config
+        self._pool = pool or _smtp_pool.SmtpPool()
+
+    def close(self) -> None:
+        self._pool.close()
 
     def problem_detected_callback(
-        self, stream_name: str, matcher_name: str, sample_path: pathlib.Path
+        self, stream_name: str, matcher_name: str, clip: _alerter.Clip
     ) -> None:
+        self.problems_detected_callback([(stream_name, matcher_name, clip)])
+
+    def problems_detected_callback(self, problems: Sequence[Problem]) -> None:
+        """Notify of problems over every channel, in a digest if there are several.
+
+        The streams must share a digest key: the digest goes to the recipients
+        of the first, as configured for it.
+        """
+
+        for stream_name, matcher_name, _ in problems:
+            self.log_problem(stream_name, matcher_name)
+
+        for channel in CHANNELS:
+            self.notify(channel, problems)
+
+    def log_problem(self, stream_name: str, matcher_name: str) -> None:
         stream_config = self._config.stream_config(stream_name)
         logger.warning(
             f"Stream '{stream_name!s}' has been flagged by {matcher_name} for "
             f"{stream_config.timeout()} second(s)"
         )
 
-        _send_notification_sms(stream_name, stream_config)
-        _send_notification_email(stream_name, stream_config, sample_path)
+    def notify(self, channel: str, problems: Sequence[Problem]) -> None:
+        """Notify of problems over a single channel (see CHANNELS).
+
+        Several problems are notified of in a digest, as with
+        problems_detected_callback(). Streams without SMS recipients are
+        notified of by email only.
+        """
+
+        stream_configs = [
+            self._config.stream_config(stream_name) for stream_name, _, _ in problems
+        ]
+        message: Optional[EmailMessage]
+        if channel == SMS and len(problems) == 1:
+            message = _notification_sms(problems[0][0], stream_configs[0])
+        elif channel == SMS:
+            message = _digest_sms(problems, stream_configs[0])
+        elif len(problems) == 1:
+            stream_name, _, clip = problems[0]
+            message = _notification_email(stream_name, stream_configs[0], clip)
+        else:
+            message = _digest_email(problems, stream_configs)
+
+        if message is not None:
+            self._send(stream_configs[0], [message])
+
+    def digest_window(self, stream_name: str) -> float:
+        """Seconds to wait for other problems to notify of with this one."""
+
+        return self._config.stream_config(stream_name).digest_window()
+
+    def digest_key(self, stream_name: str) -> Optional[Hashable]:
+        """Identify the recipients of a stream's notifications, and how they're sent.
+
+        The problems of streams sharing a key can be notified of in a single
+        digest. Streams that aren't digested have no key.
+        """
+
+        stream_config = self._config.stream_config(stream_name)
+        if stream_config.digest_window() <= 0:
+            return None
+
+        return (
+            stream_config.smtp_server(),
+            stream_config.smtp_server_port(),
+            stream_config.smtp_login(),
+            stream_config.from_email(),
+            tuple(stream_config.to_emails()),
+            tuple(stream_config.to_sms_emails()),
+        )
+
+    def _send(
+        self, stream_config: _config.StreamConfig, messages: Sequence[EmailMessage]
+    ) -> None:
+        self._pool.send(
+            stream_config.smtp_server(),
+            stream_config.smtp_server_port(),
+            stream_config.smtp_login(),
+            stream_config.smtp_password(),
+            messages,
+        )
 
 
-def _send_notification_email(
-    stream_name: str, stream_config: _config.StreamConfig, sample_path: pathlib.Path
-) -> None:
+def _notification_email(
+    stream_name: str, stream_config: _config.StreamConfig, clip: _alerter.Clip
+) -> EmailMessage:
     subject = f"Stream Monitor: problem detected on {stream_name}"
 
     timeout = stream_config.timeout()
@@ -55,24 +146,96 @@ def _send_notification_email(
         f"Thanks for using Stream Monitor!"
     )
 
-    _send_email(
-        stream_config.smtp_server(),
-        stream_config.smtp_server_port(),
-        stream_config.smtp_login(),
-        stream_config.smtp_password(),
+    return _create_email(
+        stream_config.from_email(), stream_config.to_emails(), subject, message, [clip]
+    )
+
+
+def _digest_email(
+    problems: Sequence[Problem], stream_configs: Sequence[_config.StreamConfig]
+) -> EmailMessage:
+    stream_names = _unique(stream_name for stream_name, _, _ in problems)
+    subject = f"Stream Monitor: problems detected on {len(stream_names)} streams"
+
+    message = (
+        "Hello,\n\n" "Stream Monitor has detected issues on the following streams:\n\n"
+    )
+    for (stream_name, matcher_name, _), stream_config in zip(problems, stream_configs):
+        message += (
+            f"    {stream_name}: flagged by {matcher_name} for "
+            f"{stream_config.timeout()} second(s)\n"
+        )
+
+    attachments, omitted = _digest_attachments(
+        [clip for _, _, clip in problems], stream_configs[0]
+    )
+    message += "\n"
+    if attachments:
+        message += (
+            "Please listen to the attached audio samples to confirm and take "
+            "appropriate action. "
+        )
+    if omitted:
+        message += f"{omitted} sample(s) weren't attached, to keep this email small. "
+
+    message += (
+        "You won't be notified again about each stream until its cooldown is "
+        "over.\n\n"
+        "Thanks for using Stream Monitor!"
+    )
+
+    stream_config = stream_configs[0]
+    return _create_email(
         stream_config.from_email(),
         stream_config.to_emails(),
         subject,
         message,
-        sample_path,
+        attachments,
     )
 
 
-def _send_notification_sms(
+def _digest_attachments(
+    clips: Sequence[_alerter.Clip], stream_config: _config.StreamConfig
+) -> Tuple[List[_alerter.Clip], int]:
+    """Pick the clips to attach to a digest, and count those left out.
+
+    Identical clips are only attached once, and clips are only attached while
+    they fit in the maximum size.
+    """
+
+    policy = stream_config.digest_attachments()
+    if policy == "none":
+        return list(), 0
+
+    max_size = stream_config.digest_max_attachment_size() * 1e6
+    attachments: List[_alerter.Clip] = list()
+    size = 0
+    omitted = 0
+    seen: Set[bytes] = set()
+    for clip in clips:
+        if clip.data in seen:
+            continue
+        seen.add(clip.data)
+
+        if (policy == "first" and attachments) or size + len(clip.data) > max_size:
+            omitted += 1
+            continue
+
+        attachments.append(clip)
+        size += len(clip.data)
+
+    return attachments, omitted
+
+
+def _unique(values: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(values))
+
+
+def _notification_sms(
     stream_name: str, stream_config: _config.StreamConfig
-) -> None:
+) -> Optional[EmailMessage]:
     if not stream_config.to_sms_emails():
-        return
+        return None
 
     message = (
         f"Stream Monitor has detected an issue on stream '{stream_name!s}' "
@@ -80,63 +243,51 @@ def _send_notification_sms(
         "information."
     )
 
-    _send_email(
-        stream_config.smtp_server(),
-        stream_config.smtp_server_port(),
-        stream_config.smtp_login(),
-        stream_config.smtp_password(),
-        stream_config.from_email(),
-        stream_config.to_sms_emails(),
-        None,
-        message,
-        None,
+    return _create_email(
+        stream_config.from_email(), stream_config.to_sms_emails(), None, message, []
     )
 
 
-def _send_email(
-    smtp_server: str,
-    smtp_server_port: int,
-    smtp_login: str,
-    smtp_password: str,
+def _digest_sms(
+    problems: Sequence[Problem], stream_config: _config.StreamConfig
+) -> Optional[EmailMessage]:
+    if not stream_config.to_sms_emails():
+        return None
+
+    stream_names = _unique(stream_name for stream_name, _, _ in problems)
+    message = (
+        f"Stream Monitor has detected issues on {len(stream_names)} streams: "
+        f"{', '.join(stream_names)}. Check your email for more information."
+    )
+
+    return _create_email(
+        stream_config.from_email(), stream_config.to_sms_emails(), None, message, []
+    )
+
+
+def _create_email(
     from_email: str,
     to_emails: List[str],
     subject: Optional[str],
     message: str,
-    attachment: Optional[pathlib.Path],
-) -> None:
+    attachments: Sequence[_alerter.Clip],
+) -> EmailMessage:
     email_message = EmailMessage()
     email_message["Subject"] = subject
     email_message["From"] = from_email
     email_message["To"] = ", ".join(to_emails)
     email_message.set_content(message)
 
-    if attachment:
-        mime_type = mimetypes.guess_type(str(attachment))
-        if not mime_type or len(mime_type) != 2 or mime_type[0] is None:
-            raise _errors.EmailAttachmentMimeTypeError(attachment)
-        maintype, subtype = str(mime_type[0]).split("/")
+    for attachment in attachments:
+        maintype, _, subtype = attachment.mime_type.partition("/")
         if not maintype or not subtype:
-            raise _errors.EmailAttachmentMimeTypeError(attachment)
-
-        with open(attachment, "rb") as f:
-            email_message.add_attachment(
-                f.read(), filename=attachment.name, maintype=maintype, subtype=subtype
-            )
+            raise _errors.EmailAttachmentMimeTypeError(attachment.filename)
 
-    try:
-        server: Union[smtplib.SMTP_SSL, smtplib.SMTP] = smtplib.SMTP_SSL(
-            smtp_server, smtp_server_port
+        email_message.add_attachment(
+            attachment.data,
+            filename=attachment.filename,
+            maintype=maintype,
+            subtype=subtype,
         )
-    except ssl.SSLError as e:
-        if getattr(e, "reason", None) != "WRONG_VERSION_NUMBER":
-            raise
-
-        # Fall back to SSLv2 and SSLv3 (some servers still require this, sadly)
-        server = smtplib.SMTP(smtp_server, smtp_server_port)
-        server.ehlo()
-        server.starttls(context=ssl.SSLContext(ssl.PROTOCOL_SSLv23))
-        server.ehlo()
-
-    server.login(smtp_login, smtp_password)
-    server.send_message(email_message)
-    server.quit()
+
+    return email_message
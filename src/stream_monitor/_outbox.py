@@ -0,0 +1,249 @@
+import base64
+import json
+import logging
+import os
+import pathlib
+import threading
+import uuid
+from typing import BinaryIO, Dict, List, Optional, Set
+
+from . import _alerter
+
+logger = logging.getLogger(__name__)
+
+_JOURNAL_NAME = "outbox.jsonl"
+
+# Bytes of the journal taken up by delivered entries before it's rewritten
+# without them, as long as they're also most of it
+_COMPACT_THRESHOLD = 4 * 1024 * 1024
+
+
+class Entry:
+    """A notification waiting in the outbox."""
+
+    def __init__(
+        self,
+        entry_id: str,
+        stream_name: str,
+        matcher_name: str,
+        clip: _alerter.Clip,
+        created: float,
+    ) -> None:
+        self.id = entry_id
+        self.stream_name = stream_name
+        self.matcher_name = matcher_name
+        self.clip = clip
+        self.created = created
+        self.attempts = 0
+
+        # The channels it's been sent over so far (see Notifier.notify())
+        self.channels: Set[str] = set()
+
+
+class Outbox:
+    """Notifications waiting to be delivered, journaled to disk.
+
+    The journal is a file of JSON lines, only ever appended to: one line per
+    notification added (clip included), one per failed attempt to deliver it
+    and one once it's delivered. Additions aren't durable until sync() is
+    called, so a burst of them costs a single fsync. Attempts and deliveries
+    are synced along with the next batch; losing one only means a channel is
+    sent again, or the backoff starts over. Once delivered entries take up most
+    of the journal, compact() rewrites it with only what's still pending.
+
+    Without a directory, nothing is journaled; the outbox lives in memory.
+    """
+
+    def __init__(self, directory: Optional[pathlib.Path] = None) -> None:
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Entry] = dict()
+        self._dirty = False
+
+        # Bytes of the journal, and of the records of pending entries in it
+        self._sizes: Dict[str, int] = dict()
+        self._journal_size = 0
+        self._pending_size = 0
+        self._path: Optional[pathlib.Path] = None
+        self._journal: Optional[BinaryIO] = None
+
+        if directory:
+            directory.mkdir(parents=True, exist_ok=True)
+            self._path = directory / _JOURNAL_NAME
+            if self._path.exists():
+                self._load()
+            self._compact()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def entries(self) -> List[Entry]:
+        with self._lock:
+            return list(self._entries.values())
+
+    def add(
+        self, stream_name: str, matcher_name: str, clip: _alerter.Clip, created: float,
+    ) -> Entry:
+        entry = Entry(uuid.uuid4().hex, stream_name, matcher_name, clip, created)
+        with self._lock:
+            self._entries[entry.id] = entry
+            self._sizes[entry.id] = self._append(_record(entry))
+            self._pending_size += self._sizes[entry.id]
+        return entry
+
+    def update(self, entry: Entry) -> None:
+        """Journal an entry's attempts, and the channels it's been sent over."""
+
+        with self._lock:
+            if entry.id not in self._entries:
+                return
+
+            size = self._append(
+                {
+                    "id": entry.id,
+                    "attempts": entry.attempts,
+                    "channels": sorted(entry.channels),
+                }
+            )
+            self._sizes[entry.id] += size
+            self._pending_size += size
+
+    def remove(self, entry: Entry) -> None:
+        with self._lock:
+            if self._entries.pop(entry.id, None) is None:
+                return
+
+            self._pending_size -= self._sizes.pop(entry.id, 0)
+            self._append({"id": entry.id, "delivered": True})
+
+    def sync(self) -> None:
+        with self._lock:
+            self._sync()
+
+    def compact(self) -> None:
+        """Rewrite the journal with only the pending entries, if delivered
+        entries take up most of it."""
+
+        with self._lock:
+            delivered_size = self._journal_size - self._pending_size
+            if delivered_size >= max(self._pending_size, _COMPACT_THRESHOLD):
+                self._compact()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._journal:
+                self._sync()
+                self._journal.close()
+                self._journal = None
+
+    def _append(self, record: Dict) -> int:
+        if not self._journal:
+            return 0
+
+        data = _serialize(record)
+        try:
+            self._journal.write(data)
+        except OSError:
+            # The entry is still kept in memory, it just won't survive a restart
+            logger.exception(f"Unable to write to the outbox journal {self._path}")
+            return 0
+        self._journal_size += len(data)
+        self._dirty = True
+        return len(data)
+
+    def _sync(self) -> None:
+        if self._journal and self._dirty:
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._dirty = False
+
+    def _load(self) -> None:
+        assert self._path
+        with open(self._path, "rb") as f:
+            for line_number, line in enumerate(f, start=1):
+                try:
+                    record = json.loads(line)
+                    if record.get("delivered"):
+                        self._entries.pop(record["id"], None)
+                        continue
+
+                    if "data" not in record:
+                        entry = self._entries.get(record["id"])
+                        if entry:
+                            _restore(entry, record)
+                        continue
+
+                    clip = _alerter.Clip(
+                        record["filename"],
+                        base64.b64decode(record["data"]),
+                        record["mime_type"],
+                    )
+                    entry = Entry(
+                        record["id"],
+                        record["stream"],
+                        record["matcher"],
+                        clip,
+                        record["created"],
+                    )
+                    _restore(entry, record)
+                    self._entries[entry.id] = entry
+                except (ValueError, KeyError):
+                    # Most likely the last line, cut short by a crash
+                    logger.warning(
+                        f"Ignoring corrupt outbox record at {self._path}:{line_number}"
+                    )
+
+        if self._entries:
+            logger.info(f"{len(self._entries)} notification(s) left in the outbox")
+
+    def _compact(self) -> None:
+        if not self._path:
+            return
+
+        if self._journal:
+            self._journal.close()
+
+        temporary_path = self._path.with_suffix(".tmp")
+        self._sizes.clear()
+        with open(temporary_path, "wb") as f:
+            for entry in self._entries.values():
+                data = _serialize(_record(entry))
+                f.write(data)
+                self._sizes[entry.id] = len(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_path, self._path)
+
+        # Make the rename itself durable
+        directory = os.open(self._path.parent, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+        self._journal = open(self._path, "ab")
+        self._journal_size = self._pending_size = sum(self._sizes.values())
+        self._dirty = False
+
+
+def _record(entry: Entry) -> Dict:
+    return {
+        "id": entry.id,
+        "stream": entry.stream_name,
+        "matcher": entry.matcher_name,
+        "filename": entry.clip.filename,
+        "mime_type": entry.clip.mime_type,
+        "data": base64.b64encode(entry.clip.data).decode(),
+        "created": entry.created,
+        "attempts": entry.attempts,
+        "channels": sorted(entry.channels),
+    }
+
+
+def _restore(entry: Entry, record: Dict) -> None:
+    entry.attempts = record.get("attempts", entry.attempts)
+    entry.channels = set(record.get("channels", entry.channels))
+
+
+def _serialize(record: Dict) -> bytes:
+    return (json.dumps(record) + "\n").encode()
@@ -0,0 +1,48 @@
+import math
+
+import numpy
+
+# RMS level (dBFS) below which a hop could be silence, or dead air
+_SILENCE_DB = -50.0
+
+# Crest factor below which a hop could be a steady tone, or heavily clipped.
+# A pure tone's is about 1.4, program material's usually 2.5 or more.
+_MIN_CREST_FACTOR = 1.8
+
+# Peak level at which a hop could be clipping
+_CLIPPING_PEAK = 0.999
+
+# Change in RMS level (dB) from one hop to the next that could be a dropout
+_LEVEL_JUMP_DB = 20.0
+
+
+class PreGate:
+    """A cheap first look at each hop, to decide whether it needs a closer one.
+
+    Level, peak and crest factor are all that's computed, without allocating
+    anything, so the expensive matchers can be left to the hops that look like
+    they could be a problem. Problems that look healthy here (e.g. static) are
+    left to the expensive matchers' sparser schedule.
+    """
+
+    def __init__(self) -> None:
+        self._previous_db = float("nan")
+
+    def suspicious(self, samples: numpy.ndarray, sample_count: int) -> bool:
+        if not sample_count:
+            return False
+
+        samples = samples[:sample_count]
+        energy = float(numpy.dot(samples, samples)) / sample_count
+        peak = max(float(samples.max()), -float(samples.min()))
+
+        db = 10 * math.log10(energy) if energy > 0 else float("-inf")
+        previous_db = self._previous_db
+        self._previous_db = db
+
+        return bool(
+            db < _SILENCE_DB
+            or peak < _MIN_CREST_FACTOR * math.sqrt(energy)
+            or peak >= _CLIPPING_PEAK
+            or abs(db - previous_db) > _LEVEL_JUMP_DB
+        )
@@ -0,0 +1,172 @@
+import collections
+import queue
+import threading
+import time
+from typing import Callable, Optional, Tuple, Union
+
+import numpy
+
+ReaderStats = collections.namedtuple(
+    "ReaderStats",
+    (
+        "depth",
+        "capacity",
+        "decoded_hops",
+        "consumed_hops",
+        "decode_rate",
+        "consume_rate",
+        "decode_wait",
+        "consume_wait",
+        "underruns",
+    ),
+)
+ReaderStats.__doc__ = """Statistics of a Reader.
+
+A queue that's usually empty (and a high consume_wait) means the stream is
+decode-bound; a queue that's usually full (and a high decode_wait) means
+it's analysis-bound. Rates are in hops per second since the previous call
+to stats(); waits are total seconds spent blocked. Underruns count the
+times the consumer found the queue empty, having caught up with the decoder.
+"""
+
+_Hop = Tuple[numpy.ndarray, int]
+
+# Seconds to wait for the reader thread to stop
+_CLOSE_TIMEOUT = 5.0
+
+
+class Reader:
+    """Read hops on a background thread, ahead of their analysis.
+
+    Hops are decoded into a fixed pool of preallocated buffers and handed over
+    through a bounded queue. A buffer returned by read() stays valid until the
+    next call to read().
+    """
+
+    def __init__(
+        self,
+        read_hop: Callable[[], _Hop],
+        hop_size: int,
+        depth: int,
+        *,
+        name: str = "reader",
+    ) -> None:
+        self._read_hop = read_hop
+        self._hop_size = hop_size
+        self._depth = depth
+
+        # One buffer for each queue slot, one being decoded into and one held
+        # by the consumer
+        self._free: "queue.Queue[numpy.ndarray]" = queue.Queue()
+        for _ in range(depth + 2):
+            self._free.put(numpy.zeros(hop_size, dtype=numpy.float32))
+        self._full: "queue.Queue[Union[_Hop, BaseException]]" = queue.Queue(depth)
+        self._current: Optional[numpy.ndarray] = None
+
+        self._decoded_hops = 0
+        self._consumed_hops = 0
+        self._decode_wait = 0.0
+        self._consume_wait = 0.0
+        self._underruns = 0
+        self._underrun = False
+        self._last_stats = (time.monotonic(), 0, 0)
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def read(self) -> _Hop:
+        if self._current is not None:
+            self._free.put(self._current)
+            self._current = None
+
+        if self._full.empty():
+            self._count_underrun()
+
+        start = time.perf_counter()
+        item = self._full.get()
+        self._consume_wait += time.perf_counter() - start
+        self._underrun = False
+
+        if isinstance(item, BaseException):
+            raise item
+
+        self._current, sample_count = item
+        self._consumed_hops += 1
+        return self._current, sample_count
+
+    def ready(self) -> bool:
+        """Whether read() would return (or raise) without waiting on the source."""
+
+        if self._full.empty():
+            self._count_underrun()
+            return False
+        return True
+
+    def stats(self) -> ReaderStats:
+        now = time.monotonic()
+        last_time, last_decoded, last_consumed = self._last_stats
+        elapsed = max(now - last_time, 1e-9)
+        decoded = self._decoded_hops
+        consumed = self._consumed_hops
+        self._last_stats = (now, decoded, consumed)
+
+        return ReaderStats(
+            depth=self._full.qsize(),
+            capacity=self._depth,
+            decoded_hops=decoded,
+            consumed_hops=consumed,
+            decode_rate=(decoded - last_decoded) / elapsed,
+            consume_rate=(consumed - last_consumed) / elapsed,
+            decode_wait=self._decode_wait,
+            consume_wait=self._consume_wait,
+            underruns=self._underruns,
+        )
+
+    def close(self) -> None:
+        self._running = False
+
+        # Unblock the thread if it's waiting on a free buffer or a full queue.
+        # It may also be stuck reading from the network, in which case it's
+        # left behind (it's a daemon thread).
+        self._free.put(numpy.zeros(self._hop_size, dtype=numpy.float32))
+        deadline = time.monotonic() + _CLOSE_TIMEOUT
+        while self._thread.is_alive() and time.monotonic() < deadline:
+            try:
+                self._full.get(timeout=0.1)
+            except queue.Empty:
+                pass
+            self._thread.join(0.1)
+
+    def _count_underrun(self) -> None:
+        # Once per time the queue runs dry, however often it's found empty
+        if not self._underrun:
+            self._underrun = True
+            self._underruns += 1
+
+    def _run(self) -> None:
+        while self._running:
+            start = time.perf_counter()
+            buffer = self._free.get()
+            self._decode_wait += time.perf_counter() - start
+            if not self._running:
+                return
+
+            try:
+                samples, sample_count = self._read_hop()
+            except Exception as e:
+                self._put(e)
+                return
+
+            buffer[:sample_count] = samples[:sample_count]
+            self._decoded_hops += 1
+            self._put((buffer, sample_count))
+
+            # A short hop is the end of the stream
+            if sample_count < self._hop_size:
+                return
+
+    def _put(self, item: Union[_Hop, BaseException]) -> None:
+        start = time.perf_counter()
+        self._full.put(item)
+        self._decode_wait += time.perf_counter() - start
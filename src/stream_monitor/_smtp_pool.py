@@ -0,0 +1,150 @@
+import collections
+from email.message import EmailMessage
+import logging
+import smtplib
+import ssl
+import threading
+import time
+from typing import DefaultDict, Dict, List, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Sessions open to each server at once, at most
+_MAX_CONNECTIONS = 4
+
+# Seconds a session is kept idle before it's closed rather than reused. Servers
+# may drop idle sessions sooner; those are reconnected when they're next used.
+_IDLE_TIMEOUT = 60.0
+
+# Seconds to wait on the server before giving up on a session
+_TIMEOUT = 30.0
+
+_Session = Union[smtplib.SMTP_SSL, smtplib.SMTP]
+_SessionKey = Tuple[str, int, str]
+
+# Errors from a session the server has dropped
+_DISCONNECTED = (smtplib.SMTPServerDisconnected, ConnectionError)
+
+
+class SmtpPool:
+    """Authenticated SMTP sessions, kept open to be reused.
+
+    Sessions are pooled by server, port and login. Sending checks out an idle
+    session (or connects and logs in a new one), sends all its messages over
+    it, then returns it to the pool. At most max_connections sessions are open
+    to each server at once; sending waits for one to be free.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = _MAX_CONNECTIONS,
+        idle_timeout: float = _IDLE_TIMEOUT,
+    ) -> None:
+        self._max_connections = max_connections
+        self._idle_timeout = idle_timeout
+
+        self._lock = threading.Lock()
+        self._limits: Dict[Tuple[str, int], threading.BoundedSemaphore] = dict()
+        self._idle: DefaultDict[
+            _SessionKey, List[Tuple[_Session, float]]
+        ] = collections.defaultdict(list)
+
+        self.connections = 0
+
+    def send(
+        self,
+        smtp_server: str,
+        smtp_server_port: int,
+        smtp_login: str,
+        smtp_password: str,
+        messages: Sequence[EmailMessage],
+    ) -> None:
+        key = (smtp_server, smtp_server_port, smtp_login)
+        with self._limit(smtp_server, smtp_server_port):
+            session = self._checkout(key, smtp_password)
+            try:
+                for message in messages:
+                    try:
+                        session.send_message(message)
+                    except _DISCONNECTED:
+                        # The server dropped the session; try once more on a
+                        # new one.
+                        _quit(session)
+                        session = self._connect(key, smtp_password)
+                        session.send_message(message)
+            except Exception:
+                _quit(session)
+                raise
+
+            with self._lock:
+                self._idle[key].append((session, time.monotonic()))
+
+    def close(self) -> None:
+        with self._lock:
+            idle = [session for sessions in self._idle.values() for session in sessions]
+            self._idle.clear()
+
+        for session, _ in idle:
+            _quit(session)
+
+    def _limit(self, smtp_server: str, smtp_server_port: int) -> threading.Semaphore:
+        with self._lock:
+            return self._limits.setdefault(
+                (smtp_server, smtp_server_port),
+                threading.BoundedSemaphore(self._max_connections),
+            )
+
+    def _checkout(self, key: _SessionKey, smtp_password: str) -> _Session:
+        now = time.monotonic()
+        stale: List[_Session] = list()
+        session = None
+        with self._lock:
+            sessions = self._idle[key]
+            while sessions and session is None:
+                candidate, idle_since = sessions.pop()
+                if now - idle_since > self._idle_timeout:
+                    stale.append(candidate)
+                else:
+                    session = candidate
+
+        for stale_session in stale:
+            _quit(stale_session)
+
+        if session is None:
+            session = self._connect(key, smtp_password)
+        return session
+
+    def _connect(self, key: _SessionKey, smtp_password: str) -> _Session:
+        smtp_server, smtp_server_port, smtp_login = key
+        try:
+            session: _Session = smtplib.SMTP_SSL(
+                smtp_server, smtp_server_port, timeout=_TIMEOUT
+            )
+        except ssl.SSLError as e:
+            if getattr(e, "reason", None) != "WRONG_VERSION_NUMBER":
+                raise
+
+            # Fall back to SSLv2 and SSLv3 (some servers still require this, sadly)
+            session = smtplib.SMTP(smtp_server, smtp_server_port, timeout=_TIMEOUT)
+            session.ehlo()
+            session.starttls(context=ssl.SSLContext(ssl.PROTOCOL_SSLv23))
+            session.ehlo()
+
+        try:
+            session.login(smtp_login, smtp_password)
+        except Exception:
+            _quit(session)
+            raise
+
+        with self._lock:
+            self.connections += 1
+        logger.debug(f"Connected to SMTP server {smtp_server}:{smtp_server_port}")
+        return session
+
+
+def _quit(session: _Session) -> None:
+    try:
+        session.quit()
+    except (smtplib.SMTPException, OSError):
+        # It's being thrown away anyway
+        session.close()
@@ -0,0 +1,292 @@
+import collections
+import logging
+import pathlib
+import random
+import socketserver
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from typing import BinaryIO, List, Optional
+
+from . import _errors
+
+logger = logging.getLogger(__name__)
+
+_TLS_MODES = ("ssl", "starttls")
+
+# Received by SmtpServer: who it's from and to, the raw message, and when it
+# finished arriving (wall time)
+ReceivedMessage = collections.namedtuple(
+    "ReceivedMessage", ("mail_from", "rcpt_tos", "data", "received_at")
+)
+
+
+class SmtpServer:
+    """A local stand-in for an SMTP server, to test and benchmark notifying.
+
+    It speaks just enough SMTP for smtplib: EHLO, AUTH (any credentials are
+    accepted), MAIL, RCPT, DATA, RSET, NOOP and QUIT. With tls="ssl", the
+    connection is TLS from the start (like SMTP_SSL); with tls="starttls", it
+    starts in plain text and offers STARTTLS. Its certificate is self-signed,
+    generated with openssl.
+
+    Every reply can be delayed by latency seconds, and a share of messages
+    (failure_rate) rejected with a temporary failure. fail_next() rejects
+    the next messages outright. Messages accepted are kept in messages.
+    """
+
+    def __init__(
+        self,
+        tls: str = "ssl",
+        latency: float = 0.0,
+        failure_rate: float = 0.0,
+        address: str = "127.0.0.1",
+        seed: int = 0,
+    ) -> None:
+        if tls not in _TLS_MODES:
+            raise ValueError(f"tls should be one of {_TLS_MODES}, not {tls!r}")
+
+        self.tls = tls
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._received = threading.Condition(self._lock)
+        self._forced_failures = 0
+        self.messages: List[ReceivedMessage] = list()
+        self.connections = 0
+        self.logins = 0
+        self.rejected = 0
+
+        self._certificate_directory = tempfile.TemporaryDirectory()
+        self.context = _create_context(pathlib.Path(self._certificate_directory.name))
+
+        self._server = _TCPServer((address, 0), _Handler)
+        self._server.stand_in = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="smtp-stand-in", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def host(self) -> str:
+        return str(self._server.server_address[0])
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._certificate_directory.cleanup()
+
+    def fail_next(self, count: int = 1) -> None:
+        """Reject the next count messages with a temporary failure."""
+
+        with self._lock:
+            self._forced_failures += count
+
+    def wait_for_messages(self, count: int, timeout: float) -> bool:
+        """Wait until count messages have been accepted in total."""
+
+        with self._received:
+            return self._received.wait_for(lambda: len(self.messages) >= count, timeout)
+
+    def _count_connection(self) -> None:
+        with self._lock:
+            self.connections += 1
+
+    def _count_login(self) -> None:
+        with self._lock:
+            self.logins += 1
+
+    def _accept(self, mail_from: str, rcpt_tos: List[str], data: bytes) -> bool:
+        with self._received:
+            if self._forced_failures or self._random.random() < self.failure_rate:
+                self._forced_failures = max(self._forced_failures - 1, 0)
+                self.rejected += 1
+                return False
+
+            self.messages.append(
+                ReceivedMessage(mail_from, rcpt_tos, data, time.time())
+            )
+            self._received.notify_all()
+            return True
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    stand_in: SmtpServer
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def setup(self) -> None:
+        self.stand_in: SmtpServer = self.server.stand_in  # type: ignore
+        self.connection = self.request
+        self._reader: Optional[BinaryIO] = None
+        self._writer: Optional[BinaryIO] = None
+
+    def handle(self) -> None:
+        self.stand_in._count_connection()
+        try:
+            if self.stand_in.tls == "ssl":
+                self._start_tls()
+            else:
+                self._open_files()
+            self._converse()
+        except (OSError, ssl.SSLError) as e:
+            logger.debug(f"SMTP stand-in connection ended: {e!s}")
+        finally:
+            if self.connection is not self.request:
+                self.connection.close()
+
+    def _open_files(self) -> None:
+        self._reader = self.connection.makefile("rb")
+        self._writer = self.connection.makefile("wb")
+
+    def _start_tls(self) -> None:
+        self.connection = self.stand_in.context.wrap_socket(
+            self.connection, server_side=True
+        )
+        self._open_files()
+
+    def _reply(self, *lines: str) -> None:
+        assert self._writer
+        if self.stand_in.latency:
+            time.sleep(self.stand_in.latency)
+
+        # All but the last line of a multi-line reply have a dash after the code
+        for index, line in enumerate(lines):
+            separator = " " if index == len(lines) - 1 else "-"
+            self._writer.write(f"{line[:3]}{separator}{line[4:]}\r\n".encode())
+        self._writer.flush()
+
+    def _read_line(self) -> Optional[str]:
+        assert self._reader
+        line = self._reader.readline()
+        if not line:
+            return None
+        return line.decode(errors="replace").rstrip("\r\n")
+
+    def _converse(self) -> None:
+        self._reply("220 localhost SMTP stand-in ready")
+        secure = self.stand_in.tls == "ssl"
+        mail_from = ""
+        rcpt_tos: List[str] = list()
+
+        while True:
+            line = self._read_line()
+            if line is None:
+                return
+
+            verb, _, argument = line.partition(" ")
+            verb = verb.upper()
+            if verb == "EHLO":
+                extensions = ["250 localhost", "250 AUTH PLAIN LOGIN", "250 8BITMIME"]
+                if not secure:
+                    extensions.insert(1, "250 STARTTLS")
+                self._reply(*extensions)
+            elif verb == "HELO":
+                self._reply("250 localhost")
+            elif verb == "STARTTLS" and not secure:
+                self._reply("220 Ready to start TLS")
+                self._start_tls()
+                secure = True
+            elif verb == "AUTH":
+                if not self._authenticate(argument):
+                    return
+            elif verb == "MAIL":
+                mail_from = argument.partition(":")[2].strip()
+                rcpt_tos = list()
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                rcpt_tos.append(argument.partition(":")[2].strip())
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                data = self._read_data()
+                if data is None:
+                    return
+                if self.stand_in._accept(mail_from, rcpt_tos, data):
+                    self._reply("250 OK: queued")
+                else:
+                    self._reply("451 Temporary failure, try again later")
+            elif verb in ("RSET", "NOOP"):
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+    def _authenticate(self, argument: str) -> bool:
+        mechanism, _, initial_response = argument.partition(" ")
+        prompts = {"PLAIN": [""], "LOGIN": ["VXNlcm5hbWU6", "UGFzc3dvcmQ6"]}.get(
+            mechanism.upper()
+        )
+        if prompts is None:
+            self._reply("504 Unrecognized authentication type")
+            return True
+
+        # Credentials are read, but anything is accepted
+        if initial_response:
+            prompts = prompts[1:]
+        for prompt in prompts:
+            self._reply(f"334 {prompt}")
+            if self._read_line() is None:
+                return False
+
+        self.stand_in._count_login()
+        self._reply("235 Authentication successful")
+        return True
+
+    def _read_data(self) -> Optional[bytes]:
+        assert self._reader
+        lines: List[bytes] = list()
+        while True:
+            line = self._reader.readline()
+            if not line:
+                return None
+            if line in (b".\r\n", b".\n"):
+                return b"".join(lines)
+
+            # Undo dot-stuffing
+            lines.append(line[1:] if line.startswith(b".") else line)
+
+
+def _create_context(directory: pathlib.Path) -> ssl.SSLContext:
+    certificate = directory / "certificate.pem"
+    key = directory / "key.pem"
+    try:
+        subprocess.run(
+            [
+                "openssl",
+                "req",
+                "-x509",
+                "-newkey",
+                "rsa:2048",
+                "-nodes",
+                "-days",
+                "1",
+                "-subj",
+                "/CN=localhost",
+                "-keyout",
+                str(key),
+                "-out",
+                str(certificate),
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+        )
+    except FileNotFoundError as e:
+        raise _errors.OpensslNotAvailableError("the SMTP stand-in") from e
+
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(str(certificate), str(key))
+    return context
@@ -0,0 +1,4 @@
+from ._source import Source  # noqa: F401
+from ._aubio_source import AubioSource  # noqa: F401
+from ._ffmpeg_source import FfmpegSource  # noqa: F401
+from ._sources import create_source  # noqa: F401
@@ -0,0 +1,24 @@
+from typing import Tuple
+
+import aubio
+
+from . import _source
+
+
+class AubioSource(_source.Source):
+    """Read samples using aubio's (ffmpeg-backed) source."""
+
+    def __init__(self, url: str, hop_size: int) -> None:
+        super().__init__(url, hop_size)
+
+        self._source = aubio.source(url, hop_size=hop_size)
+
+    @property
+    def samplerate(self) -> int:
+        return self._source.samplerate
+
+    def __call__(self) -> Tuple[aubio.fvec, int]:
+        return self._source()
+
+    def close(self) -> None:
+        self._source.close()
@@ -0,0 +1,148 @@
+import logging
+import re
+import subprocess
+import threading
+from typing import IO, List, Tuple
+
+import numpy
+
+from . import _source
+from .. import _errors
+
+logger = logging.getLogger(__name__)
+
+_SAMPLERATE_PATTERN = re.compile(r"Stream #\d+:\d+.*: Audio: .*?, (\d+) Hz")
+_SAMPLE_SIZE = numpy.dtype(numpy.float32).itemsize
+
+
+class FfmpegSource(_source.Source):
+    """Read samples from an ffmpeg subprocess decoding to a pipe.
+
+    ffmpeg writes raw 32-bit float mono PCM at the stream's native samplerate,
+    which is read straight into a preallocated buffer. Network streams are
+    reconnected by ffmpeg itself.
+    """
+
+    def __init__(self, url: str, hop_size: int) -> None:
+        super().__init__(url, hop_size)
+
+        self._buffer = bytearray(hop_size * _SAMPLE_SIZE)
+        self._view = memoryview(self._buffer)
+        self._samples = numpy.frombuffer(self._buffer, dtype=numpy.float32)
+
+        try:
+            self._process = subprocess.Popen(
+                _ffmpeg_command(url),
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except FileNotFoundError as e:
+            raise _errors.FfmpegNotAvailableError() from e
+
+        assert self._process.stderr is not None
+        try:
+            self._samplerate = _read_samplerate(self._process.stderr)
+        except RuntimeError:
+            self.close()
+            raise
+
+        # Keep draining ffmpeg's output so it never blocks on it
+        self._stderr_thread = threading.Thread(
+            target=_log_output, args=(self._process.stderr,), daemon=True
+        )
+        self._stderr_thread.start()
+
+    @property
+    def samplerate(self) -> int:
+        return self._samplerate
+
+    def __call__(self) -> Tuple[numpy.ndarray, int]:
+        stdout = self._process.stdout
+        assert stdout is not None
+
+        filled = 0
+        while filled < len(self._buffer):
+            count = stdout.readinto(self._view[filled:])  # type: ignore
+            if not count:
+                break
+            filled += count
+
+        sample_count = filled // _SAMPLE_SIZE
+        if sample_count < self.hop_size:
+            self._samples[sample_count:] = 0
+
+            # A network stream that ffmpeg couldn't keep going is an error, not
+            # the end of the stream
+            returncode = self._process.poll()
+            if returncode is None:
+                returncode = self._process.wait()
+            if returncode != 0:
+                raise RuntimeError(f"ffmpeg exited with status {returncode}")
+
+        return self._samples, sample_count
+
+    def close(self) -> None:
+        if self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+
+        for stream in (self._process.stdout, self._process.stderr):
+            if stream:
+                stream.close()
+
+
+def _ffmpeg_command(url: str) -> List[str]:
+    command = ["ffmpeg", "-nostdin", "-nostats", "-hide_banner"]
+    if re.match(r"https?://", url):
+        command += [
+            "-reconnect",
+            "1",
+            "-reconnect_streamed",
+            "1",
+            "-reconnect_delay_max",
+            "10",
+        ]
+
+    return command + [
+        "-i",
+        url,
+        "-vn",
+        "-ac",
+        "1",
+        # Downmix to the mean of all channels, like aubio does
+        "-rematrix_maxval",
+        "1.0",
+        "-f",
+        "f32le",
+        "-acodec",
+        "pcm_f32le",
+        "pipe:1",
+    ]
+
+
+def _read_samplerate(stderr: IO[bytes]) -> int:
+    output = list()
+    for line in stderr:
+        decoded = line.decode(errors="replace").rstrip()
+        output.append(decoded)
+        match = _SAMPLERATE_PATTERN.search(decoded)
+        if match:
+            return int(match.group(1))
+
+    raise RuntimeError(
+        "ffmpeg failed to open stream: {}".format(" ".join(output[-3:]).strip())
+    )
+
+
+def _log_output(stderr: IO[bytes]) -> None:
+    try:
+        for line in stderr:
+            logger.debug(f"ffmpeg: {line.decode(errors='replace').rstrip()}")
+    except ValueError:
+        # The pipe was closed
+        pass
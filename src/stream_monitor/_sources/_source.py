@@ -0,0 +1,29 @@
+import abc
+from typing import Tuple
+
+import numpy
+
+
+class Source(abc.ABC):
+    """Base class for all sources of (mono) audio samples.
+
+    Calling a source returns the next hop of samples along with the number of
+    samples actually read, which is less than hop_size at the end of the
+    stream. The returned buffer may be reused by the next call.
+    """
+
+    def __init__(self, url: str, hop_size: int) -> None:
+        self.url = url
+        self.hop_size = hop_size
+
+    @abc.abstractproperty
+    def samplerate(self) -> int:
+        pass
+
+    @abc.abstractmethod
+    def __call__(self) -> Tuple[numpy.ndarray, int]:
+        pass
+
+    @abc.abstractmethod
+    def close(self) -> None:
+        pass
@@ -0,0 +1,14 @@
+from typing import Dict, Type
+
+from . import _source
+from ._aubio_source import AubioSource
+from ._ffmpeg_source import FfmpegSource
+
+_SOURCES: Dict[str, Type[_source.Source]] = {
+    "aubio": AubioSource,
+    "ffmpeg": FfmpegSource,
+}
+
+
+def create_source(name: str, url: str, hop_size: int) -> _source.Source:
+    return _SOURCES[name](url, hop_size)
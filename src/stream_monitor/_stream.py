@@ -1,17 +1,59 @@
-import collections
-import datetime
+import logging
 import math
-import pathlib
-import tempfile
-from typing import Callable, Deque, Dict, Iterable
+import time
+from typing import Callable, Container, Dict, Iterable, List, Optional, Set, Tuple
 
 import aubio
-import pydub
+import numpy
 
-from . import _config, _errors, _matchers
+from . import (
+    _alerter,
+    _clips,
+    _config,
+    _decimator,
+    _errors,
+    _framer,
+    _matchers,
+    _metrics,
+    _pregate,
+    _reader,
+    _sources,
+    _window,
+)
+from ._config import _errors as _config_errors
+
+logger = logging.getLogger(__name__)
 
 _HOP_SIZE = 2048
 
+# Seconds of audio between load shedding decisions, so each one has time to
+# take effect
+_SHED_CHECK_INTERVAL = 5.0
+
+# When shedding load, analyze only one in this many hops at most
+_MAX_SHED_HOP_STRIDE = 8
+
+# Waiting on the source for this much of a hop's duration means nothing is
+# backed up: the stream is keeping pace with live, however late its audio is
+_CAUGHT_UP_WAIT = 0.5
+
+# Hops at the end of a cooldown that are given to the matchers to catch up on,
+# so they resume with history from the current audio
+_COOLDOWN_WARMUP_HOPS = 2
+
+
+def _decimation_factor(samplerate: int, analysis_samplerate: Optional[int]) -> int:
+    # The largest power of two that divides the hop and doesn't take the
+    # samplerate below the one requested
+    factor = 1
+    if analysis_samplerate:
+        while (
+            _HOP_SIZE % (factor * 2) == 0
+            and samplerate / (factor * 2) >= analysis_samplerate
+        ):
+            factor *= 2
+    return factor
+
 
 class Stream:
     def __init__(
@@ -19,76 +61,601 @@ class Stream:
         name: str,
         config: _config.StreamConfig,
         matchers: Iterable[_matchers.Matcher],
-        problem_callback: Callable[[str, str, pathlib.Path], None],
+        problem_callback: Callable[[str, str, _alerter.Clip], None],
+        *,
+        instrument: bool = False,
+        default_read_ahead: int = 0,
     ) -> None:
         self._name = name
         self._url = config.url()
         self._timeout = config.timeout()
         self._cooldown = config.cooldown()
         self._preceding_duration = config.preceding_duration()
+        # The caller may choose to read ahead unless configured otherwise
+        self._read_ahead = config.read_ahead(default_read_ahead)
+        self._source_name = config.source()
+        self._max_lag = config.max_lag()
 
-        self._problem_callback = problem_callback
         self._matchers = list(matchers)
 
         # Open stream
         self._open()
 
+        # Optionally run the matchers at a lower samplerate. Timeout, cooldown
+        # and the alert clip still work on the full-rate audio.
+        analysis_samplerate = config.analysis_samplerate()
+        factor = _decimation_factor(self._source.samplerate, analysis_samplerate)
+
+        # Every matcher needs at least one whole frame per analysis hop
+        frame_size = max(
+            (matcher.frame_size or 0 for matcher in self._matchers), default=0
+        )
+        if factor > 1 and frame_size > _HOP_SIZE // factor:
+            self._source.close()
+            max_factor = _decimation_factor(_HOP_SIZE, frame_size)
+            raise _config_errors.StreamConfigInvalidValueError(
+                "analysis_samplerate",
+                str(analysis_samplerate),
+                f"greater than {self._source.samplerate / (max_factor * 2):g} "
+                f"for the matchers' frames of {frame_size} samples",
+            )
+        self._decimator: Optional[_decimator.Decimator] = None
+        if factor > 1:
+            self._decimator = _decimator.Decimator(factor, _HOP_SIZE)
+            logger.debug(
+                f"Analyzing stream '{name}' at "
+                f"{self._source.samplerate / factor:g} Hz"
+            )
+        self._analysis_hop_size = _HOP_SIZE // factor
+
+        # Group the matchers by the frames they need, so each framing (and the
+        # features of each frame) is only computed once
+        framers: Dict[Tuple[int, int], _framer.Framer] = dict()
+        self._framed_matchers: Dict[_framer.Framer, List[int]] = dict()
+        for index, matcher in enumerate(self._matchers):
+            frame_size = matcher.frame_size or self._analysis_hop_size
+            hop_size = matcher.hop_size or frame_size
+            framer = framers.setdefault(
+                (frame_size, hop_size),
+                _framer.Framer(frame_size, hop_size, self._analysis_hop_size),
+            )
+            self._framed_matchers.setdefault(framer, list()).append(index)
+
+        # Optionally run the expensive matchers only on hops a cheap pre-gate
+        # finds suspicious, and on one in every pregate_interval hops
+        # otherwise, so problems it can't see are still caught (if later)
+        self._pregate_interval = config.pregate_interval()
+        self._expensive_matchers = [
+            index for index, matcher in enumerate(self._matchers) if matcher.expensive
+        ]
+        self._pregate: Optional[_pregate.PreGate] = None
+        if self._pregate_interval > 1 and self._expensive_matchers:
+            self._pregate = _pregate.PreGate()
+        self._pregate_hop_index = 0
+        self._pregated_hops = 0
+        self._outdated_matchers: Set[int] = set()
+        self._previous_analysis_hop = numpy.zeros(
+            self._analysis_hop_size, dtype=numpy.float32
+        )
+        self._previous_analysis_count = 0
+
+        # Matchers that don't complete a frame in a given hop keep their result
+        self._results: List[Tuple[float, bool]] = [(float("nan"), False)] * len(
+            self._matchers
+        )
+
+        self._metrics: Optional[_metrics.StreamMetrics] = None
+        if instrument:
+            self._metrics = _metrics.StreamMetrics(
+                matcher.name for matcher in self._matchers
+            )
+
+        self._reader: Optional[_reader.Reader] = None
+        if self._read_ahead > 0:
+            self._reader = _reader.Reader(
+                self._read_source, _HOP_SIZE, self._read_ahead, name=f"reader-{name}"
+            )
+
+        clip_settings = _clips.ClipSettings(
+            config.clip_format(), config.clip_bitrate(), config.clip_channels()
+        )
+        self._alerter = _alerter.Alerter(
+            name, problem_callback, clip_settings=clip_settings
+        )
+
         self._required_cooldown_sample_count = self._cooldown * self._source.samplerate
         self._cooldown_sample_count = 0
         self._in_cooldown = False
 
         self._match_sample_count = 0
+
+        # Audio read so far, against the earliest wall clock time it could have
+        # been read by, to tell how far behind live the stream is
+        self._audio_seconds = 0.0
+        self._earliest_start = float("inf")
+        self._lag = 0.0
+        self._caught_up = False
+
+        # Ways to shed load when the stream falls behind, from lightest to
+        # heaviest: the number of matchers to run (from the start of the list,
+        # so list them by importance), and how many hops to analyze one of.
+        # The hops in between reuse the last results.
+        self._shed_steps = [(len(self._matchers), 1)]
+        if len(self._matchers) > 1:
+            self._shed_steps.append((1, 1))
+        stride = 2
+        while stride <= _MAX_SHED_HOP_STRIDE:
+            self._shed_steps.append((min(len(self._matchers), 1), stride))
+            stride *= 2
+        self._shed_level = 0
+        self._shed_events = 0
+        self._shed_hops = 0
+        self._hop_index = 0
+        self._next_shed_check = _SHED_CHECK_INTERVAL
+        self._checked_lag = 0.0
+
         window_sample_count = (
             self._preceding_duration + self._timeout
         ) * self._source.samplerate
-        self._window_samples: Deque[aubio.fvec] = collections.deque(
-            maxlen=math.ceil(window_sample_count / _HOP_SIZE)
+        self._window_samples = _window.create_window(
+            config.window_storage(),
+            math.ceil(window_sample_count / _HOP_SIZE) * _HOP_SIZE,
         )
+        self._block: Optional[numpy.ndarray] = None
+
+        # Optionally keep the window encoded as it fills, so alerts don't need
+        # to encode it all
+        self._segments: Optional[_clips.SegmentEncoder] = None
+        segment_duration = config.clip_segment_duration()
+        if (
+            segment_duration > 0
+            and not _clips.FORMATS[clip_settings.format].concatenable
+        ):
+            logger.warning(
+                f"Clips for stream '{name}' can't be encoded in segments as "
+                f"{clip_settings.format}; encoding them when alerting instead"
+            )
+        elif segment_duration > 0:
+            self._segments = _clips.SegmentEncoder(
+                name,
+                self._source.samplerate,
+                math.ceil(segment_duration * self._source.samplerate),
+                self._window_samples.capacity,
+                clip_settings,
+            )
 
     def close(self) -> None:
+        if self._reader:
+            self._reader.close()
+        self._alerter.close()
+        if self._segments:
+            self._segments.close()
         self._source.close()
 
     def _open(self) -> None:
-        self._source = aubio.source(self._url, hop_size=_HOP_SIZE)
+        self._source = _sources.create_source(self._source_name, self._url, _HOP_SIZE)
+
+    @property
+    def reader_stats(self) -> Optional[_reader.ReaderStats]:
+        """Statistics of the read-ahead queue, if reading ahead."""
+
+        if self._reader:
+            return self._reader.stats()
+        return None
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def metrics(self) -> Optional[_metrics.StreamMetrics]:
+        """Latency histograms and counters, if instrumented."""
+
+        return self._metrics
+
+    @property
+    def hop_size(self) -> int:
+        return _HOP_SIZE
+
+    @property
+    def analysis_hop_size(self) -> int:
+        """Size of a hop once decimated for the matchers."""
+
+        return self._analysis_hop_size
+
+    @property
+    def matchers(self) -> List[_matchers.Matcher]:
+        return list(self._matchers)
+
+    @property
+    def lag(self) -> float:
+        """Seconds the stream has fallen behind since it was fastest."""
+
+        return self._lag
+
+    @property
+    def shed_level(self) -> int:
+        """How much load is being shed to catch up (0 when not shedding)."""
+
+        return self._shed_level
+
+    @property
+    def active_matcher_count(self) -> int:
+        """How many matchers (from the start of the list) the next analyzed
+        hop runs; the others are shed."""
+
+        matcher_count, _ = self._shed_steps[self._shed_level]
+        return matcher_count
+
+    def resynchronize_matchers(self, indices: Iterable[int]) -> None:
+        """Bring matchers that skipped hops up to date, before they're run on
+        the next hop elsewhere (e.g. batched with other streams)."""
+
+        self._resynchronize(indices)
+
+    @property
+    def in_cooldown(self) -> bool:
+        """Whether the next hop will be skipped due to cooldown."""
+
+        return (
+            self._in_cooldown
+            and self._cooldown_sample_count < self._required_cooldown_sample_count
+        )
+
+    @property
+    def skips_next_hop(self) -> bool:
+        """Whether the next hop won't be analyzed, due to cooldown or shedding."""
+
+        _, stride = self._shed_steps[self._shed_level]
+        return self.in_cooldown or (self._hop_index + 1) % stride != 0
+
+    def hop_ready(self) -> bool:
+        """Whether the next hop can be read without waiting on the source.
+
+        Without reading ahead, reading always waits on the source, so there's
+        always a hop "ready".
+        """
+
+        if not self._reader or self._reader.ready():
+            return True
+
+        # Waiting on the source means the stream has caught up with it
+        self._caught_up = True
+        return False
 
     def process_hop(self):
+        samples, sample_count = self.read_hop()
+        return self.process_samples(samples, sample_count)
+
+    def read_hop(self) -> Tuple[aubio.fvec, int]:
+        """Read the next hop, without processing it."""
+
+        return self._read()
+
+    def decimate(
+        self, samples: aubio.fvec, sample_count: int
+    ) -> Tuple[numpy.ndarray, int]:
+        """Decimate a hop to the samplerate the matchers run at.
+
+        The result is only valid until the next call.
+        """
+
+        if self._decimator:
+            return self._decimator.push(samples, sample_count)
+        return samples, sample_count
+
+    def process_samples(
+        self,
+        samples: aubio.fvec,
+        sample_count: int,
+        results: Optional[Dict[int, Tuple[float, bool]]] = None,
+        analysis_hop: Optional[Tuple[numpy.ndarray, int]] = None,
+    ):
+        """Process a hop previously read with read_hop().
+
+        Results for some matchers may have been computed elsewhere (e.g.
+        batched with other streams); those are given as a dict of results keyed
+        by the matcher's index, and those matchers aren't run again. If the hop
+        was already passed through decimate(), its result is given as
+        analysis_hop.
+        """
+
+        data = None
+        if not self._skip_cooldown(samples, sample_count):
+            self._write_window(samples, sample_count)
+            data = self._process_samples(samples, sample_count, results, analysis_hop)
+
+        if sample_count < self._source.hop_size:
+            raise _errors.EndOfStreamError(self._name)
+
+        return data
+
+    def process_hops(self, hop_count: int) -> List:
+        """Read up to hop_count hops ahead and analyze them as one block.
+
+        This is much faster than calling process_hop() repeatedly when there's
+        a backlog of audio to get through, e.g. for offline analysis. Unlike
+        process_hop(), the matchers also see hops that fall within a cooldown
+        period (their results are simply ignored). Returns a list of what
+        process_hop() would have returned for each hop.
+        """
+
+        if self._block is None or len(self._block) != hop_count:
+            self._block = numpy.zeros((hop_count, _HOP_SIZE), dtype=numpy.float32)
+        block = self._block
+
+        sample_counts: List[int] = list()
+        while len(sample_counts) < hop_count:
+            samples, sample_count = self._read()
+            block[len(sample_counts), :sample_count] = samples[:sample_count]
+            sample_counts.append(sample_count)
+            if sample_count < self._source.hop_size:
+                break
+
+        hop_results = self._analyze_block(block, sample_counts)
+
+        data: List = list()
+        for index, sample_count in enumerate(sample_counts):
+            # The matchers already saw this hop, so there's nothing to catch up
+            if self._skip_cooldown(block[index], sample_count, warm_up=False):
+                data.append(None)
+                continue
+
+            self._write_window(block[index], sample_count)
+
+            for matcher_index, results in enumerate(hop_results):
+                result = results[index]
+                if result is not None:
+                    self._results[matcher_index] = result
+
+            data.append(self._check_results(sample_count))
+
+        if sample_counts[-1] < self._source.hop_size:
+            raise _errors.EndOfStreamError(self._name)
+
+        return data
+
+    def _read(self) -> Tuple[aubio.fvec, int]:
+        start = time.perf_counter()
+        if self._reader:
+            hop = self._reader.read()
+        else:
+            hop = self._read_source()
+
+        now = time.perf_counter()
+        if self._metrics:
+            self._metrics.read.record(now - start)
+            self._metrics.hops += 1
+
+        # Keeping up with a live stream, audio and wall clock time advance
+        # together. Anything above the smallest difference seen since the
+        # stream last kept pace is lag. A source that stalled (e.g. the network
+        # went down) delays the audio for good, but that's no backlog.
+        hop_seconds = hop[1] / self._source.samplerate
+        self._audio_seconds += hop_seconds
+        start_time = now - self._audio_seconds
+        if self._caught_up or now - start >= hop_seconds * _CAUGHT_UP_WAIT:
+            self._caught_up = False
+            self._earliest_start = start_time
+        else:
+            self._earliest_start = min(self._earliest_start, start_time)
+        self._lag = start_time - self._earliest_start
+        self._update_shedding()
+
+        return hop
+
+    def metrics_snapshot(self) -> Dict:
+        """A picklable snapshot of the stream's current state and metrics."""
+
+        snapshot: Dict = {
+            "lag": self._lag,
+            "matcher_values": {
+                matcher.name: value
+                for matcher, (value, _) in zip(self._matchers, self._results)
+            },
+            "match_seconds": self._match_sample_count / self._source.samplerate,
+            "in_cooldown": self.in_cooldown,
+            "shed_level": self._shed_level,
+            "shed_events": self._shed_events,
+            "shed_hops": self._shed_hops,
+            "pregated_hops": self._pregated_hops,
+            "alerts": {
+                "sent": self._alerter.sent,
+                "dropped": self._alerter.dropped,
+                "failed": self._alerter.failed,
+            },
+        }
+
+        reader_stats = self.reader_stats
+        if reader_stats:
+            snapshot["reader"] = {
+                "depth": reader_stats.depth,
+                "capacity": reader_stats.capacity,
+                "underruns": reader_stats.underruns,
+            }
+
+        if self._metrics:
+            snapshot.update(self._metrics.snapshot())
+
+        return snapshot
+
+    def _read_source(self) -> Tuple[aubio.fvec, int]:
         try:
-            samples, sample_count = self._source()
+            return self._source()
         except RuntimeError:
             # Got an error of some sort... try reloading the source
-            self.close()
+            if self._metrics:
+                self._metrics.reconnects += 1
+            self._source.close()
             self._open()
-            samples, sample_count = self._source()
+            return self._source()
 
-        self._window_samples.append(samples.copy())
+    def _process_samples(
+        self,
+        samples: aubio.fvec,
+        sample_count: int,
+        results: Optional[Dict[int, Tuple[float, bool]]] = None,
+        analysis_hop: Optional[Tuple[numpy.ndarray, int]] = None,
+    ):
+        # When shedding load, only analyze some hops, with some matchers. The
+        # others are still given every hop to frame, and are resynchronized
+        # before they run again.
+        matcher_count, stride = self._shed_steps[self._shed_level]
+        self._hop_index += 1
+        batched: Set[int] = set()
+        if results:
+            for index, result in results.items():
+                if index < matcher_count:
+                    self._results[index] = result
+            batched.update(results)
 
-        data = self._process_samples(samples, sample_count)
+        if analysis_hop is None:
+            analysis_hop = self.decimate(samples, sample_count)
+        if self._hop_index % stride:
+            self._shed_hops += 1
+            skip = set(range(len(self._matchers)))
+        else:
+            skip = set(range(matcher_count, len(self._matchers)))
+            if self._pregate:
+                skip.update(self._gate(*analysis_hop, skip=skip | batched))
 
-        if sample_count < self._source.hop_size:
-            raise _errors.EndOfStreamError(self._name)
+        # Matchers run elsewhere are up to date
+        self._outdated_matchers.update(skip - batched)
+        self._analyze(*analysis_hop, skip=skip | batched)
 
-        return data
+        analysis_samples, analysis_count = analysis_hop
+        self._previous_analysis_hop[:analysis_count] = analysis_samples[:analysis_count]
+        self._previous_analysis_count = analysis_count
 
-    def _process_samples(self, samples: aubio.fvec, sample_count: int):
-        # Skip this set of samples if we're in cooldown
-        if self._in_cooldown:
-            current_count = self._cooldown_sample_count
-            self._cooldown_sample_count += sample_count
-            if current_count < self._required_cooldown_sample_count:
-                return
+        return self._check_results(sample_count)
 
-        self._in_cooldown = False
-        self._cooldown_sample_count = 0
-        data: Dict[str, float] = dict()
+    def _gate(
+        self, samples: numpy.ndarray, sample_count: int, skip: Set[int]
+    ) -> Set[int]:
+        # Return the expensive matchers to skip, unless the hop needs them
+        assert self._pregate
+        indices = [index for index in self._expensive_matchers if index not in skip]
+        self._pregate_hop_index += 1
+        suspicious = self._pregate.suspicious(samples, sample_count)
+
+        # Once anything matches, keep running at full rate so the time the
+        # problem lasts is counted hop by hop. Skipped matchers keep their
+        # last results, which therefore never match.
+        if (
+            suspicious
+            or self._match_sample_count
+            or any(self._results[index][1] for index in indices)
+            or self._pregate_hop_index % self._pregate_interval == 0
+        ):
+            return set()
+
+        if indices:
+            self._pregated_hops += 1
+        return set(indices)
+
+    def _update_shedding(self) -> None:
+        if not self._max_lag or self._audio_seconds < self._next_shed_check:
+            return
+
+        self._next_shed_check = self._audio_seconds + _SHED_CHECK_INTERVAL
+        lag = self._lag
+        previous_lag = self._checked_lag
+        self._checked_lag = lag
+
+        # Shed more while still falling behind, and recover once well within
+        # the limit, so the level doesn't flap around it
+        if (
+            lag > self._max_lag
+            and lag > previous_lag
+            and self._shed_level < len(self._shed_steps) - 1
+        ):
+            self._shed_level += 1
+            self._shed_events += 1
+            logger.warning(
+                f"Stream '{self._name}' is {lag:.1f}s behind live, shedding load: "
+                f"{self._describe_shedding()}"
+            )
+        elif lag < self._max_lag / 2 and self._shed_level > 0:
+            self._shed_level -= 1
+            logger.info(
+                f"Stream '{self._name}' is {lag:.1f}s behind live, recovering: "
+                f"{self._describe_shedding()}"
+            )
+
+    def _describe_shedding(self) -> str:
+        matcher_count, stride = self._shed_steps[self._shed_level]
+        return (
+            f"running {matcher_count} of {len(self._matchers)} matchers on one in "
+            f"{stride} hops"
+        )
+
+    def _write_window(self, samples: aubio.fvec, sample_count: int) -> None:
+        start = time.perf_counter()
+        self._window_samples.write(samples, sample_count)
+        if self._segments:
+            self._segments.write(samples, sample_count)
+        if self._metrics:
+            self._metrics.window.record(time.perf_counter() - start)
+
+    def _skip_cooldown(
+        self, samples: aubio.fvec, sample_count: int, warm_up: bool = True
+    ) -> bool:
+        if not self._in_cooldown:
+            return False
+
+        remaining = self._required_cooldown_sample_count - self._cooldown_sample_count
+        if remaining <= 0:
+            # Matchers start afresh rather than with results from before
+            self._in_cooldown = False
+            self._cooldown_sample_count = 0
+            self._results = [(float("nan"), False)] * len(self._matchers)
+            return False
+
+        self._cooldown_sample_count += sample_count
+        if self._metrics:
+            self._metrics.cooldown_skipped_hops += 1
+
+        # Audio is otherwise discarded, except for what will still be in the
+        # window by the end of the cooldown
+        if remaining <= self._window_samples.capacity:
+            self._write_window(samples, sample_count)
+        if warm_up and remaining <= _COOLDOWN_WARMUP_HOPS * _HOP_SIZE:
+            self._warm_up(samples, sample_count)
+
+        return True
+
+    def _warm_up(self, samples: aubio.fvec, sample_count: int) -> None:
+        # Feed a hop to the decimator, framers and matchers' history without
+        # analyzing it
+        samples, sample_count = self.decimate(samples, sample_count)
+        for framer in self._framed_matchers:
+            framer.push(samples, sample_count)
         for matcher in self._matchers:
-            value, match = matcher.process_samples(samples, sample_count)
+            matcher.resynchronize(samples, sample_count)
+
+        self._outdated_matchers.clear()
+        self._previous_analysis_hop[:sample_count] = samples[:sample_count]
+        self._previous_analysis_count = sample_count
+
+    def _check_results(self, sample_count: int):
+        # Matchers shed to catch up don't take part
+        matcher_count, _ = self._shed_steps[self._shed_level]
+        data: Dict[str, float] = {
+            matcher.name: float("nan") for matcher in self._matchers[matcher_count:]
+        }
+        for matcher, (value, match) in zip(
+            self._matchers[:matcher_count], self._results
+        ):
             data[matcher.name] = value
 
             if match:
                 self._match_sample_count += sample_count
                 seconds = self._match_sample_count / self._source.samplerate
                 if seconds > self._timeout:
+                    start = time.perf_counter()
                     self._handle_detected_problem(matcher.name)
+                    if self._metrics:
+                        self._metrics.alert.record(time.perf_counter() - start)
 
                     # Trigger cooldown period
                     self._in_cooldown = True
@@ -98,31 +665,102 @@ class Stream:
 
         return (sample_count / self._source.samplerate, data)
 
-    def _handle_detected_problem(self, matcher_name: str) -> None:
-        now = datetime.datetime.now()
-        datestamp = now.strftime("%Y-%m-%d")
-        timestamp = now.strftime("%H:%M:%S")
-        path = pathlib.Path(
-            f"{tempfile.gettempdir()}/{self._name}_{datestamp}_{timestamp}.mp3"
-        )
+    def _analyze(
+        self, samples: aubio.fvec, sample_count: int, skip: Container[int] = ()
+    ) -> None:
+        for framer, all_indices in self._framed_matchers.items():
+            # Every hop goes through the framers, even when none of their
+            # matchers run, so frames never join audio from hops far apart
+            frames = framer.push(samples, sample_count)
+            indices = [index for index in all_indices if index not in skip]
+            self._resynchronize(indices)
+            if not indices or not len(frames):
+                continue
+
+            # A hop matches if every frame it completed matched
+            matches = [True] * len(indices)
+            for frame in frames:
+                features = _matchers.Features(frame, framer.hop_size)
+                for position, index in enumerate(indices):
+                    matcher = self._matchers[index]
+                    start = time.perf_counter()
+                    value, match = matcher.process_features(features)
+                    if self._metrics:
+                        self._metrics.matchers[matcher.name].record(
+                            time.perf_counter() - start
+                        )
+                    matches[position] = matches[position] and match
+                    self._results[index] = (value, matches[position])
+
+    def _resynchronize(self, indices: Iterable[int]) -> None:
+        # Give matchers that skipped hops the last one, before they run again
+        for index in indices:
+            if index in self._outdated_matchers:
+                self._matchers[index].resynchronize(
+                    self._previous_analysis_hop, self._previous_analysis_count
+                )
+                self._outdated_matchers.discard(index)
 
-        # aubio only supports writing wav files, so use pydub to convert it to mp3
-        with tempfile.NamedTemporaryFile(suffix=".wav") as f:
-            with aubio.sink(f.name, self._source.samplerate) as output:
-                for match_samples in self._window_samples:
-                    output(match_samples, self._source.hop_size)
-
-            wav_file = pydub.AudioSegment.from_wav(f)
-            wav_file.export(
-                path,
-                format="mp3",
-                tags={
-                    "artist": "Stream Monitor",
-                    "title": f"Problematic audio from stream {self._name} on {datestamp} at {timestamp}",
-                },
+    def _analyze_block(
+        self, block: numpy.ndarray, sample_counts: List[int]
+    ) -> List[List[Optional[Tuple[float, bool]]]]:
+        """Run each matcher over a block of hops in one batch.
+
+        Returns, per matcher, the result for each hop (None for hops in which
+        the matcher didn't complete a frame).
+        """
+
+        hop_count = len(sample_counts)
+        sample_count = sum(sample_counts)
+        if sample_counts[-1] < _HOP_SIZE:
+            # Only the last hop can be partial
+            samples = block.reshape(-1)[:sample_count]
+        else:
+            samples = block.reshape(-1)
+        samples, sample_count = self.decimate(samples, sample_count)
+
+        hop_results: List[List[Optional[Tuple[float, bool]]]] = [
+            [None] * hop_count for _ in self._matchers
+        ]
+        for framer, indices in self._framed_matchers.items():
+            frames = framer.push(samples, sample_count)
+            if not len(frames):
+                continue
+
+            # Work out which hop each frame completes in
+            frame_ends = framer.first_frame_end + framer.hop_size * numpy.arange(
+                len(frames)
             )
+            frame_hops = (frame_ends - 1) // self._analysis_hop_size
+            frame_counts = numpy.bincount(frame_hops, minlength=hop_count)
+            last_frames = numpy.cumsum(frame_counts) - 1
 
-            try:
-                self._problem_callback(self._name, matcher_name, path)
-            finally:
-                path.unlink()
+            for index in indices:
+                matcher = self._matchers[index]
+                start = time.perf_counter()
+                values, matches = matcher.process_batch(frames, framer.hop_size)
+                if self._metrics:
+                    self._metrics.matchers[matcher.name].record(
+                        time.perf_counter() - start
+                    )
+
+                # A hop matches if every frame it completed matched
+                match_counts = numpy.bincount(
+                    frame_hops, weights=matches, minlength=hop_count
+                )
+                for hop in numpy.flatnonzero(frame_counts):
+                    hop_results[index][hop] = (
+                        float(values[last_frames[hop]]),
+                        bool(match_counts[hop] == frame_counts[hop]),
+                    )
+
+        return hop_results
+
+    def _handle_detected_problem(self, matcher_name: str) -> None:
+        # Snapshot the window now; it keeps being overwritten while the alert
+        # is encoded and delivered in the background.
+        if self._segments:
+            segments, samples = self._segments.snapshot(len(self._window_samples))
+        else:
+            segments, samples = (), self._window_samples.samples()
+        self._alerter.submit(matcher_name, samples, self._source.samplerate, segments)
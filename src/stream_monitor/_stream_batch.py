@@ -0,0 +1,135 @@
+import contextlib
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy
+
+from . import _errors, _matchers, _stream
+
+
+class StreamBatch:
+    """Analyze the current hop of several streams together.
+
+    Each hop, the current hop of every stream is collected into one
+    (streams, hop) array, and matchers that take whole hops are run over all
+    streams at once with Matcher.process_streams(). Matchers with other
+    framings are run per stream as usual. Each stream keeps its own matcher,
+    timeout and cooldown state.
+    """
+
+    def __init__(self, streams: Sequence[_stream.Stream]) -> None:
+        self._streams = list(streams)
+        self._matchers = [stream.matchers for stream in self._streams]
+        self._hop_size = self._streams[0].analysis_hop_size
+        self._block = numpy.zeros(
+            (len(self._streams), self._hop_size), dtype=numpy.float32
+        )
+
+        # Batch matchers by their position in each stream's list of matchers.
+        # This only works if every stream has the same kind of matcher there,
+        # and analyzes hops of the same size.
+        self._batched_indices: List[int] = list()
+        if any(stream.analysis_hop_size != self._hop_size for stream in streams):
+            return
+        for index, matcher in enumerate(self._matchers[0]):
+            if all(
+                len(stream_matchers) > index
+                and type(stream_matchers[index]) is type(matcher)
+                and _takes_whole_hops(stream_matchers[index], self._hop_size)
+                for stream_matchers in self._matchers
+            ):
+                self._batched_indices.append(index)
+
+    def process_hop(self, ready_only: bool = False) -> List:
+        """Process one hop of every stream.
+
+        Returns a list of what Stream.process_hop() would have returned for
+        each stream. If a stream fails, its error is raised as a
+        StreamFailedError naming it (an EndOfStreamError already does).
+
+        With ready_only, streams without a hop ready (see Stream.hop_ready())
+        are left for the next call rather than waited for; None is returned
+        for them.
+        """
+
+        ready = [
+            row
+            for row, stream in enumerate(self._streams)
+            if not ready_only or stream.hop_ready()
+        ]
+        hops: Dict[int, Tuple[numpy.ndarray, int]] = dict()
+        for row in ready:
+            with _stream_errors(self._streams[row]):
+                hops[row] = self._streams[row].read_hop()
+
+        # Streams in cooldown (or shedding load) don't run their matchers
+        rows = [row for row in ready if not self._streams[row].skips_next_hop]
+        results: List[Dict[int, Tuple[float, bool]]] = [dict() for _ in self._streams]
+        analysis_hops: List[Optional[Tuple[numpy.ndarray, int]]] = [None] * len(
+            self._streams
+        )
+        if rows and self._batched_indices:
+            for row in rows:
+                samples, sample_count = hops[row]
+                samples, sample_count = self._streams[row].decimate(
+                    samples, sample_count
+                )
+                analysis_hops[row] = (samples, sample_count)
+                self._block[row, :sample_count] = samples[:sample_count]
+                self._block[row, sample_count:] = 0
+
+            for index in self._batched_indices:
+                # Streams shedding load may not run this matcher
+                matcher_rows = [
+                    row
+                    for row in rows
+                    if index < self._streams[row].active_matcher_count
+                ]
+                if not matcher_rows:
+                    continue
+
+                for row in matcher_rows:
+                    self._streams[row].resynchronize_matchers([index])
+                matchers = [self._matchers[row][index] for row in matcher_rows]
+                features = _matchers.Features(self._block[matcher_rows], self._hop_size)
+                start = time.perf_counter()
+                values, matches = type(matchers[0]).process_streams(matchers, features)
+                elapsed = time.perf_counter() - start
+
+                for row, matcher, value, match in zip(
+                    matcher_rows, matchers, values, matches
+                ):
+                    results[row][index] = (float(value), bool(match))
+
+                    # Each stream is charged its share of the batch
+                    metrics = self._streams[row].metrics
+                    if metrics:
+                        metrics.matchers[matcher.name].record(
+                            elapsed / len(matcher_rows)
+                        )
+
+        data: List = [None] * len(self._streams)
+        for row in ready:
+            stream = self._streams[row]
+            samples, sample_count = hops[row]
+            with _stream_errors(stream):
+                data[row] = stream.process_samples(
+                    samples, sample_count, results[row], analysis_hops[row]
+                )
+        return data
+
+
+@contextlib.contextmanager
+def _stream_errors(stream: _stream.Stream) -> Iterator[None]:
+    try:
+        yield
+    except _errors.EndOfStreamError:
+        raise
+    except Exception as e:
+        raise _errors.StreamFailedError(stream.name, e) from e
+
+
+def _takes_whole_hops(matcher: _matchers.Matcher, stream_hop_size: int) -> bool:
+    frame_size = matcher.frame_size or stream_hop_size
+    hop_size = matcher.hop_size or frame_size
+    return frame_size == hop_size == stream_hop_size
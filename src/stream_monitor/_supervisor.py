@@ -0,0 +1,272 @@
+import collections
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import random
+import signal
+import time
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds before restarting a process that exited, doubling with every
+# consecutive crash up to the maximum. Each delay is jittered, so processes
+# that crashed together (e.g. when the network went down) don't all restart
+# at once.
+_RESTART_DELAY = 1.0
+_MAX_RESTART_DELAY = 300.0
+
+# A process that ran for this many seconds before crashing is restarted as
+# quickly as if it had never crashed before
+_STABLE_UPTIME = 60.0
+
+# A process crashing this many times within the window is crash looping: it's
+# only restarted after the maximum delay from then on
+_CRASH_LOOP_RESTARTS = 5
+_CRASH_LOOP_WINDOW = 600.0
+
+# Seconds a process is given to stop once asked to, before it's terminated
+_STOP_TIMEOUT = 10.0
+
+# Processes are forked by a fork server: a fresh process, started on first
+# use, that does nothing else. Forking the supervising process itself would
+# copy the state of its threads (e.g. locks they hold) and its sockets into
+# every process it restarts.
+_CONTEXT = multiprocessing.get_context("forkserver")
+
+
+class _Supervised:
+    """A process monitoring one or more streams, and its restarts."""
+
+    def __init__(
+        self, stream_names: Sequence[str], target: Callable, args: Sequence[Any]
+    ) -> None:
+        self.stream_names = list(stream_names)
+        self.target = target
+        self.args = tuple(args)
+        self.process: Optional[multiprocessing.process.BaseProcess] = None
+        self.started = 0.0
+        self.restart_at: Optional[float] = None
+        self.restarts = 0
+        self.failures = 0
+        self.crashes: Deque[float] = collections.deque()
+        self.crash_looping = False
+        self.stopped = False
+
+    @property
+    def description(self) -> str:
+        names = ", ".join(f"'{name}'" for name in self.stream_names)
+        plural = "s" if len(self.stream_names) > 1 else ""
+        return f"stream{plural} {names}"
+
+
+class Supervisor:
+    """Keep the processes monitoring streams running.
+
+    Each process is supervised on its own: when one crashes, only it is
+    restarted, and the other streams carry on undisturbed. Restarts back off
+    exponentially (with jitter) while a process keeps crashing, and a process
+    crashing over and over is flagged as crash looping and only retried every
+    max_restart_delay seconds. A process that exits cleanly was asked to stop
+    (e.g. by SIGINT), so it isn't restarted.
+
+    Processes are started by a fork server rather than by forking the
+    supervising process, so the target and its arguments must be picklable.
+    Nothing else is inherited: initializer(*initargs) is called in each
+    process first, e.g. to set up logging.
+    """
+
+    def __init__(
+        self,
+        restart_delay: float = _RESTART_DELAY,
+        max_restart_delay: float = _MAX_RESTART_DELAY,
+        stable_uptime: float = _STABLE_UPTIME,
+        crash_loop_restarts: int = _CRASH_LOOP_RESTARTS,
+        crash_loop_window: float = _CRASH_LOOP_WINDOW,
+        stop_timeout: float = _STOP_TIMEOUT,
+        initializer: Optional[Callable] = None,
+        initargs: Sequence[Any] = (),
+    ) -> None:
+        self._restart_delay = restart_delay
+        self._max_restart_delay = max_restart_delay
+        self._stable_uptime = stable_uptime
+        self._crash_loop_restarts = crash_loop_restarts
+        self._crash_loop_window = crash_loop_window
+        self._stop_timeout = stop_timeout
+        self._initializer = initializer
+        self._initargs = tuple(initargs)
+        self._supervised: List[_Supervised] = list()
+
+    @property
+    def context(self) -> multiprocessing.context.BaseContext:
+        """The multiprocessing context processes are started with.
+
+        Queues and other objects shared with the processes must come from it.
+        """
+
+        return _CONTEXT
+
+    def add(
+        self, stream_names: Sequence[str], target: Callable, args: Sequence[Any]
+    ) -> None:
+        """Supervise a process running target(*args) to monitor streams."""
+
+        self._supervised.append(_Supervised(stream_names, target, args))
+
+    def start(self) -> None:
+        for supervised in self._supervised:
+            self._start(supervised)
+
+    def running(self) -> bool:
+        """Whether any process is running, or waiting to be restarted."""
+
+        return any(not supervised.stopped for supervised in self._supervised)
+
+    def check(self, timeout: float = 0.0) -> None:
+        """Handle processes that exited, and restart those that are due.
+
+        This waits up to timeout seconds for something to do.
+        """
+
+        now = time.monotonic()
+        sentinels = list()
+        deadline = now + timeout
+        for supervised in self._supervised:
+            if supervised.stopped:
+                continue
+
+            if supervised.restart_at is not None:
+                if supervised.restart_at <= now:
+                    self._start(supervised)
+                else:
+                    deadline = min(deadline, supervised.restart_at)
+                    continue
+
+            assert supervised.process
+            if supervised.process.exitcode is None:
+                sentinels.append(supervised.process.sentinel)
+            else:
+                self._exited(supervised, now)
+                if supervised.restart_at is not None:
+                    deadline = min(deadline, supervised.restart_at)
+
+        wait = deadline - time.monotonic()
+        if sentinels and wait > 0:
+            multiprocessing.connection.wait(sentinels, wait)
+        elif wait > 0 and self.running():
+            time.sleep(wait)
+
+    def stop(self) -> None:
+        """Ask all processes to stop, and wait for them to.
+
+        Processes that haven't stopped within stop_timeout seconds are
+        terminated.
+        """
+
+        stopping: List[Tuple[_Supervised, multiprocessing.process.BaseProcess]] = list()
+        for supervised in self._supervised:
+            supervised.stopped = True
+            process = supervised.process
+            if process and process.pid and process.exitcode is None:
+                logger.info(f"Shutting down monitor for {supervised.description}")
+                os.kill(process.pid, signal.SIGINT)
+                stopping.append((supervised, process))
+
+        deadline = time.monotonic() + self._stop_timeout
+        for supervised, process in stopping:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.exitcode is None:
+                logger.warning(
+                    f"Monitor for {supervised.description} didn't stop within "
+                    f"{self._stop_timeout:.0f} second(s); terminating it"
+                )
+                process.terminate()
+                process.join()
+
+    def metrics_snapshot(self) -> Dict[str, Dict]:
+        """How long each stream has been monitored for since its last restart,
+        how many times it was restarted, and whether it's crash looping."""
+
+        now = time.monotonic()
+        snapshot: Dict[str, Dict] = dict()
+        for supervised in self._supervised:
+            process = supervised.process
+            running = process is not None and process.exitcode is None
+            for stream_name in supervised.stream_names:
+                snapshot[stream_name] = {
+                    "uptime": now - supervised.started if running else 0.0,
+                    "restarts": supervised.restarts,
+                    "crash_looping": supervised.crash_looping,
+                }
+        return snapshot
+
+    def _start(self, supervised: _Supervised) -> None:
+        if supervised.process is not None:
+            supervised.restarts += 1
+            logger.info(f"Restarting monitor for {supervised.description}")
+
+        supervised.process = _CONTEXT.Process(
+            target=_bootstrap,
+            args=(
+                self._initializer,
+                self._initargs,
+                supervised.target,
+                supervised.args,
+            ),
+        )
+        supervised.process.start()
+        supervised.started = time.monotonic()
+        supervised.restart_at = None
+
+    def _exited(self, supervised: _Supervised, now: float) -> None:
+        assert supervised.process
+        exitcode = supervised.process.exitcode
+        uptime = now - supervised.started
+        if exitcode == 0:
+            logger.info(f"Monitor for {supervised.description} has stopped")
+            supervised.stopped = True
+            return
+
+        if uptime >= self._stable_uptime:
+            supervised.failures = 0
+        supervised.failures += 1
+
+        # Only crashes within the window count towards a crash loop
+        supervised.crashes.append(now)
+        while supervised.crashes[0] < now - self._crash_loop_window:
+            supervised.crashes.popleft()
+        crash_looping = len(supervised.crashes) >= self._crash_loop_restarts
+        if crash_looping and not supervised.crash_looping:
+            logger.critical(
+                f"Monitor for {supervised.description} is crash looping: it "
+                f"crashed {len(supervised.crashes)} times in "
+                f"{self._crash_loop_window:.0f} second(s)"
+            )
+        supervised.crash_looping = crash_looping
+
+        if crash_looping:
+            delay = self._max_restart_delay
+        else:
+            delay = min(
+                self._restart_delay * 2 ** (supervised.failures - 1),
+                self._max_restart_delay,
+            )
+        delay *= random.uniform(0.5, 1)
+        logger.critical(
+            f"Monitor for {supervised.description} has crashed (exit code "
+            f"{exitcode}) after {uptime:.0f} second(s); restarting in "
+            f"{delay:.0f} second(s)"
+        )
+        supervised.restart_at = now + delay
+
+
+def _bootstrap(
+    initializer: Optional[Callable],
+    initargs: Sequence[Any],
+    target: Callable,
+    args: Sequence[Any],
+) -> None:
+    if initializer:
+        initializer(*initargs)
+    target(*args)
@@ -0,0 +1,244 @@
+import collections
+import zlib
+from typing import Deque, Dict, Tuple, Type, Union
+
+import numpy
+
+# Samples per compressed block (about 1.5 seconds at 44.1 kHz). Longer blocks
+# compress better, but more of the oldest one is kept beyond the capacity.
+_COMPRESSED_BLOCK_SIZE = 65536
+
+# Fast, and barely worse than the higher levels on audio
+_COMPRESSION_LEVEL = 1
+
+
+class Int16Encoder:
+    """Convert float samples to 16-bit integers, without allocating.
+
+    This matches aubio's wav sink (scale, truncate, then wrap around), so a
+    clip written from these samples is identical to one written from the
+    original floats.
+    """
+
+    def __init__(self) -> None:
+        self._scaled = numpy.zeros(0, dtype=numpy.float32)
+        self._truncated = numpy.zeros(0, dtype=numpy.int32)
+
+    def __call__(
+        self, samples: numpy.ndarray, sample_count: int, out: numpy.ndarray
+    ) -> numpy.ndarray:
+        if len(self._scaled) < sample_count:
+            self._scaled = numpy.zeros(sample_count, dtype=numpy.float32)
+            self._truncated = numpy.zeros(sample_count, dtype=numpy.int32)
+
+        scaled = self._scaled[:sample_count]
+        truncated = self._truncated[:sample_count]
+        numpy.multiply(samples[:sample_count], 32768, out=scaled)
+        truncated[:] = scaled
+        out[:sample_count] = truncated
+        return out[:sample_count]
+
+
+def decode_int16(samples: numpy.ndarray) -> numpy.ndarray:
+    return numpy.divide(samples, 32768, dtype=numpy.float32)
+
+
+class Window:
+    """Fixed-size ring buffer holding the most recent samples of a stream.
+
+    The buffer is allocated once up front and samples are written into it in
+    place, so appending a hop never allocates.
+    """
+
+    _dtype: Type[numpy.number] = numpy.float32
+
+    def __init__(self, capacity: int) -> None:
+        self._buffer = numpy.zeros(capacity, dtype=self._dtype)
+        self._cursor = 0
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used to store the samples."""
+
+        return self._buffer.nbytes
+
+    def write(self, samples: numpy.ndarray, sample_count: int) -> None:
+        samples = self._encode(samples, sample_count)
+
+        capacity = len(self._buffer)
+        if sample_count >= capacity:
+            # Only the tail of these samples fits in the window
+            self._buffer[:] = samples[sample_count - capacity : sample_count]
+            self._cursor = 0
+            self._length = capacity
+            return
+
+        end = self._cursor + sample_count
+        if end <= capacity:
+            self._buffer[self._cursor : end] = samples[:sample_count]
+        else:
+            split = capacity - self._cursor
+            self._buffer[self._cursor :] = samples[:split]
+            self._buffer[: end - capacity] = samples[split:sample_count]
+
+        self._cursor = end % capacity
+        self._length = min(self._length + sample_count, capacity)
+
+    def views(self) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """Return the window contents in chronological order.
+
+        The contents are returned as two views into the underlying buffer
+        (the second of which may be empty), as stored. They are only valid
+        until the next write.
+        """
+
+        if self._length < len(self._buffer):
+            return (
+                self._buffer[self._cursor - self._length : self._cursor],
+                self._buffer[:0],
+            )
+
+        return self._buffer[self._cursor :], self._buffer[: self._cursor]
+
+    def samples(self) -> numpy.ndarray:
+        """Return a copy of the window contents as float samples."""
+
+        return self._decode(numpy.concatenate(self.views()))
+
+    def clear(self) -> None:
+        self._cursor = 0
+        self._length = 0
+
+    def _encode(self, samples: numpy.ndarray, sample_count: int) -> numpy.ndarray:
+        return samples
+
+    def _decode(self, samples: numpy.ndarray) -> numpy.ndarray:
+        return samples
+
+
+class Int16Window(Window):
+    """A Window storing 16-bit samples, at half the memory.
+
+    Samples are converted the way they would be when written to a clip, so
+    clips are unaffected.
+    """
+
+    _dtype = numpy.int16
+
+    def __init__(self, capacity: int) -> None:
+        super().__init__(capacity)
+        self._encoder = Int16Encoder()
+        self._encoded = numpy.zeros(0, dtype=numpy.int16)
+
+    def _encode(self, samples: numpy.ndarray, sample_count: int) -> numpy.ndarray:
+        if len(self._encoded) < sample_count:
+            self._encoded = numpy.zeros(sample_count, dtype=numpy.int16)
+        return self._encoder(samples, sample_count, self._encoded)
+
+    def _decode(self, samples: numpy.ndarray) -> numpy.ndarray:
+        return decode_int16(samples)
+
+
+class CompressedWindow:
+    """A window storing 16-bit samples, compressed losslessly in blocks.
+
+    Samples are collected into a block, which is compressed once full. Blocks
+    are only decompressed when the contents are requested, so this trades
+    a little CPU for memory. The contents are the same as an Int16Window's.
+    """
+
+    def __init__(self, capacity: int, block_size: int = _COMPRESSED_BLOCK_SIZE) -> None:
+        self._capacity = capacity
+        self._blocks: Deque[Tuple[bytes, int]] = collections.deque()
+        self._block_sample_count = 0
+
+        self._encoder = Int16Encoder()
+        self._pending = numpy.zeros(block_size, dtype=numpy.int16)
+        self._pending_count = 0
+        self._deltas = numpy.zeros(block_size, dtype=numpy.int16)
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used to store the samples."""
+
+        return self._pending.nbytes + sum(len(block) for block, _ in self._blocks)
+
+    def write(self, samples: numpy.ndarray, sample_count: int) -> None:
+        self._length = min(self._length + sample_count, self._capacity)
+
+        start = 0
+        while start < sample_count:
+            count = min(sample_count - start, len(self._pending) - self._pending_count)
+            end = self._pending_count + count
+            self._encoder(
+                samples[start:], count, self._pending[self._pending_count : end]
+            )
+            self._pending_count = end
+            start += count
+
+            if self._pending_count == len(self._pending):
+                self._compress_pending()
+
+    def samples(self) -> numpy.ndarray:
+        """Return a copy of the window contents as float samples."""
+
+        blocks = [_decompress(block) for block, _ in self._blocks]
+        blocks.append(self._pending[: self._pending_count])
+        samples = numpy.concatenate(blocks)
+        return decode_int16(samples[len(samples) - self._length :])
+
+    def clear(self) -> None:
+        self._blocks.clear()
+        self._block_sample_count = 0
+        self._pending_count = 0
+        self._length = 0
+
+    def _compress_pending(self) -> None:
+        # Deltas between consecutive samples compress much better than the
+        # samples themselves. They wrap around, so decoding is exact.
+        self._deltas[0] = self._pending[0]
+        numpy.subtract(self._pending[1:], self._pending[:-1], out=self._deltas[1:])
+        block = zlib.compress(self._deltas.tobytes(), _COMPRESSION_LEVEL)
+
+        self._blocks.append((block, len(self._pending)))
+        self._block_sample_count += len(self._pending)
+        self._pending_count = 0
+
+        # Drop the blocks that have gone out of the window entirely
+        while self._block_sample_count - self._blocks[0][1] >= self._capacity:
+            _, count = self._blocks.popleft()
+            self._block_sample_count -= count
+
+
+def _decompress(block: bytes) -> numpy.ndarray:
+    deltas = numpy.frombuffer(zlib.decompress(block), dtype=numpy.int16)
+    return numpy.cumsum(deltas, dtype=numpy.int16)
+
+
+AnyWindow = Union[Window, CompressedWindow]
+
+_STORAGES: Dict[str, Type] = {
+    "float32": Window,
+    "int16": Int16Window,
+    "zlib": CompressedWindow,
+}
+
+
+def create_window(storage: str, capacity: int) -> AnyWindow:
+    return _STORAGES[storage](capacity)
@@ -0,0 +1,713 @@
+import argparse
+import configparser
+import json
+import logging
+import multiprocessing
+import pathlib
+import platform
+import resource
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+import aubio
+import numpy
+
+from . import (
+    _alerter,
+    _clips,
+    _config,
+    _errors,
+    _matchers,
+    _notification_service,
+    _notifier,
+    _outbox,
+    _smtp_server,
+    _sources,
+    _stream,
+)
+
+_SAMPLERATE = 44100
+_WRITE_SIZE = 2048
+
+_MATCHERS: Dict[str, Sequence[Type[_matchers.Matcher]]] = {
+    "pitch": [_matchers.PitchConfidenceMatcher],
+    "vocoder": [_matchers.VocoderMatcher],
+    "spl": [_matchers.SoundPressureLevelRateOfChangeMatcher],
+}
+_MATCHERS["all"] = [
+    matcher_type
+    for matcher_types in _MATCHERS.values()
+    for matcher_type in matcher_types
+]
+
+# Metrics compared by --compare, and whether higher is better
+_COMPARED_METRICS = {
+    "hops_per_second": True,
+    "realtime_factor": False,
+    "peak_bytes_per_hop": False,
+    "retained_blocks_per_hop": False,
+}
+
+# Seconds to wait for a burst of notifications to be delivered
+_NOTIFY_TIMEOUT = 120.0
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="stream-monitor bench",
+        description="Measure how fast streams are analyzed.",
+    )
+    parser.add_argument(
+        "--corpus",
+        type=pathlib.Path,
+        help="directory of audio files to analyze (defaults to synthesized audio)",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=30.0,
+        help="seconds of audio to synthesize per corpus entry",
+    )
+    parser.add_argument(
+        "--matchers",
+        nargs="+",
+        choices=sorted(_MATCHERS),
+        default=sorted(_MATCHERS),
+        help="matcher configurations to measure",
+    )
+    parser.add_argument(
+        "--source", default="aubio", help="source used to decode the corpus"
+    )
+    parser.add_argument(
+        "--analysis-samplerate", type=int, help="samplerate to run the matchers at"
+    )
+    parser.add_argument(
+        "--pregate-interval",
+        type=int,
+        default=1,
+        help="run expensive matchers on one in this many healthy-looking hops",
+    )
+    parser.add_argument(
+        "--block",
+        type=int,
+        default=0,
+        help="analyze this many hops at a time with Stream.process_hops()",
+    )
+    parser.add_argument(
+        "--instrument",
+        action="store_true",
+        help="collect stream metrics, to measure their overhead",
+    )
+    parser.add_argument(
+        "--alloc-hops",
+        type=int,
+        default=100,
+        help="number of hops to trace allocations for",
+    )
+    parser.add_argument(
+        "--clip-formats",
+        nargs="+",
+        choices=sorted(_clips.FORMATS),
+        default=list(),
+        help="also measure encoding each corpus entry as a clip in these formats",
+    )
+    parser.add_argument(
+        "--clip-bitrate", type=int, help="bitrate (kbit/s) to encode clips at"
+    )
+    parser.add_argument(
+        "--notify",
+        type=int,
+        default=0,
+        metavar="BURST",
+        help=(
+            "also measure notifying of this many problems at once, against a "
+            "local SMTP stand-in, while a stream is analyzed"
+        ),
+    )
+    parser.add_argument(
+        "--notify-bursts", type=int, default=5, help="number of bursts to notify of"
+    )
+    parser.add_argument(
+        "--smtp-tls",
+        choices=("ssl", "starttls"),
+        default="ssl",
+        help="how the SMTP stand-in secures connections",
+    )
+    parser.add_argument(
+        "--smtp-latency",
+        type=float,
+        default=0.0,
+        help="seconds the SMTP stand-in takes to reply to each command",
+    )
+    parser.add_argument(
+        "--smtp-failure-rate",
+        type=float,
+        default=0.0,
+        help="share of messages the SMTP stand-in rejects (to be retried)",
+    )
+    parser.add_argument(
+        "--digest-window",
+        type=float,
+        default=0.0,
+        help="seconds problems are held to be sent together in digests",
+    )
+    parser.add_argument(
+        "--output", "-o", type=pathlib.Path, help="write the results as JSON"
+    )
+    parser.add_argument(
+        "--compare",
+        type=pathlib.Path,
+        help="compare against results previously written with --output",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="relative change tolerated by --compare before failing",
+    )
+
+    args = parser.parse_args(args)
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.corpus:
+            corpus = {path.stem: path for path in sorted(args.corpus.iterdir())}
+        else:
+            corpus = _synthesize_corpus(
+                pathlib.Path(directory), args.duration, _SAMPLERATE
+            )
+
+        runs: Dict[str, Dict] = dict()
+        for corpus_name, path in corpus.items():
+            for matchers_name in args.matchers:
+                run_name = f"{corpus_name}:{matchers_name}"
+                runs[run_name] = _bench(path, _MATCHERS[matchers_name], args)
+                _print_run(run_name, runs[run_name])
+
+        clips: Dict[str, Dict] = dict()
+        for corpus_name, path in corpus.items():
+            for clip_format in args.clip_formats:
+                run_name = f"{corpus_name}:{clip_format}"
+                clips[run_name] = _bench_clip(path, clip_format, args)
+                _print_clip(run_name, clips[run_name])
+
+        notify: Optional[Dict] = None
+        if args.notify:
+            notify = _bench_notify(next(iter(corpus.values())), args)
+            _print_notify(notify)
+
+    results = {
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "machine": platform.machine(),
+        "source": args.source,
+        "analysis_samplerate": args.analysis_samplerate,
+        "pregate_interval": args.pregate_interval,
+        "block": args.block,
+        "instrument": args.instrument,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "runs": runs,
+        "clip_bitrate": args.clip_bitrate,
+        "clips": clips,
+        "notify": notify,
+    }
+    print(f"peak RSS: {results['peak_rss_kb']} kB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if _compare(baseline, results, args.tolerance):
+            return 1
+
+    return 0
+
+
+def _synthesize_corpus(
+    directory: pathlib.Path, duration: float, samplerate: int
+) -> Dict[str, pathlib.Path]:
+    generator = numpy.random.RandomState(0)
+    sample_count = int(duration * samplerate)
+    t = numpy.arange(sample_count) / samplerate
+
+    # Something like music: a chord with harmonics, swelling and fading
+    music = numpy.zeros(sample_count)
+    for index, frequency in enumerate((220.0, 277.2, 329.6)):
+        envelope = 0.5 + 0.5 * numpy.sin(2 * numpy.pi * (0.25 + 0.1 * index) * t)
+        for harmonic in range(1, 6):
+            music += (
+                envelope
+                * numpy.sin(2 * numpy.pi * frequency * harmonic * t)
+                / (harmonic * 6)
+            )
+    music += 0.01 * generator.standard_normal(sample_count)
+
+    signals = {
+        "music": music,
+        "noise": 0.3 * generator.standard_normal(sample_count),
+        "silence": 1e-4 * generator.standard_normal(sample_count),
+    }
+
+    corpus: Dict[str, pathlib.Path] = dict()
+    for name, signal in signals.items():
+        path = directory / f"{name}.wav"
+        samples = numpy.clip(signal, -1, 1).astype(numpy.float32)
+        with aubio.sink(str(path), samplerate) as output:
+            for start in range(0, len(samples), _WRITE_SIZE):
+                hop = samples[start : start + _WRITE_SIZE]
+                output(hop, len(hop))
+        corpus[name] = path
+
+    return corpus
+
+
+def _stream_config(path: pathlib.Path, timeout: float, args) -> _config.StreamConfig:
+    config = configparser.ConfigParser()
+    config.read_dict(
+        {
+            "bench": {
+                "url": str(path),
+                "smtp_server": "localhost",
+                "smtp_server_port": "25",
+                "smtp_login": "",
+                "smtp_password": "",
+                "from_email": "",
+                "to_emails": "[]",
+                "source": args.source,
+                "timeout": str(timeout),
+                "pregate_interval": str(args.pregate_interval),
+            }
+        }
+    )
+    if args.analysis_samplerate:
+        config["bench"]["analysis_samplerate"] = str(args.analysis_samplerate)
+
+    return _config.StreamConfig(config["bench"])
+
+
+def _create_stream(
+    path: pathlib.Path,
+    matcher_types: Sequence[Type[_matchers.Matcher]],
+    timeout: float,
+    args,
+):
+    config = _stream_config(path, timeout, args)
+    matchers = [matcher_type(config) for matcher_type in matcher_types]
+    stream = _stream.Stream(
+        "bench", config, matchers, lambda *args: None, instrument=args.instrument
+    )
+    return stream, matchers
+
+
+def _timed(function: Callable, timings: Dict[str, float], name: str) -> Callable:
+    def _function(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timings[name] += time.perf_counter() - start
+
+    return _function
+
+
+def _measure_corpus(path: pathlib.Path, args) -> Tuple[int, float]:
+    """Decode a corpus entry, returning its sample count and samplerate."""
+
+    source = _sources.create_source(args.source, str(path), _WRITE_SIZE)
+    sample_count = 0
+    try:
+        while True:
+            _, count = source()
+            sample_count += count
+            if count < _WRITE_SIZE:
+                break
+    finally:
+        source.close()
+
+    return sample_count, source.samplerate
+
+
+def _process(stream: _stream.Stream, block: int) -> int:
+    """Process the next hop (or block of hops), returning how many there were."""
+
+    if block:
+        return len(stream.process_hops(block))
+
+    stream.process_hop()
+    return 1
+
+
+def _bench(
+    path: pathlib.Path, matcher_types: Sequence[Type[_matchers.Matcher]], args
+) -> Dict:
+    # Never alert (alerts trigger a cooldown); only the analysis is measured
+    sample_count, samplerate = _measure_corpus(path, args)
+    audio_seconds = sample_count / samplerate
+    timeout = audio_seconds + 1
+
+    # Time the analysis as a whole, as well as each matcher within it
+    stream, matchers = _create_stream(path, matcher_types, timeout, args)
+    hop_count = sample_count // stream.hop_size + 1
+    timings = {matcher.name: 0.0 for matcher in matchers}
+    for matcher in matchers:
+        for method in ("process_features", "process_batch"):
+            setattr(
+                matcher, method, _timed(getattr(matcher, method), timings, matcher.name)
+            )
+
+    start = time.perf_counter()
+    try:
+        while True:
+            _process(stream, args.block)
+    except _errors.EndOfStreamError:
+        pass
+    elapsed = time.perf_counter() - start
+    stream.close()
+
+    # Tracing allocations is slow, so it's done in a separate, shorter pass
+    stream, _ = _create_stream(path, matcher_types, timeout, args)
+    peak_bytes: List[int] = list()
+    retained_blocks: List[int] = list()
+    tracemalloc.start()
+    try:
+        while len(peak_bytes) < args.alloc_hops:
+            tracemalloc.clear_traces()
+            traced_hops = _process(stream, args.block)
+
+            # The peak is how much memory a hop needs at once, and the blocks
+            # still allocated after it are what it leaves behind (e.g. caches)
+            peak_bytes.append(tracemalloc.get_traced_memory()[1] // traced_hops)
+            statistics = tracemalloc.take_snapshot().statistics("filename")
+            blocks = sum(statistic.count for statistic in statistics)
+            retained_blocks.append(blocks // traced_hops)
+    except _errors.EndOfStreamError:
+        pass
+    finally:
+        tracemalloc.stop()
+        stream.close()
+
+    return {
+        "hops": hop_count,
+        "audio_seconds": audio_seconds,
+        "hops_per_second": hop_count / elapsed,
+        # Seconds spent per second of audio; below 1 keeps up with real time
+        "realtime_factor": elapsed / audio_seconds,
+        "matcher_ns_per_hop": {
+            name: int(timing * 1e9 / hop_count) for name, timing in timings.items()
+        },
+        "peak_bytes_per_hop": int(numpy.mean(peak_bytes)) if peak_bytes else None,
+        "retained_blocks_per_hop": (
+            int(numpy.mean(retained_blocks)) if retained_blocks else None
+        ),
+    }
+
+
+def _decode(path: pathlib.Path, args) -> Tuple[numpy.ndarray, int]:
+    """Decode a corpus entry, returning its samples and samplerate."""
+
+    source = _sources.create_source(args.source, str(path), _WRITE_SIZE)
+    hops: List[numpy.ndarray] = list()
+    try:
+        while True:
+            samples, count = source()
+            hops.append(samples[:count].copy())
+            if count < _WRITE_SIZE:
+                break
+    finally:
+        source.close()
+
+    return numpy.concatenate(hops), source.samplerate
+
+
+def _bench_clip(path: pathlib.Path, clip_format: str, args) -> Dict:
+    samples, samplerate = _decode(path, args)
+
+    settings = _clips.ClipSettings(clip_format, args.clip_bitrate, 1)
+    start = time.perf_counter()
+    data = _clips.encode("bench", samples, samplerate, settings)
+    elapsed = time.perf_counter() - start
+
+    audio_seconds = len(samples) / samplerate
+    return {
+        "audio_seconds": audio_seconds,
+        "encode_seconds": elapsed,
+        "bytes": len(data),
+        "kbit_per_second": len(data) * 8 / audio_seconds / 1000,
+    }
+
+
+def _print_clip(run_name: str, clip: Dict) -> None:
+    print(
+        f"{run_name}: encoded in {clip['encode_seconds']:.3f} s, "
+        f"{clip['bytes']} B ({clip['kbit_per_second']:.1f} kbit/s)"
+    )
+
+
+def _bench_notify(path: pathlib.Path, args) -> Dict:
+    """Measure notifying of bursts of problems, and its effect on analysis.
+
+    The SMTP stand-in and the notification service each run in a process of
+    their own, as the service runs in the monitor's. Meanwhile, a stream is
+    analyzed here, as streams are in theirs.
+    """
+
+    # The problems are all reported with the same clip, as alerts would be
+    samples, samplerate = _decode(path, args)
+    settings = _clips.ClipSettings("mp3", args.clip_bitrate, 1)
+    clip = _alerter.Clip(
+        "bench.mp3",
+        _clips.encode("bench", samples, samplerate, settings),
+        _clips.FORMATS["mp3"].mime_type,
+    )
+
+    with tempfile.TemporaryDirectory() as directory:
+        server_queue: multiprocessing.Queue = multiprocessing.Queue()
+        stop = multiprocessing.Event()
+        server = multiprocessing.Process(
+            target=_serve_smtp, args=(server_queue, stop, args), daemon=True
+        )
+        server.start()
+        host, port = server_queue.get()
+
+        config_path = pathlib.Path(directory) / "bench.conf"
+        _write_notify_config(config_path, host, port, path, args)
+
+        idle_realtime_factor = _measure_analysis(path, args, lambda: False)
+
+        service_queue: multiprocessing.Queue = multiprocessing.Queue()
+        service = multiprocessing.Process(
+            target=_notify, args=(service_queue, config_path, clip, args), daemon=True
+        )
+        service.start()
+        loaded_realtime_factor = _measure_analysis(path, args, service.is_alive)
+        bursts = service_queue.get()
+        service.join()
+
+        stop.set()
+        received, connections, rejected = server_queue.get()
+        server.join()
+
+    # Each message belongs to the last burst that started before it arrived
+    latencies: List[float] = list()
+    for received_at in received:
+        starts = [burst["start"] for burst in bursts if burst["start"] <= received_at]
+        if starts:
+            latencies.append(received_at - max(starts))
+
+    delivered = [burst for burst in bursts if burst["delivered"] is not None]
+    elapsed = sum(burst["delivered"] - burst["start"] for burst in delivered)
+    return {
+        "burst": args.notify,
+        "bursts": len(bursts),
+        "bursts_delivered": len(delivered),
+        "clip_bytes": len(clip.data),
+        "smtp_tls": args.smtp_tls,
+        "smtp_latency": args.smtp_latency,
+        "smtp_failure_rate": args.smtp_failure_rate,
+        "digest_window": args.digest_window,
+        "messages": len(received),
+        "rejected": rejected,
+        "connections": connections,
+        "latency_seconds": _percentiles(latencies),
+        "burst_seconds": _percentiles(
+            [burst["delivered"] - burst["start"] for burst in delivered]
+        ),
+        "notifications_per_second": (
+            len(delivered) * args.notify / elapsed if elapsed else None
+        ),
+        "idle_realtime_factor": idle_realtime_factor,
+        "loaded_realtime_factor": loaded_realtime_factor,
+    }
+
+
+def _serve_smtp(server_queue: multiprocessing.Queue, stop, args) -> None:
+    server = _smtp_server.SmtpServer(
+        tls=args.smtp_tls,
+        latency=args.smtp_latency,
+        failure_rate=args.smtp_failure_rate,
+    )
+    server_queue.put((server.host, server.port))
+    stop.wait()
+    server.close()
+    server_queue.put(
+        (
+            [message.received_at for message in server.messages],
+            server.connections,
+            server.rejected,
+        )
+    )
+
+
+def _write_notify_config(
+    config_path: pathlib.Path, host: str, port: int, path: pathlib.Path, args
+) -> None:
+    config = configparser.ConfigParser()
+    config["DEFAULT"] = {
+        "smtp_server": host,
+        "smtp_server_port": str(port),
+        "smtp_login": "login",
+        "smtp_password": "password",
+        "from_email": "from@example.com",
+        "to_emails": '["to@example.com"]',
+        "digest_window": str(args.digest_window),
+    }
+    for index in range(args.notify):
+        config[f"stream{index}"] = {"url": str(path)}
+    with open(config_path, "w") as f:
+        config.write(f)
+
+
+def _notify(
+    service_queue: multiprocessing.Queue,
+    config_path: pathlib.Path,
+    clip: _alerter.Clip,
+    args,
+) -> None:
+    # Every problem would be logged
+    logging.disable(logging.WARNING)
+
+    notification_queue: multiprocessing.Queue = multiprocessing.Queue()
+    notifier = _notifier.Notifier(_config.Config(config_path))
+    service = _notification_service.NotificationService(
+        notifier, notification_queue, _outbox.Outbox()
+    )
+    forwarder = _notification_service.Forwarder(notification_queue)
+
+    # Each burst is delivered before the next one starts
+    bursts: List[Dict] = list()
+    for burst_index in range(args.notify_bursts):
+        bursts.append({"start": time.time(), "delivered": None})
+        for index in range(args.notify):
+            forwarder.problem_detected_callback(f"stream{index}", "Bench", clip)
+
+        expected = (burst_index + 1) * args.notify
+        deadline = time.monotonic() + _NOTIFY_TIMEOUT
+        while service.sent < expected and time.monotonic() < deadline:
+            time.sleep(0.001)
+        if service.sent < expected:
+            break
+        bursts[-1]["delivered"] = time.time()
+
+    service_queue.put(bursts)
+    service.close()
+
+
+def _measure_analysis(path: pathlib.Path, args, running: Callable[[], bool]) -> float:
+    """Analyze a stream over and over while running, returning its real-time
+    factor.
+
+    It's analyzed at least once through.
+    """
+
+    matcher_types = _MATCHERS[args.matchers[0]]
+    sample_count, samplerate = _measure_corpus(path, args)
+    timeout = sample_count / samplerate + 1
+    elapsed = 0.0
+    audio_seconds = 0.0
+    passes = 0
+    while passes == 0 or running():
+        stream, _ = _create_stream(path, matcher_types, timeout, args)
+        try:
+            while passes == 0 or running():
+                start = time.perf_counter()
+                hop_count = _process(stream, args.block)
+                elapsed += time.perf_counter() - start
+                audio_seconds += hop_count * stream.hop_size / samplerate
+        except _errors.EndOfStreamError:
+            passes += 1
+        finally:
+            stream.close()
+
+    return elapsed / audio_seconds
+
+
+def _percentiles(values: Sequence[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+
+    return {
+        f"p{percentile}": float(numpy.percentile(values, percentile))
+        for percentile in (50, 90, 99)
+    }
+
+
+def _print_notify(notify: Dict) -> None:
+    latency = notify["latency_seconds"] or dict()
+    print(
+        f"notify {notify['bursts_delivered']}/{notify['bursts']} burst(s) of "
+        f"{notify['burst']}: {notify['messages']} message(s) over "
+        f"{notify['connections']} connection(s), "
+        f"{notify['notifications_per_second'] or 0:.1f} notifications/s, "
+        f"latency p50 {latency.get('p50', 0):.3f} s, "
+        f"p99 {latency.get('p99', 0):.3f} s"
+    )
+    print(
+        f"    analysis real-time factor {notify['idle_realtime_factor']:.5f} idle, "
+        f"{notify['loaded_realtime_factor']:.5f} while notifying"
+    )
+
+
+def _print_run(run_name: str, run: Dict) -> None:
+    print(
+        f"{run_name}: {run['hops_per_second']:.1f} hops/s, "
+        f"real-time factor {run['realtime_factor']:.5f}, "
+        f"{run['peak_bytes_per_hop']} B peak/hop, "
+        f"{run['retained_blocks_per_hop']} blocks retained/hop"
+    )
+    for name, ns in run["matcher_ns_per_hop"].items():
+        print(f"    {name}: {ns} ns/hop")
+
+
+def _compare(baseline: Dict, results: Dict, tolerance: float) -> List[str]:
+    """Print how results changed from the baseline, and return regressions."""
+
+    for key in (
+        "source",
+        "analysis_samplerate",
+        "pregate_interval",
+        "block",
+        "instrument",
+        "python",
+        "numpy",
+    ):
+        if baseline.get(key) != results.get(key):
+            print(
+                f"warning: {key} differs from the baseline "
+                f"({baseline.get(key)} vs {results.get(key)})"
+            )
+
+    regressions: List[str] = list()
+    for run_name, run in sorted(results["runs"].items()):
+        baseline_run = baseline["runs"].get(run_name)
+        if not baseline_run:
+            continue
+
+        metrics = {metric: run[metric] for metric in _COMPARED_METRICS}
+        baseline_metrics = {
+            metric: baseline_run.get(metric) for metric in _COMPARED_METRICS
+        }
+        for name, ns in run["matcher_ns_per_hop"].items():
+            metric = f"{name} ns/hop"
+            metrics[metric] = ns
+            baseline_metrics[metric] = baseline_run["matcher_ns_per_hop"].get(name)
+
+        for metric, value in metrics.items():
+            baseline_value = baseline_metrics[metric]
+            if not baseline_value or value is None:
+                continue
+
+            change = (value - baseline_value) / baseline_value
+            higher_is_better = _COMPARED_METRICS.get(metric, False)
+            regressed = -change if higher_is_better else change
+            marker = ""
+            if regressed > tolerance:
+                marker = " REGRESSION"
+                regressions.append(f"{run_name} {metric}")
+            print(f"{run_name} {metric}: {change:+.1%}{marker}")
+
+    print(f"{len(regressions)} regression(s) beyond {tolerance:.0%}")
+    return regressions
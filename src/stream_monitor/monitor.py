@@ -9,26 +9,68 @@ import pathlib
 import queue
 import signal
 import sys
+import statistics
 import textwrap
+import time
 import traceback
-from typing import List
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 
 try:
     from matplotlib import pyplot
 except ImportError:
     pyplot = None
 
-from . import _config, _errors, _stream, _matchers, _notifier, _plotting
+from . import (
+    _alerter,
+    _config,
+    _errors,
+    _stream,
+    _stream_batch,
+    _matchers,
+    _metrics_server,
+    _notification_service,
+    _notifier,
+    _outbox,
+    _plotting,
+    _supervisor,
+)
 
 logger = logging.getLogger(__name__)
 
 _StreamInfo = collections.namedtuple(
-    "_StreamInfo", ("name", "config", "process", "queue", "figure", "plot")
+    "_StreamInfo", ("name", "config", "queue", "figure", "plot")
 )
 
+# Number of hops each stream is analyzed for when measuring its CPU cost
+_CALIBRATION_HOP_COUNT = 50
+_CALIBRATION_OVERSUBSCRIPTION = 4
+
+# Hops each stream of a pooled worker reads ahead (unless configured
+# otherwise), so a stream waiting on the network doesn't hold up the others
+_POOLED_READ_AHEAD = 8
+
+# Seconds a pooled worker waits when none of its streams has a hop ready
+_POOLED_POLL_INTERVAL = 0.005
+
+# Seconds before a pooled worker recreates one of its streams that failed.
+# Its other streams carry on meanwhile.
+_STREAM_RETRY_DELAY = 10.0
+
 
 def main(args=None):
-    parser = argparse.ArgumentParser(description="Monitor audio streams.")
+    if args is None:
+        args = sys.argv[1:]
+
+    # Benchmarks are a separate command with their own arguments
+    if args and args[0] == "bench":
+        from . import bench
+
+        return bench.main(args[1:])
+
+    parser = argparse.ArgumentParser(
+        description="Monitor audio streams.",
+        epilog="Run 'stream-monitor bench --help' to benchmark stream analysis.",
+    )
     parser.add_argument(
         "--config",
         "-c",
@@ -42,21 +84,72 @@ def main(args=None):
     parser.add_argument(
         "--plot", action="store_true", help="plot all matchers for all streams",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="?",
+        const=os.cpu_count(),
+        help=(
+            "monitor all streams using a fixed pool of worker processes "
+            "(defaults to one per core) instead of one process per stream"
+        ),
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="serve metrics of all streams on this local port, for Prometheus",
+    )
+    parser.add_argument(
+        "--outbox",
+        type=pathlib.Path,
+        help=(
+            "directory to keep notifications in until they're delivered, so "
+            "they survive restarts (by default they're only kept in memory)"
+        ),
+    )
+    parser.add_argument(
+        "--batch-streams",
+        action="store_true",
+        help=(
+            "with --workers, analyze the current hop of all streams in a worker "
+            "in one vectorized pass"
+        ),
+    )
 
     args = parser.parse_args(args)
 
     sys.excepthook = functools.partial(_exception_handler, debug=args.verbose)
+    _configure_logging(args.verbose)
+
+    config = _config.Config(args.config)
+    return _run(
+        config,
+        args.plot,
+        args.workers,
+        args.batch_streams,
+        args.metrics_port,
+        args.outbox,
+        args.verbose,
+    )
+
+
+def _configure_logging(verbose: bool) -> None:
     level = logging.INFO
-    if args.verbose:
+    if verbose:
         level = logging.DEBUG
 
     logging.basicConfig(format="%(levelname)s: %(message)s", level=level)
 
-    config = _config.Config(args.config)
-    return _run(config, args.plot)
-
 
-def _run(config, plot: bool):
+def _run(
+    config,
+    plot: bool,
+    workers: Optional[int] = None,
+    batch_streams: bool = False,
+    metrics_port: Optional[int] = None,
+    outbox: Optional[pathlib.Path] = None,
+    verbose: bool = False,
+):
     if plot:
         if not pyplot:
             raise _errors.PlottingNotAvailableError()
@@ -70,8 +163,23 @@ def _run(config, plot: bool):
 
     streams: List[_StreamInfo] = list()
 
-    # Open all configured streams
-    for stream_name in stream_names:
+    # Each stream (or worker) runs in a process of its own, restarted on its
+    # own if it crashes. They don't inherit this process' logging setup.
+    supervisor = _supervisor.Supervisor(
+        initializer=_configure_logging, initargs=(verbose,)
+    )
+
+    # Streams forward the problems they detect to the parent through this
+    # queue, which sends all notifications
+    notification_queue: multiprocessing.Queue = supervisor.context.Queue()
+
+    # Streams push their metrics to the parent through this queue
+    metrics_queue: Optional[multiprocessing.Queue] = None
+    if metrics_port is not None:
+        metrics_queue = supervisor.context.Queue()
+
+    # Set up all configured streams
+    for stream_name in sorted(stream_names):
         stream_config = config.stream_config(stream_name)
         figure = None
         stream_plot = None
@@ -80,23 +188,44 @@ def _run(config, plot: bool):
         if plot:
             figure = pyplot.figure(num=stream_name)
             stream_plot = _plotting.Plot(figure)
-            q = multiprocessing.Queue()
+            q = supervisor.context.Queue()
 
-        process = multiprocessing.Process(
-            target=_run_one, args=(stream_name, config, stream_config, q)
-        )
+        if not workers:
+            supervisor.add(
+                [stream_name],
+                _run_one,
+                (stream_name, notification_queue, stream_config, q, metrics_queue),
+            )
 
         streams.append(
             _StreamInfo(
                 name=stream_name,
                 config=stream_config,
-                process=process,
                 queue=q,
                 figure=figure,
                 plot=stream_plot,
             )
         )
 
+    if workers:
+        # Pack the streams into a fixed pool of processes, balanced by cost
+        costs = _measure_costs(config, [stream.name for stream in streams], workers)
+        stream_infos = {stream.name: stream for stream in streams}
+        for stream_names_for_worker in _assign_streams(costs, workers):
+            supervisor.add(
+                stream_names_for_worker,
+                _run_many,
+                (
+                    notification_queue,
+                    [
+                        (name, stream_infos[name].config, stream_infos[name].queue)
+                        for name in stream_names_for_worker
+                    ],
+                    batch_streams,
+                    metrics_queue,
+                ),
+            )
+
     message = "Monitoring the following streams:\n"
     for stream in streams:
         message += textwrap.indent(
@@ -117,47 +246,52 @@ def _run(config, plot: bool):
     def _shutdown(signal_received, frame):
         nonlocal run
         run = False
-        for stream in streams:
-            if signal_received:
-                logger.info(f"Shutting down monitor for stream '{stream.name}'")
-            stream.process.join()
 
-    for stream in streams:
-        stream.process.start()
+    supervisor.start()
+
+    # The processes are started by a fork server, so they don't inherit the
+    # listening socket or the notification service's threads, even when
+    # restarted later
+    notification_service = _notification_service.NotificationService(
+        _notifier.Notifier(config), notification_queue, _outbox.Outbox(outbox)
+    )
+    metrics_server = None
+    if metrics_queue and metrics_port is not None:
+        metrics_server = _metrics_server.MetricsServer(
+            metrics_queue,
+            metrics_port,
+            notifications=notification_service.metrics_snapshot,
+            supervision=supervisor.metrics_snapshot,
+        )
+        logger.info(f"Serving metrics on port {metrics_server.port}")
 
     signal.signal(signal.SIGINT, _shutdown)
 
     try:
-        if stream.plot:
-            while run:
+        # Until shutting down, or every stream has stopped
+        while run and supervisor.running():
+            if plot:
                 for stream in streams:
                     if stream.queue:
                         with contextlib.suppress(queue.Empty):
                             stream.plot.update(*stream.queue.get(timeout=1))
+            supervisor.check(timeout=0 if plot else 1)
     finally:
-        while run:
-            for stream in streams:
-                stream.process.join(1)
-                if run and stream.process.exitcode is not None:
-                    logger.critical(f"Monitor for stream '{stream.name}' has crashed")
-                    for other_stream in streams:
-                        if other_stream.process.pid != stream.process.pid:
-                            os.kill(other_stream.process.pid, signal.SIGINT)
-                            other_stream.process.join()
-
-                    return 1
+        supervisor.stop()
+        if metrics_server:
+            metrics_server.close()
+        notification_service.close()
     return 0
 
 
-def _run_one(
+def _create_stream(
     stream_name: str,
-    config: _config.Config,
     stream_config: _config.StreamConfig,
-    queue: multiprocessing.Queue,
-) -> None:
-    notifier = _notifier.Notifier(config)
-
-    stream = _stream.Stream(
+    problem_callback: Callable[[str, str, _alerter.Clip], None],
+    instrument: bool = False,
+    default_read_ahead: int = 0,
+) -> _stream.Stream:
+    return _stream.Stream(
         name=stream_name,
         config=stream_config,
         matchers=[
@@ -167,9 +301,30 @@ def _run_one(
             # _matchers.VocoderMatcher(stream_config),
             _matchers.PitchConfidenceMatcher(stream_config),
         ],
-        problem_callback=notifier.problem_detected_callback,
+        problem_callback=problem_callback,
+        instrument=instrument,
+        default_read_ahead=default_read_ahead,
     )
 
+
+def _run_one(
+    stream_name: str,
+    notification_queue: multiprocessing.Queue,
+    stream_config: _config.StreamConfig,
+    queue: multiprocessing.Queue,
+    metrics_queue: Optional[multiprocessing.Queue] = None,
+) -> None:
+    forwarder = _notification_service.Forwarder(notification_queue)
+    stream = _create_stream(
+        stream_name,
+        stream_config,
+        forwarder.problem_detected_callback,
+        instrument=metrics_queue is not None,
+    )
+    publisher = None
+    if metrics_queue:
+        publisher = _metrics_server.Publisher(metrics_queue)
+
     run = True
 
     def _shutdown(signal_received, frame) -> None:
@@ -182,11 +337,201 @@ def _run_one(
         # These are internet streams; they never end. Loop forever.
         while run:
             data = stream.process_hop()
-            if queue:
+            # Nothing is analyzed during cooldown
+            if queue and data is not None:
                 queue.put(data)
+            if publisher:
+                publisher.publish([stream])
+    finally:
+        stream.close()
+
+
+def _run_many(
+    notification_queue: multiprocessing.Queue,
+    stream_args: Sequence[
+        Tuple[str, _config.StreamConfig, Optional[multiprocessing.Queue]]
+    ],
+    batch_streams: bool = False,
+    metrics_queue: Optional[multiprocessing.Queue] = None,
+) -> None:
+    """Monitor several streams from a single process.
+
+    The streams are serviced round-robin, one hop each, each reading ahead in
+    a thread of its own. A stream without a hop ready is skipped for the
+    round, so one waiting on its source doesn't hold up the others. With
+    batch_streams, each round's hops are analyzed together. A stream that fails is recreated after a delay without
+    disturbing the others, unless they have all failed: then the worker
+    exits, to be restarted by its supervisor.
+    """
+
+    forwarder = _notification_service.Forwarder(notification_queue)
+    streams: Dict[str, _stream.Stream] = dict()
+    plot_queues = {name: plot_queue for name, _, plot_queue in stream_args}
+    publisher = None
+    if metrics_queue:
+        publisher = _metrics_server.Publisher(metrics_queue)
+
+    # When each stream is to be (re)created
+    retry_at = {name: 0.0 for name, _, _ in stream_args}
+    batch: Optional[_stream_batch.StreamBatch] = None
+    failure: Optional[Exception] = None
+
+    def _failed(stream_name: str, error: Exception) -> None:
+        nonlocal batch, failure
+        batch = None
+        failure = error
+        stream = streams.pop(stream_name, None)
+        if stream:
+            with contextlib.suppress(Exception):
+                stream.close()
+
+        logger.error(f"Stream '{stream_name}' failed: {error!s}")
+        retry_at[stream_name] = time.monotonic() + _STREAM_RETRY_DELAY
+
+    run = True
+
+    def _shutdown(signal_received, frame) -> None:
+        nonlocal run
+        run = False
+
+    signal.signal(signal.SIGINT, _shutdown)
+
+    try:
+        # These are internet streams; they never end. Loop forever.
+        while run:
+            now = time.monotonic()
+            for stream_name, stream_config, _ in stream_args:
+                if retry_at.get(stream_name, now + 1) > now:
+                    continue
+
+                del retry_at[stream_name]
+                try:
+                    streams[stream_name] = _create_stream(
+                        stream_name,
+                        stream_config,
+                        forwarder.problem_detected_callback,
+                        instrument=metrics_queue is not None,
+                        default_read_ahead=_POOLED_READ_AHEAD,
+                    )
+                except Exception as e:
+                    _failed(stream_name, e)
+                batch = None
+
+            # Leave it to the supervisor to restart a worker whose streams have
+            # all failed
+            if not streams and failure:
+                raise failure
+
+            names = [name for name, _, _ in stream_args if name in streams]
+            if not any(streams[name].hop_ready() for name in names):
+                # Wait for the sources, rather than spinning
+                time.sleep(_POOLED_POLL_INTERVAL)
+
+            hop_data: List = [None] * len(names)
+            if batch_streams:
+                if batch is None:
+                    batch = _stream_batch.StreamBatch([streams[name] for name in names])
+                try:
+                    hop_data = batch.process_hop(ready_only=True)
+                except _errors.EndOfStreamError as e:
+                    _failed(e.stream_name, e)
+                except _errors.StreamFailedError as e:
+                    _failed(e.stream_name, e.error)
+            else:
+                for index, stream_name in enumerate(names):
+                    if not streams[stream_name].hop_ready():
+                        continue
+
+                    try:
+                        hop_data[index] = streams[stream_name].process_hop()
+                    except Exception as e:
+                        _failed(stream_name, e)
+
+            for stream_name, data in zip(names, hop_data):
+                plot_queue = plot_queues[stream_name]
+                if plot_queue and data is not None:
+                    plot_queue.put(data)
+            if publisher:
+                publisher.publish(list(streams.values()))
     finally:
+        for stream in streams.values():
+            stream.close()
+
+
+def _measure_costs(
+    config: _config.Config, stream_names: Sequence[str], workers: int
+) -> Dict[str, float]:
+    """Measure the CPU cost of each stream, in CPU seconds per second of audio.
+
+    Streams that can't be measured are assumed to cost as much as the median
+    stream.
+    """
+
+    # Measuring a live stream mostly waits on the network, so oversubscribe
+    processes = min(len(stream_names), workers * _CALIBRATION_OVERSUBSCRIPTION)
+    with multiprocessing.Pool(processes) as pool:
+        measurements = pool.starmap(
+            _measure_cost, [(name, config.stream_config(name)) for name in stream_names]
+        )
+
+    measured = [cost for cost in measurements if cost is not None]
+    default_cost = statistics.median(measured) if measured else 1.0
+
+    costs: Dict[str, float] = dict()
+    for name, cost in zip(stream_names, measurements):
+        costs[name] = default_cost if cost is None else cost
+        logger.debug(f"Stream '{name}' costs {costs[name]:.4f} CPU s/audio s")
+
+    return costs
+
+
+def _measure_cost(
+    stream_name: str, stream_config: _config.StreamConfig
+) -> Optional[float]:
+    try:
+        stream = _create_stream(stream_name, stream_config, lambda *args: None)
+    except Exception as e:
+        logger.warning(f"Unable to measure cost of stream '{stream_name}': {e!s}")
+        return None
+
+    audio_seconds = 0.0
+    start = time.process_time()
+    try:
+        for _ in range(_CALIBRATION_HOP_COUNT):
+            data = stream.process_hop()
+            if data:
+                audio_seconds += data[0]
+    except _errors.EndOfStreamError:
+        pass
+    except Exception as e:
+        logger.warning(f"Unable to measure cost of stream '{stream_name}': {e!s}")
+        return None
+    finally:
+        cpu_seconds = time.process_time() - start
         stream.close()
 
+    if not audio_seconds:
+        return None
+
+    return cpu_seconds / audio_seconds
+
+
+def _assign_streams(costs: Dict[str, float], workers: int) -> List[List[str]]:
+    """Distribute streams across workers so their total costs are balanced.
+
+    This is the longest-processing-time-first heuristic: place the most
+    expensive remaining stream on the least loaded worker.
+    """
+
+    assignments: List[List[str]] = [list() for _ in range(min(workers, len(costs)))]
+    loads = [0.0] * len(assignments)
+    for name in sorted(costs, key=lambda name: (-costs[name], name)):
+        index = loads.index(min(loads))
+        assignments[index].append(name)
+        loads[index] += costs[name]
+
+    return assignments
+
 
 def _exception_handler(exception_type, exception, exception_traceback, *, debug=False):
     if isinstance(exception, _errors.StreamMonitorError):
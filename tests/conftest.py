@@ -2,7 +2,7 @@ import configparser
 import pathlib
 import textwrap
 
-from stream_monitor import _config
+from stream_monitor import _config, _smtp_server
 
 import pytest
 
@@ -93,3 +93,18 @@ def config(config_file):
         return _config.Config(config_file(contents, smtp_settings=smtp_settings))
 
     return _create_config
+
+
+@pytest.fixture
+def smtp_server():
+    servers = list()
+
+    def _create_smtp_server(**kwargs):
+        server = _smtp_server.SmtpServer(**kwargs)
+        servers.append(server)
+        return server
+
+    yield _create_smtp_server
+
+    for server in servers:
+        server.close()
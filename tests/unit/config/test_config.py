@@ -155,6 +155,459 @@ def test_config_cooldown(config_file):
     assert stream_config.cooldown() == 20.5
 
 
+def test_config_read_ahead(config_file):
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            """
+        )
+    )
+
+    # Test default read-ahead
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.read_ahead() == 0
+    assert stream_config.read_ahead(8) == 8
+
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            read_ahead = 16
+            """
+        )
+    )
+
+    # Test configured read-ahead
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.read_ahead() == 16
+    assert stream_config.read_ahead(8) == 16
+
+
+def test_config_source(config_file):
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            """
+        )
+    )
+
+    # Test default source
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.source() == "aubio"
+
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            source = ffmpeg
+            """
+        )
+    )
+
+    # Test configured source
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.source() == "ffmpeg"
+
+
+def test_config_analysis_samplerate(config_file):
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            """
+        )
+    )
+
+    # Test default analysis samplerate
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.analysis_samplerate() is None
+
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            analysis_samplerate = 16000
+            """
+        )
+    )
+
+    # Test configured analysis samplerate
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.analysis_samplerate() == 16000
+
+
+def test_config_max_lag(config_file):
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            """
+        )
+    )
+
+    # Test default max lag
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.max_lag() == 0
+
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            max_lag = 30
+            """
+        )
+    )
+
+    # Test configured max lag
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.max_lag() == 30
+
+
+def test_config_pregate_interval(config_file):
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            """
+        )
+    )
+
+    # Test default pre-gate interval
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.pregate_interval() == 1
+
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            pregate_interval = 8
+            """
+        )
+    )
+
+    # Test configured pre-gate interval
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.pregate_interval() == 8
+
+
+def test_config_invalid_source(config_file):
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            source = gstreamer
+            """
+        )
+    )
+
+    with pytest.raises(_errors.InvalidStreamConfigError) as error:
+        _config.Config(file_path)
+
+    assert str(error.value) == (
+        f"Error processing config file '{file_path!s}': improper configuration "
+        "detected for stream 'stream': invalid 'source': gstreamer. It should be "
+        "'aubio' or 'ffmpeg'"
+    )
+
+
+@pytest.mark.parametrize(
+    "key, value, expected",
+    [
+        ("read_ahead", "-1", "a non-negative integer"),
+        ("read_ahead", "many", "a non-negative integer"),
+        ("analysis_samplerate", "0", "a positive integer"),
+        ("analysis_samplerate", "-16000", "a positive integer"),
+        ("max_lag", "-0.5", "a non-negative number"),
+        ("max_lag", "nan", "a non-negative number"),
+        ("pregate_interval", "0", "a positive integer"),
+        ("pregate_interval", "1.5", "a positive integer"),
+        ("digest_window", "30s", "a non-negative number"),
+        ("digest_max_attachment_size", "-1", "a non-negative number"),
+        ("clip_bitrate", "0", "a positive integer"),
+        ("clip_bitrate", "128k", "a positive integer"),
+        ("clip_segment_duration", "-5", "a non-negative number"),
+        ("clip_segment_duration", "five", "a non-negative number"),
+    ],
+)
+def test_config_invalid_number(config_file, key, value, expected):
+    file_path = config_file(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = foo
+            {key} = {value}
+            """
+        )
+    )
+
+    with pytest.raises(_errors.InvalidStreamConfigError) as error:
+        _config.Config(file_path)
+
+    assert str(error.value) == (
+        f"Error processing config file '{file_path!s}': improper configuration "
+        f"detected for stream 'stream': invalid '{key}': {value}. It should be "
+        f"{expected}"
+    )
+
+
+def test_config_window_storage(config_file):
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            """
+        )
+    )
+
+    # Test default window storage
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.window_storage() == "float32"
+
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            window_storage = zlib
+            """
+        )
+    )
+
+    # Test configured window storage
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.window_storage() == "zlib"
+
+
+def test_config_clip_segment_duration(config_file):
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            """
+        )
+    )
+
+    # Test default clip segment duration
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.clip_segment_duration() == 0
+
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            clip_segment_duration = 5
+            """
+        )
+    )
+
+    # Test configured clip segment duration
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.clip_segment_duration() == 5
+
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            clip_segment_duration = 0
+            """
+        )
+    )
+
+    # Test clip segmenting turned off explicitly
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.clip_segment_duration() == 0
+
+
+def test_config_invalid_window_storage(config_file):
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            window_storage = flac
+            """
+        )
+    )
+
+    with pytest.raises(_errors.InvalidStreamConfigError) as error:
+        _config.Config(file_path)
+
+    assert str(error.value) == (
+        f"Error processing config file '{file_path!s}': improper configuration "
+        "detected for stream 'stream': invalid 'window_storage': flac. It should "
+        "be 'float32', 'int16', or 'zlib'"
+    )
+
+
+def test_config_clip_settings(config_file):
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            """
+        )
+    )
+
+    # Test default clip settings
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.clip_format() == "mp3"
+    assert stream_config.clip_bitrate() is None
+    assert stream_config.clip_channels() == 1
+
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            clip_format = opus
+            clip_bitrate = 32
+            clip_channels = 2
+            """
+        )
+    )
+
+    # Test configured clip settings
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.clip_format() == "opus"
+    assert stream_config.clip_bitrate() == 32
+    assert stream_config.clip_channels() == 2
+
+
+def test_config_invalid_clip_format(config_file):
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            clip_format = wav
+            """
+        )
+    )
+
+    with pytest.raises(_errors.InvalidStreamConfigError) as error:
+        _config.Config(file_path)
+
+    assert str(error.value) == (
+        f"Error processing config file '{file_path!s}': improper configuration "
+        "detected for stream 'stream': invalid 'clip_format': wav. It should "
+        "be 'flac', 'mp3', or 'opus'"
+    )
+
+
+def test_config_invalid_clip_channels(config_file):
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            clip_channels = 6
+            """
+        )
+    )
+
+    with pytest.raises(_errors.InvalidStreamConfigError) as error:
+        _config.Config(file_path)
+
+    assert str(error.value) == (
+        f"Error processing config file '{file_path!s}': improper configuration "
+        "detected for stream 'stream': invalid 'clip_channels': 6. It should "
+        "be '1' or '2'"
+    )
+
+
+def test_config_digest(config_file):
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            """
+        )
+    )
+
+    # Test default digest settings
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.digest_window() == 0
+    assert stream_config.digest_attachments() == "all"
+    assert stream_config.digest_max_attachment_size() == 10
+
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            digest_window = 30
+            digest_attachments = first
+            digest_max_attachment_size = 5
+            """
+        )
+    )
+
+    # Test configured digest settings
+    config = _config.Config(file_path)
+    stream_config = config.stream_config("stream")
+    assert stream_config.digest_window() == 30
+    assert stream_config.digest_attachments() == "first"
+    assert stream_config.digest_max_attachment_size() == 5
+
+
+def test_config_invalid_digest_attachments(config_file):
+    file_path = config_file(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            digest_attachments = some
+            """
+        )
+    )
+
+    with pytest.raises(_errors.InvalidStreamConfigError) as error:
+        _config.Config(file_path)
+
+    assert str(error.value) == (
+        f"Error processing config file '{file_path!s}': improper configuration "
+        "detected for stream 'stream': invalid 'digest_attachments': some. It "
+        "should be 'all', 'first', or 'none'"
+    )
+
+
 def test_config_missing_smtp_keys(config_file):
     file_path = config_file(
         textwrap.dedent(
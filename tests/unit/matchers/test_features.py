@@ -0,0 +1,60 @@
+import aubio
+import mock
+import numpy
+import pytest
+
+from stream_monitor import _matchers
+
+
+def test_features_db_spl_matches_aubio():
+    samples = aubio.fvec(numpy.linspace(-0.5, 0.5, 2048, dtype=numpy.float32))
+    features = _matchers.Features(samples, 2048)
+
+    assert features.db_spl == pytest.approx(aubio.db_spl(samples), abs=1e-4)
+
+
+def test_features_silence():
+    features = _matchers.Features(aubio.fvec(2048), 2048)
+
+    assert features.rms == 0
+    assert features.db_spl == float("-inf")
+
+
+def test_features_rms():
+    features = _matchers.Features(aubio.fvec(2 * numpy.ones(256)), 256)
+
+    assert features.energy == pytest.approx(4)
+    assert features.rms == pytest.approx(2)
+
+
+def test_features_spectrum():
+    sample_count = 512
+    samples = numpy.sin(
+        2 * numpy.pi * 32 * numpy.arange(sample_count) / sample_count
+    ).astype(numpy.float32)
+    features = _matchers.Features(samples, sample_count)
+
+    assert features.spectrum.shape == (sample_count // 2 + 1,)
+    assert numpy.argmax(features.spectrum) == 32
+    numpy.testing.assert_allclose(
+        features.power_spectrum, numpy.square(features.spectrum)
+    )
+
+
+def test_features_computed_once():
+    features = _matchers.Features(aubio.fvec(numpy.ones(256)), 256)
+
+    with mock.patch("numpy.fft.rfft", wraps=numpy.fft.rfft) as mock_rfft:
+        features.spectrum
+        features.spectrum
+        features.power_spectrum
+
+    mock_rfft.assert_called_once()
+
+
+def test_features_batch():
+    samples = numpy.stack([numpy.ones(256), 2 * numpy.ones(256)]).astype(numpy.float32)
+    features = _matchers.Features(samples, 256)
+
+    numpy.testing.assert_allclose(features.rms, [1, 2])
+    assert features.spectrum.shape == (2, 129)
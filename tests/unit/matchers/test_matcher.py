@@ -1,6 +1,7 @@
 import textwrap
 
 import aubio
+import numpy
 
 import pytest
 
@@ -36,6 +37,14 @@ def test_matcher_is_abstract(config):
         _matchers.Matcher(config.stream_config("stream"))
 
 
+def test_matcher_must_process_something():
+    # Neither _process_features() nor _process_samples() is implemented
+    with pytest.raises(TypeError):
+
+        class _TestIncompleteMatcher(_matchers.Matcher):
+            name = "test incomplete matcher"
+
+
 def test_matcher_false(config):
     config = config(
         textwrap.dedent(
@@ -66,3 +75,50 @@ def test_matcher_true(config):
     sample_count = 256
     samples = aubio.fvec(sample_count)
     assert matcher.process_samples(samples, sample_count) == (42, True)
+
+
+class _TestFeaturesMatcher(_matchers.Matcher):
+    name = "test features matcher"
+
+    def _process_features(self, features):
+        return features.rms, True
+
+
+def test_matcher_features(config):
+    config = config(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            """
+        )
+    )
+    matcher = _TestFeaturesMatcher(config.stream_config("stream"))
+
+    sample_count = 256
+    samples = aubio.fvec(numpy.ones(sample_count))
+    assert matcher.process_samples(samples, sample_count) == (1, True)
+
+    features = _matchers.Features(samples, sample_count)
+    assert matcher.process_features(features) == (1, True)
+
+
+def test_matcher_batch_default(config):
+    config = config(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            """
+        )
+    )
+    matcher = _TestFeaturesMatcher(config.stream_config("stream"))
+
+    frames = numpy.stack([numpy.ones(256), 2 * numpy.ones(256)])
+    values, matches = matcher.process_batch(frames, 256)
+    numpy.testing.assert_allclose(values, [1, 2])
+    assert matches.all()
+
+    values, matches = matcher.process_batch(numpy.empty((0, 256)), 256)
+    assert len(values) == 0
+    assert len(matches) == 0
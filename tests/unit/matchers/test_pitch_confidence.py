@@ -0,0 +1,125 @@
+import textwrap
+
+import numpy
+import pytest
+
+from stream_monitor import _matchers
+
+
+def _hops(hop_count):
+    rng = numpy.random.default_rng(0)
+    time = numpy.arange(hop_count * 2048) / 44100
+    tone = numpy.sin(2 * numpy.pi * 440 * time)
+    noise = rng.uniform(-1, 1, len(time))
+
+    # Alternate between tone and noise every few hops
+    envelope = (numpy.arange(len(time)) // (4 * 2048)) % 2
+    samples = numpy.where(envelope, tone, noise).astype(numpy.float32)
+    return samples.reshape(hop_count, 2048)
+
+
+def test_pitch_confidence(config):
+    config = config(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            """
+        )
+    )
+    matcher = _matchers.PitchConfidenceMatcher(config.stream_config("stream"))
+
+    hops = _hops(16)
+    results = [matcher.process_samples(hop, len(hop)) for hop in hops]
+
+    # Noise has no pitch, but the tone does
+    assert results[2][1]
+    assert not results[6][1]
+
+
+def test_pitch_confidence_batch_matches_aubio(config):
+    config = config(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            """
+        )
+    )
+    matcher = _matchers.PitchConfidenceMatcher(config.stream_config("stream"))
+    batch_matcher = _matchers.PitchConfidenceMatcher(config.stream_config("stream"))
+
+    hops = _hops(16)
+    expected = [matcher.process_samples(hop, len(hop))[0] for hop in hops]
+
+    values, matches = batch_matcher.process_batch(hops[:10], 2048)
+    numpy.testing.assert_allclose(values, expected[:10], atol=1e-4)
+    numpy.testing.assert_array_equal(matches, numpy.array(expected[:10]) < 0.7)
+
+    # Mixing in single hops after a batch keeps the same history
+    for hop, expected_value in zip(hops[10:], expected[10:]):
+        value, _ = batch_matcher.process_samples(hop, len(hop))
+        assert value == pytest.approx(expected_value, abs=1e-4)
+
+
+def test_pitch_confidence_streams(config):
+    config = config(
+        textwrap.dedent(
+            """\
+            [stream1]
+            url = foo
+            [stream2]
+            url = foo
+            threshold = 0.99
+            """
+        )
+    )
+    matchers = [
+        _matchers.PitchConfidenceMatcher(config.stream_config("stream1")),
+        _matchers.PitchConfidenceMatcher(config.stream_config("stream2")),
+    ]
+    expected_matchers = [
+        _matchers.PitchConfidenceMatcher(config.stream_config("stream1")),
+        _matchers.PitchConfidenceMatcher(config.stream_config("stream2")),
+    ]
+
+    hops = _hops(8)
+    streams_hops = [hops, hops[::-1].copy()]
+    for index in range(len(hops)):
+        block = numpy.stack([stream_hops[index] for stream_hops in streams_hops])
+        values, matches = _matchers.PitchConfidenceMatcher.process_streams(
+            matchers, _matchers.Features(block, 2048)
+        )
+
+        for matcher, stream_hops, value, match in zip(
+            expected_matchers, streams_hops, values, matches
+        ):
+            expected = matcher.process_samples(stream_hops[index], 2048)
+            assert value == pytest.approx(expected[0], abs=1e-4)
+            assert match == expected[1]
+
+
+def test_pitch_confidence_resynchronize(config):
+    config = config(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            """
+        )
+    )
+    matcher = _matchers.PitchConfidenceMatcher(config.stream_config("stream"))
+    skipping_matcher = _matchers.PitchConfidenceMatcher(config.stream_config("stream"))
+    assert matcher.expensive
+
+    hops = _hops(16)
+    expected = [matcher.process_samples(hop, len(hop))[0] for hop in hops]
+
+    # Skip a few hops, then catch up on the last one skipped
+    for hop in hops[:5]:
+        skipping_matcher.process_samples(hop, len(hop))
+    skipping_matcher.resynchronize(hops[9], len(hops[9]))
+
+    for hop, expected_value in zip(hops[10:], expected[10:]):
+        value, _ = skipping_matcher.process_samples(hop, len(hop))
+        assert value == pytest.approx(expected_value, abs=1e-4)
@@ -39,3 +39,66 @@ def test_match(config):
     value, match = matcher.process_samples(samples, sample_count)
     assert 13 <= value <= 14
     assert not match
+
+
+def test_match_batch(config):
+    config = config(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            threshold = 10.0
+            """
+        )
+    )
+    stream_config = config.stream_config("stream")
+    matcher = _matchers.SoundPressureLevelRateOfChangeMatcher(stream_config)
+    batch_matcher = _matchers.SoundPressureLevelRateOfChangeMatcher(stream_config)
+
+    frames = numpy.ones((5, 256), dtype=numpy.float32) * numpy.array(
+        [[1], [1], [2], [10], [10]], dtype=numpy.float32
+    )
+    expected = [matcher.process_samples(frame, 256) for frame in frames]
+
+    values, matches = batch_matcher.process_batch(frames[:3], 256)
+    assert math.isnan(values[0])
+    numpy.testing.assert_allclose(values[1:], [e[0] for e in expected[1:3]])
+    assert list(matches) == [e[1] for e in expected[:3]]
+
+    # The batch carries over the previous value
+    values, matches = batch_matcher.process_batch(frames[3:], 256)
+    numpy.testing.assert_allclose(values, [e[0] for e in expected[3:]], atol=1e-5)
+    assert list(matches) == [e[1] for e in expected[3:]]
+
+
+def test_match_streams(config):
+    config = config(
+        textwrap.dedent(
+            """\
+            [stream1]
+            url = foo
+            threshold = 10.0
+            [stream2]
+            url = foo
+            threshold = 1.0
+            """
+        )
+    )
+    matchers = [
+        _matchers.SoundPressureLevelRateOfChangeMatcher(config.stream_config(name))
+        for name in ("stream1", "stream2")
+    ]
+
+    ones = numpy.ones((2, 256), dtype=numpy.float32)
+    values, matches = _matchers.SoundPressureLevelRateOfChangeMatcher.process_streams(
+        matchers, _matchers.Features(ones, 256)
+    )
+    assert numpy.isnan(values).all()
+    assert not matches.any()
+
+    block = ones * numpy.array([[2], [2]], dtype=numpy.float32)
+    values, matches = _matchers.SoundPressureLevelRateOfChangeMatcher.process_streams(
+        matchers, _matchers.Features(block, 256)
+    )
+    assert (6 <= values).all() and (values <= 7).all()
+    assert list(matches) == [True, False]
@@ -0,0 +1,54 @@
+import textwrap
+
+import numpy
+
+from stream_monitor import _matchers
+
+
+def test_vocoder(config):
+    config = config(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            """
+        )
+    )
+    matcher = _matchers.VocoderMatcher(config.stream_config("stream"))
+
+    sample_count = 512
+    noise = numpy.random.default_rng(0).uniform(-1, 1, sample_count)
+    tone = numpy.sin(2 * numpy.pi * 32 * numpy.arange(sample_count) / sample_count)
+
+    noise_value, match = matcher.process_samples(
+        noise.astype(numpy.float32), sample_count
+    )
+    assert not match
+
+    tone_value, match = matcher.process_samples(
+        tone.astype(numpy.float32), sample_count
+    )
+    assert not match
+
+    # A pure tone has a far spikier spectrum than noise
+    assert tone_value > noise_value
+
+
+def test_vocoder_batch(config):
+    config = config(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = foo
+            """
+        )
+    )
+    matcher = _matchers.VocoderMatcher(config.stream_config("stream"))
+
+    frames = numpy.random.default_rng(0).uniform(-1, 1, (4, 512))
+    frames = frames.astype(numpy.float32)
+    expected = [matcher.process_samples(frame, 256)[0] for frame in frames]
+
+    values, matches = matcher.process_batch(frames, 256)
+    numpy.testing.assert_allclose(values, expected, rtol=1e-6)
+    assert not matches.any()
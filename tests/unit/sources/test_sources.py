@@ -0,0 +1,70 @@
+import numpy
+import pytest
+
+from stream_monitor import _errors, _sources
+
+
+def _read_all(source):
+    hops = []
+    while True:
+        samples, sample_count = source()
+        hops.append(samples[:sample_count].copy())
+        if sample_count < source.hop_size:
+            break
+
+    return numpy.concatenate(hops)
+
+
+@pytest.mark.parametrize("name", ["aubio", "ffmpeg"])
+def test_source(test_data_normal_path, name):
+    source = _sources.create_source(name, str(test_data_normal_path), 2048)
+
+    assert source.samplerate in (22050, 44100, 48000)
+    assert source.hop_size == 2048
+
+    samples = _read_all(source)
+    source.close()
+
+    assert samples.dtype == numpy.float32
+    assert len(samples) > source.samplerate
+
+
+def test_ffmpeg_source_matches_aubio_source(test_data_normal_path):
+    aubio_source = _sources.AubioSource(str(test_data_normal_path), 2048)
+    ffmpeg_source = _sources.FfmpegSource(str(test_data_normal_path), 2048)
+
+    assert ffmpeg_source.samplerate == aubio_source.samplerate
+
+    aubio_samples = _read_all(aubio_source)
+    ffmpeg_samples = _read_all(ffmpeg_source)
+    aubio_source.close()
+    ffmpeg_source.close()
+
+    # Decoders may differ in padding and rounding, but not in content
+    length = min(len(aubio_samples), len(ffmpeg_samples))
+    assert abs(len(aubio_samples) - len(ffmpeg_samples)) < 2048
+    numpy.testing.assert_allclose(
+        aubio_samples[:length], ffmpeg_samples[:length], atol=1e-3
+    )
+
+
+def test_ffmpeg_source_reuses_buffer(test_data_normal_path):
+    source = _sources.FfmpegSource(str(test_data_normal_path), 2048)
+
+    first, _ = source()
+    second, _ = source()
+    source.close()
+
+    assert numpy.shares_memory(first, second)
+
+
+def test_ffmpeg_source_invalid_url(tmp_path):
+    with pytest.raises(RuntimeError):
+        _sources.FfmpegSource(str(tmp_path / "does-not-exist.mp3"), 2048)
+
+
+def test_ffmpeg_source_no_ffmpeg(test_data_normal_path, monkeypatch):
+    monkeypatch.setenv("PATH", "")
+
+    with pytest.raises(_errors.FfmpegNotAvailableError):
+        _sources.FfmpegSource(str(test_data_normal_path), 2048)
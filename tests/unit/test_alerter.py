@@ -0,0 +1,115 @@
+import concurrent.futures
+import threading
+
+import mock
+import numpy
+
+from stream_monitor import _alerter, _clips
+
+
+def test_alerter_delivers_clip():
+    clips = []
+
+    def _callback(stream_name, matcher_name, clip):
+        clips.append(clip)
+
+    alerter = _alerter.Alerter("stream", _callback)
+    assert alerter.submit("matcher", numpy.zeros(44100, dtype=numpy.float32), 44100)
+    alerter.close()
+
+    assert len(clips) == 1
+    assert alerter.sent == 1
+    assert clips[0].filename.startswith("stream_")
+    assert clips[0].filename.endswith(".mp3")
+    assert clips[0].mime_type == "audio/mpeg"
+
+    # The clip is encoded in memory, with its tags
+    assert clips[0].data.startswith(b"ID3")
+    assert b"Stream Monitor" in clips[0].data
+
+
+def test_alerter_delivers_segmented_clip():
+    clips = []
+
+    def _callback(stream_name, matcher_name, clip):
+        clips.append(clip)
+
+    segment = concurrent.futures.Future()
+    segment.set_result(b"segment")
+
+    alerter = _alerter.Alerter("stream", _callback)
+    with mock.patch(
+        "stream_monitor._clips.encode", return_value=b"tail"
+    ) as mock_encode:
+        alerter.submit("matcher", numpy.zeros(10, dtype=numpy.int16), 44100, [segment])
+        alerter.close()
+
+    # The tail is encoded without tags, which lead the clip instead
+    mock_encode.assert_called_once_with(
+        "stream", mock.ANY, 44100, _clips.DEFAULT_SETTINGS
+    )
+    assert clips[0].data.startswith(b"ID3")
+    assert clips[0].data.endswith(b"segmenttail")
+
+
+def test_alerter_delivers_clip_format():
+    clips = []
+
+    def _callback(stream_name, matcher_name, clip):
+        clips.append(clip)
+
+    segment = concurrent.futures.Future()
+    segment.set_result(b"segment")
+
+    settings = _clips.ClipSettings("opus", 32, 1)
+    alerter = _alerter.Alerter("stream", _callback, clip_settings=settings)
+    with mock.patch(
+        "stream_monitor._clips.encode", return_value=b"tail"
+    ) as mock_encode:
+        alerter.submit("matcher", numpy.zeros(10, dtype=numpy.int16), 44100, [segment])
+        alerter.close()
+
+    # Chained Ogg streams can't be tagged after the fact
+    mock_encode.assert_called_once_with("stream", mock.ANY, 44100, settings)
+    assert clips[0].data == b"segmenttail"
+    assert clips[0].filename.endswith(".opus")
+    assert clips[0].mime_type == "audio/ogg"
+
+
+def test_alerter_drops_alerts_when_full():
+    delivering = threading.Event()
+    release = threading.Event()
+
+    def _callback(stream_name, matcher_name, clip):
+        delivering.set()
+        release.wait()
+
+    callback = mock.MagicMock(side_effect=_callback)
+    alerter = _alerter.Alerter("stream", callback, queue_size=1)
+    samples = numpy.zeros(2048, dtype=numpy.float32)
+
+    # The first alert is picked up by the worker, the second waits in the queue
+    assert alerter.submit("matcher", samples, 44100)
+    delivering.wait()
+    assert alerter.submit("matcher", samples, 44100)
+    assert not alerter.submit("matcher", samples, 44100)
+
+    release.set()
+    alerter.close()
+
+    assert callback.call_count == 2
+    assert alerter.sent == 2
+    assert alerter.dropped == 1
+
+
+def test_alerter_survives_callback_errors():
+    callback = mock.MagicMock(side_effect=RuntimeError("boom"))
+    alerter = _alerter.Alerter("stream", callback)
+    samples = numpy.zeros(2048, dtype=numpy.float32)
+
+    alerter.submit("matcher", samples, 44100)
+    alerter.submit("matcher", samples, 44100)
+    alerter.close()
+
+    assert callback.call_count == 2
+    assert alerter.failed == 2
@@ -0,0 +1,125 @@
+import json
+
+import mock
+
+from stream_monitor import bench, monitor
+
+
+def _bench(*args):
+    return bench.main(
+        ["--duration", "1", "--alloc-hops", "5", "--matchers", "spl", "pitch"]
+        + list(args)
+    )
+
+
+def test_bench(tmp_path):
+    output = tmp_path / "results.json"
+    assert _bench("--output", str(output)) == 0
+
+    results = json.loads(output.read_text())
+    assert results["peak_rss_kb"] > 0
+    assert set(results["runs"]) == {
+        f"{corpus}:{matchers}"
+        for corpus in ("music", "noise", "silence")
+        for matchers in ("spl", "pitch")
+    }
+
+    run = results["runs"]["music:pitch"]
+    assert run["hops"] == 1 * 44100 // 2048 + 1
+    assert run["audio_seconds"] == 1
+    assert run["hops_per_second"] > 0
+    assert run["realtime_factor"] > 0
+    assert run["peak_bytes_per_hop"] >= 0
+    assert run["retained_blocks_per_hop"] >= 0
+    assert set(run["matcher_ns_per_hop"]) == {"Pitch confidence"}
+
+
+def test_bench_block(tmp_path):
+    output = tmp_path / "results.json"
+    assert _bench("--block", "8", "--output", str(output)) == 0
+
+    results = json.loads(output.read_text())
+    assert results["block"] == 8
+    assert results["runs"]["noise:spl"]["matcher_ns_per_hop"]["SPL rate of change"]
+
+
+def test_bench_corpus(tmp_path, test_data_normal_path):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    (corpus / test_data_normal_path.name).symlink_to(test_data_normal_path)
+    output = tmp_path / "results.json"
+
+    assert _bench("--corpus", str(corpus), "--output", str(output)) == 0
+
+    results = json.loads(output.read_text())
+    assert set(results["runs"]) == {
+        f"{test_data_normal_path.stem}:spl",
+        f"{test_data_normal_path.stem}:pitch",
+    }
+
+
+def test_bench_compare(tmp_path):
+    output = tmp_path / "results.json"
+    assert _bench("--output", str(output)) == 0
+
+    # A baseline far faster than anything this machine can do
+    baseline = json.loads(output.read_text())
+    for run in baseline["runs"].values():
+        run["hops_per_second"] *= 1000
+    slower_baseline = tmp_path / "baseline.json"
+    slower_baseline.write_text(json.dumps(baseline))
+
+    assert _bench("--compare", str(slower_baseline)) == 1
+    assert _bench("--compare", str(slower_baseline), "--tolerance", "1e6") == 0
+
+
+def test_bench_notify(tmp_path):
+    output = tmp_path / "results.json"
+    assert (
+        _bench(
+            "--matchers",
+            "spl",
+            "--notify",
+            "3",
+            "--notify-bursts",
+            "2",
+            "--smtp-tls",
+            "starttls",
+            "--output",
+            str(output),
+        )
+        == 0
+    )
+
+    notify = json.loads(output.read_text())["notify"]
+    assert notify["bursts_delivered"] == 2
+    assert notify["messages"] == 6
+    assert notify["connections"] >= 1
+    assert notify["notifications_per_second"] > 0
+    assert 0 < notify["latency_seconds"]["p50"] <= notify["latency_seconds"]["p99"]
+    assert notify["idle_realtime_factor"] > 0
+    assert notify["loaded_realtime_factor"] > 0
+
+
+def test_monitor_bench():
+    with mock.patch("stream_monitor.bench.main", return_value=0) as mock_main:
+        assert monitor.main(["bench", "--duration", "1"]) == 0
+
+    mock_main.assert_called_once_with(["--duration", "1"])
+
+
+def test_bench_clip_formats(tmp_path):
+    output = tmp_path / "results.json"
+    assert _bench("--clip-formats", "mp3", "opus", "flac", "--output", str(output)) == 0
+
+    results = json.loads(output.read_text())
+    assert set(results["clips"]) == {
+        f"{corpus}:{clip_format}"
+        for corpus in ("music", "noise", "silence")
+        for clip_format in ("mp3", "opus", "flac")
+    }
+
+    clip = results["clips"]["music:opus"]
+    assert clip["audio_seconds"] == 1
+    assert clip["encode_seconds"] > 0
+    assert clip["bytes"] > 0
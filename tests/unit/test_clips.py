@@ -0,0 +1,201 @@
+import subprocess
+import wave
+
+import aubio
+import mock
+import numpy
+import pytest
+
+from stream_monitor import _clips, _errors
+
+
+def _audio(sample_count):
+    generator = numpy.random.RandomState(0)
+    samples = 0.3 * generator.standard_normal(sample_count).astype(numpy.float32)
+    samples[::100] = 1.2
+    return samples
+
+
+def _decode(data):
+    # Decode a clip back to 16-bit samples
+    result = subprocess.run(
+        ["ffmpeg", "-loglevel", "error", "-i", "pipe:0", "-f", "s16le", "pipe:1"],
+        input=data,
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    return numpy.frombuffer(result.stdout, dtype=numpy.int16)
+
+
+def _tags(data):
+    result = subprocess.run(
+        ["ffmpeg", "-loglevel", "error", "-i", "pipe:0", "-f", "ffmetadata", "pipe:1"],
+        input=data,
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    return result.stdout.decode()
+
+
+def test_encode_audio_matches_wav(tmp_path):
+    samples = _audio(10000)
+
+    # The audio piped to the encoder is what aubio would write to a wav file
+    with aubio.sink(str(tmp_path / "clip.wav"), 44100) as output:
+        for start in range(0, len(samples), 2048):
+            hop = samples[start : start + 2048]
+            output(hop, len(hop))
+    with wave.open(str(tmp_path / "clip.wav")) as wav:
+        expected = wav.readframes(wav.getnframes())
+
+    with mock.patch(
+        "stream_monitor._clips.subprocess.run",
+        return_value=subprocess.CompletedProcess([], 0, b"mp3", b""),
+    ) as mock_run:
+        assert _clips.encode("stream", samples, 44100) == b"mp3"
+
+    assert mock_run.call_args[1]["input"] == expected
+
+
+def test_encode_tags():
+    data = _clips.encode("stream", _audio(44100), 44100, tags={"title": "Problem"})
+
+    assert data.startswith(b"ID3")
+    assert "title=Problem" in _tags(data)
+
+
+def test_encode_without_tags():
+    data = _clips.encode("stream", _audio(44100), 44100)
+
+    # Just MP3 frames, which start with a sync word
+    assert data[:2] == b"\xff\xfb"
+
+
+def test_encode_settings():
+    settings = _clips.ClipSettings("opus", 48, 2)
+    with mock.patch(
+        "stream_monitor._clips.subprocess.run",
+        return_value=subprocess.CompletedProcess([], 0, b"ogg", b""),
+    ) as mock_run:
+        _clips.encode("stream", _audio(100), 44100, settings)
+
+    command = mock_run.call_args[0][0]
+    assert command[command.index("-c:a") + 1] == "libopus"
+    assert command[command.index("-b:a") + 1] == "48k"
+    assert command[len(command) - command[::-1].index("-ac")] == "2"
+    assert command[-3:] == ["-f", "ogg", "pipe:1"]
+
+
+def test_encode_opus():
+    data = _clips.encode(
+        "stream",
+        _audio(44100),
+        44100,
+        _clips.ClipSettings("opus", 32, 1),
+        {"title": "Problem"},
+    )
+
+    # Tagged with a Vorbis comment
+    assert data.startswith(b"OggS")
+    assert b"title=Problem" in data
+
+    # Opus is always decoded at 48 kHz
+    assert abs(len(_decode(data)) - 48000) < 1000
+
+
+def test_encode_opus_chained():
+    settings = _clips.ClipSettings("opus", 32, 1)
+    data = b"".join(
+        _clips.encode("stream", _audio(44100), 44100, settings) for _ in range(2)
+    )
+
+    # Both links of the chain are decoded
+    assert abs(len(_decode(data)) - 2 * 48000) < 2000
+
+
+def test_encode_flac():
+    samples = _audio(44100)
+    settings = _clips.ClipSettings("flac", 128, 1)
+    data = _clips.encode("stream", samples, 44100, settings, {"title": "Problem"})
+
+    assert data.startswith(b"fLaC")
+    assert b"title=Problem" in data
+
+    # Lossless, so it decodes to exactly what was written
+    numpy.testing.assert_array_equal(
+        _decode(data), (samples * 32768).astype(numpy.int32).astype(numpy.int16)
+    )
+
+
+def test_segment_encoder_requires_concatenable_format():
+    with pytest.raises(AssertionError):
+        _clips.SegmentEncoder(
+            "stream", 8000, 1000, 2500, _clips.ClipSettings("flac", None, 1)
+        )
+
+
+def test_encode_errors():
+    with mock.patch(
+        "stream_monitor._clips.subprocess.run",
+        return_value=subprocess.CompletedProcess([], 1, b"", b"Invalid argument\n"),
+    ):
+        with pytest.raises(_errors.ClipEncodingError) as error:
+            _clips.encode("stream", numpy.zeros(10), 44100)
+
+    assert str(error.value) == (
+        "Unable to encode alert clip for stream 'stream': Invalid argument"
+    )
+
+    with mock.patch(
+        "stream_monitor._clips.subprocess.run", side_effect=FileNotFoundError()
+    ):
+        with pytest.raises(_errors.FfmpegNotAvailableError):
+            _clips.encode("stream", numpy.zeros(10), 44100)
+
+
+def test_id3_tag():
+    tags = {"artist": "Stream Monitor", "title": "Problematic audio from ünïcode"}
+    data = _clips.id3_tag(tags) + _clips.encode("stream", _audio(44100), 44100)
+
+    metadata = _tags(data)
+    assert "artist=Stream Monitor" in metadata
+    assert "title=Problematic audio from ünïcode" in metadata
+
+
+def test_segment_encoder():
+    samplerate = 8000
+    samples = _audio(10 * samplerate)
+    encoder = _clips.SegmentEncoder("stream", samplerate, samplerate, 5 * samplerate)
+    for start in range(0, len(samples), 2048):
+        hop = samples[start : start + 2048]
+        encoder.write(hop, len(hop))
+
+    segments, tail = encoder.snapshot(4 * samplerate)
+    encoder.close()
+
+    # Whole segments are taken, plus what isn't in one yet
+    assert len(tail) == len(samples) % samplerate
+    assert len(segments) == 4
+    numpy.testing.assert_array_equal(
+        tail, (samples[len(samples) - len(tail) :] * 32768).astype(numpy.int16)
+    )
+
+    data = b"".join(segment.result() for segment in segments)
+    data += _clips.encode("stream", tail, samplerate)
+    decoded = _decode(data)
+
+    # Each segment is padded a little by the encoder
+    expected_count = 4 * samplerate + len(tail)
+    assert expected_count <= len(decoded) < expected_count + 5 * 2 * 1152
+
+
+def test_segment_encoder_capacity():
+    encoder = _clips.SegmentEncoder("stream", 8000, 1000, 2500)
+    with mock.patch("stream_monitor._clips.encode", return_value=b"segment"):
+        encoder.write(numpy.zeros(10000, dtype=numpy.float32), 10000)
+        segments, tail = encoder.snapshot(10000)
+    encoder.close()
+
+    # Only the segments holding the last 2500 samples are kept
+    assert len(segments) == 3
+    assert len(tail) == 0
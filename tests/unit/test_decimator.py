@@ -0,0 +1,68 @@
+import numpy
+import pytest
+
+from stream_monitor import _decimator
+
+_SAMPLERATE = 44100
+
+
+def _tone(frequency, duration=1.0):
+    time = numpy.arange(int(_SAMPLERATE * duration)) / _SAMPLERATE
+    return numpy.sin(2 * numpy.pi * frequency * time).astype(numpy.float32)
+
+
+def _push_all(decimator, samples, hop_size):
+    output = []
+    for start in range(0, len(samples), hop_size):
+        hop = samples[start : start + hop_size]
+        decimated, decimated_count = decimator.push(hop, len(hop))
+        output.append(decimated[:decimated_count].copy())
+    return numpy.concatenate(output)
+
+
+@pytest.mark.parametrize("factor", [2, 4, 8])
+def test_decimator_output_size(factor):
+    decimator = _decimator.Decimator(factor, 2048)
+    samples = numpy.zeros(2048, dtype=numpy.float32)
+
+    decimated, decimated_count = decimator.push(samples, 2048)
+    assert decimated_count == 2048 // factor
+    assert decimated.dtype == numpy.float32
+
+
+def test_decimator_keeps_low_frequencies():
+    decimator = _decimator.Decimator(2, 2048)
+    samples = _tone(1000)
+
+    decimated = _push_all(decimator, samples, 2048)
+    assert len(decimated) == len(samples) // 2
+
+    # Once the filter has settled, the tone comes through at the same level,
+    # delayed by half the filter's length
+    delay = _decimator._TAPS_PER_FACTOR * 2 // 2
+    numpy.testing.assert_allclose(
+        decimated[100:],
+        samples[200 - delay : 2 * len(decimated) - delay : 2],
+        atol=1e-3,
+    )
+
+
+def test_decimator_removes_high_frequencies():
+    decimator = _decimator.Decimator(2, 2048)
+
+    # Above the new Nyquist frequency, so it would alias
+    decimated = _push_all(decimator, _tone(15000), 2048)
+    assert numpy.abs(decimated[100:]).max() < 1e-3
+
+
+def test_decimator_uneven_pushes():
+    samples = _tone(440)
+    expected = _push_all(_decimator.Decimator(4, 2048), samples, 2048)
+
+    # Pushes that aren't a multiple of the factor, or larger than expected
+    numpy.testing.assert_allclose(
+        _push_all(_decimator.Decimator(4, 2048), samples, 1001), expected, atol=1e-6
+    )
+    numpy.testing.assert_allclose(
+        _push_all(_decimator.Decimator(4, 2048), samples, 5000), expected, atol=1e-6
+    )
@@ -0,0 +1,73 @@
+import numpy
+
+from stream_monitor import _framer
+
+
+def _push_all(framer, samples, hop_size):
+    frames = []
+    for start in range(0, len(samples), hop_size):
+        hop = samples[start : start + hop_size]
+        frames.extend(frame.copy() for frame in framer.push(hop, len(hop)))
+    return frames
+
+
+def test_framer_same_size_is_zero_copy():
+    framer = _framer.Framer(4, 4, 4)
+    samples = numpy.arange(4, dtype=numpy.float32)
+
+    frames = framer.push(samples, 4)
+    assert frames.shape == (1, 4)
+    assert numpy.shares_memory(frames, samples)
+
+
+def test_framer_smaller_frames():
+    framer = _framer.Framer(2, 2, 8)
+    samples = numpy.arange(16, dtype=numpy.float32)
+
+    frames = _push_all(framer, samples, 8)
+    assert len(frames) == 8
+    numpy.testing.assert_array_equal(numpy.concatenate(frames), samples)
+
+
+def test_framer_overlapping_frames():
+    framer = _framer.Framer(4, 2, 3)
+    samples = numpy.arange(12, dtype=numpy.float32)
+
+    frames = _push_all(framer, samples, 3)
+    numpy.testing.assert_array_equal(
+        frames,
+        [[0, 1, 2, 3], [2, 3, 4, 5], [4, 5, 6, 7], [6, 7, 8, 9], [8, 9, 10, 11]],
+    )
+
+
+def test_framer_larger_frames():
+    framer = _framer.Framer(8, 8, 2)
+    samples = numpy.arange(16, dtype=numpy.float32)
+
+    assert len(framer.push(samples[:2], 2)) == 0
+    frames = _push_all(framer, samples[2:], 2)
+    numpy.testing.assert_array_equal(frames, [numpy.arange(8), numpy.arange(8, 16)])
+
+
+def test_framer_hop_larger_than_frame():
+    framer = _framer.Framer(2, 5, 3)
+    samples = numpy.arange(15, dtype=numpy.float32)
+
+    frames = _push_all(framer, samples, 3)
+    numpy.testing.assert_array_equal(frames, [[0, 1], [5, 6], [10, 11]])
+
+
+def test_framer_partial_push():
+    framer = _framer.Framer(4, 4, 4)
+    samples = numpy.arange(8, dtype=numpy.float32)
+
+    assert len(framer.push(samples, 2)) == 0
+    frames = framer.push(samples[2:], 4)
+    numpy.testing.assert_array_equal(frames, [[0, 1, 2, 3]])
+
+
+def test_framer_frames_are_read_only():
+    framer = _framer.Framer(2, 1, 4)
+    frames = framer.push(numpy.arange(4, dtype=numpy.float32), 4)
+
+    assert not frames.flags.writeable
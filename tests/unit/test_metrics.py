@@ -0,0 +1,44 @@
+import pytest
+
+from stream_monitor import _metrics
+
+
+def test_histogram_buckets():
+    histogram = _metrics.Histogram()
+    for seconds in (0, 500e-9, 1e-6, 3e-6, 1e-3, 1e6):
+        histogram.record(seconds)
+
+    assert histogram.count == 6
+    assert histogram.sum == pytest.approx(1e6 + 1e-3 + 4.5e-6)
+    assert sum(histogram.counts) == 6
+
+    # Everything up to about a microsecond lands in the first bucket, and
+    # anything too long in the last
+    assert histogram.counts[0] == 3
+    assert histogram.counts[-1] == 1
+
+    # Each value is below the bound of its bucket
+    assert 3e-6 < histogram.bounds[histogram.counts.index(1)]
+    assert histogram.bounds[-1] == float("inf")
+
+
+def test_histogram_quantile():
+    histogram = _metrics.Histogram()
+    assert histogram.quantile(0.5) == 0
+
+    for _ in range(99):
+        histogram.record(1e-6)
+    histogram.record(1e-3)
+
+    assert 1e-6 <= histogram.quantile(0.5) < 2e-6
+    assert 1e-6 <= histogram.quantile(0.99) < 2e-6
+    assert 1e-3 <= histogram.quantile(1) < 2e-3
+
+
+def test_stream_metrics():
+    metrics = _metrics.StreamMetrics(["a", "b"])
+
+    assert set(metrics.matchers) == {"a", "b"}
+    assert metrics.hops == 0
+    assert metrics.reconnects == 0
+    assert metrics.cooldown_skipped_hops == 0
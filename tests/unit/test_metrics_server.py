@@ -0,0 +1,132 @@
+import queue
+import time
+import urllib.error
+import urllib.request
+
+import mock
+import pytest
+
+from stream_monitor import _metrics, _metrics_server
+
+
+def _snapshot():
+    metrics = _metrics.StreamMetrics(["Pitch confidence"])
+    metrics.hops = 10
+    metrics.reconnects = 1
+    metrics.read.record(1e-3)
+    metrics.matchers["Pitch confidence"].record(2e-3)
+
+    snapshot = {
+        "lag": 0.5,
+        "matcher_values": {"Pitch confidence": float("nan")},
+        "match_seconds": 2.0,
+        "in_cooldown": False,
+        "alerts": {"sent": 1, "dropped": 0, "failed": 0},
+        "reader": {"depth": 3, "capacity": 8, "underruns": 2},
+    }
+    snapshot.update(metrics.snapshot())
+    return snapshot
+
+
+def test_render():
+    text = _metrics_server.render({'stream "1"': (1000.0, _snapshot())})
+    lines = text.splitlines()
+
+    assert "# TYPE stream_monitor_hops_total counter" in lines
+    assert 'stream_monitor_hops_total{stream="stream \\"1\\""} 10' in lines
+    assert 'stream_monitor_lag_seconds{stream="stream \\"1\\""} 0.5' in lines
+    assert 'stream_monitor_reconnects_total{stream="stream \\"1\\""} 1' in lines
+    assert 'stream_monitor_in_cooldown{stream="stream \\"1\\""} 0' in lines
+    assert 'stream_monitor_read_ahead_depth{stream="stream \\"1\\""} 3' in lines
+    assert (
+        'stream_monitor_read_ahead_underruns_total{stream="stream \\"1\\""} 2'
+    ) in lines
+    assert (
+        'stream_monitor_matcher_value{stream="stream \\"1\\"",'
+        'matcher="Pitch confidence"} NaN'
+    ) in lines
+    assert (
+        'stream_monitor_alerts_total{stream="stream \\"1\\"",outcome="sent"} 1'
+    ) in lines
+    assert (
+        'stream_monitor_stage_duration_seconds_bucket{stream="stream \\"1\\"",'
+        'stage="read",le="+Inf"} 1'
+    ) in lines
+    assert (
+        'stream_monitor_matcher_duration_seconds_count{stream="stream \\"1\\"",'
+        'matcher="Pitch confidence"} 1'
+    ) in lines
+
+
+def test_render_no_streams():
+    text = _metrics_server.render(dict())
+
+    # Just the metadata
+    assert all(line.startswith("#") for line in text.splitlines())
+
+
+def test_publisher():
+    metrics_queue = mock.MagicMock()
+    stream = mock.MagicMock()
+    stream.name = "stream"
+    stream.metrics_snapshot.return_value = {"hops": 1}
+
+    publisher = _metrics_server.Publisher(metrics_queue, interval=3600)
+    publisher.publish([stream])
+    publisher.publish([stream])
+
+    # Only once per interval
+    metrics_queue.put.assert_called_once_with(("stream", {"hops": 1}))
+
+
+def test_metrics_server():
+    metrics_queue = queue.Queue()
+    server = _metrics_server.MetricsServer(metrics_queue, 0)
+    metrics_queue.put(("stream", _snapshot()))
+
+    url = f"http://127.0.0.1:{server.port}/metrics"
+    try:
+        for _ in range(100):
+            with urllib.request.urlopen(url) as response:
+                assert response.headers["Content-Type"].startswith("text/plain")
+                text = response.read().decode()
+            if 'stream="stream"' in text:
+                break
+            time.sleep(0.01)
+
+        assert 'stream_monitor_hops_total{stream="stream"} 10' in text
+
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"http://127.0.0.1:{server.port}/other")
+        assert error.value.code == 404
+    finally:
+        server.close()
+
+
+def test_render_notifications():
+    delivery = _metrics.Histogram()
+    delivery.record(0.5)
+    notifications = {
+        "outbox_depth": 2,
+        "notifications": {"sent": 1, "failed": 3, "rejected": 0},
+        "delivery": delivery.snapshot(),
+    }
+
+    lines = _metrics_server.render(dict(), notifications).splitlines()
+
+    assert "stream_monitor_outbox_depth 2" in lines
+    assert 'stream_monitor_notifications_total{outcome="failed"} 3' in lines
+    assert 'stream_monitor_notification_delivery_seconds_bucket{le="+Inf"} 1' in lines
+    assert "stream_monitor_notification_delivery_seconds_count 1" in lines
+
+
+def test_render_supervision():
+    supervision = {
+        "stream": {"uptime": 12.5, "restarts": 2, "crash_looping": True},
+    }
+
+    lines = _metrics_server.render(dict(), supervision=supervision).splitlines()
+
+    assert 'stream_monitor_uptime_seconds{stream="stream"} 12.5' in lines
+    assert 'stream_monitor_restarts_total{stream="stream"} 2' in lines
+    assert 'stream_monitor_crash_looping{stream="stream"} 1' in lines
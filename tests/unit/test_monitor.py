@@ -1,6 +1,16 @@
 import textwrap
+import threading
 
-from stream_monitor import monitor, _notifier, _matchers, _errors
+import queue
+
+from stream_monitor import (
+    monitor,
+    _notification_service,
+    _matchers,
+    _errors,
+    _stream,
+    _supervisor,
+)
 
 import mock
 import pytest
@@ -41,8 +51,9 @@ def config_file(tmp_path_factory):
 
 def test_monitor(config_file, test_data_normal_path):
     with mock.patch(
-        "stream_monitor.monitor.multiprocessing.Process", autospec=True
+        "stream_monitor._supervisor._CONTEXT.Process", autospec=True
     ) as mock_process:
+        mock_process.return_value.exitcode = 0
         monitor.main(
             [
                 "-c",
@@ -59,28 +70,26 @@ def test_monitor(config_file, test_data_normal_path):
             ]
         )
 
-    class _CompareConfig:
-        def __eq__(self, other):
-            assert len(other.stream_names()) == 1
-            assert "stream" in other.stream_names()
-            return True
-
     class _CompareStreamConfig:
         def __eq__(self, other):
             assert other.url() == str(test_data_normal_path)
             return True
 
+    # Each process sets up logging before monitoring its stream
     mock_process.assert_called_once_with(
-        target=mock.ANY, args=("stream", _CompareConfig(), _CompareStreamConfig(), None)
+        target=_supervisor._bootstrap,
+        args=(
+            monitor._configure_logging,
+            (False,),
+            monitor._run_one,
+            ("stream", mock.ANY, _CompareStreamConfig(), None, None),
+        ),
     )
     mock_process.return_value.start.assert_called_once_with()
-    mock_process.return_value.join.assert_called_once_with(1)
 
 
 def test_one_stream(config_file, test_data_normal_path):
-    with mock.patch(
-        "stream_monitor.monitor.multiprocessing.Process", wraps=_FakeProcess
-    ):
+    with mock.patch("stream_monitor._supervisor._CONTEXT.Process", wraps=_FakeProcess):
         with mock.patch(
             "stream_monitor.monitor._stream.Stream", autospec=True
         ) as mock_stream:
@@ -109,6 +118,8 @@ def test_one_stream(config_file, test_data_normal_path):
             config=mock.ANY,
             matchers=mock.ANY,
             problem_callback=mock.ANY,
+            instrument=False,
+            default_read_ahead=0,
         )
         mock_stream.return_value.close.assert_called_once_with()
 
@@ -119,11 +130,9 @@ def test_no_streams_configured(config_file):
 
 
 def test_monitor_normal(test_data_normal_path, config_file):
-    with mock.patch(
-        "stream_monitor.monitor.multiprocessing.Process", wraps=_FakeProcess
-    ):
+    with mock.patch("stream_monitor._supervisor._CONTEXT.Process", wraps=_FakeProcess):
         with mock.patch.object(
-            _notifier.Notifier, "problem_detected_callback", autospec=True,
+            _notification_service.Forwarder, "problem_detected_callback", autospec=True,
         ) as mock_problem_detected_callback:
             with pytest.raises(_errors.EndOfStreamError) as error:
                 monitor.main(
@@ -148,11 +157,268 @@ def test_monitor_normal(test_data_normal_path, config_file):
 
 
 def test_monitor_bad(test_data_bad_path, config_file):
+    with mock.patch("stream_monitor._supervisor._CONTEXT.Process", wraps=_FakeProcess):
+        with mock.patch.object(
+            _notification_service.Forwarder, "problem_detected_callback", autospec=True,
+        ) as mock_problem_detected_callback:
+            with pytest.raises(_errors.EndOfStreamError) as error:
+                monitor.main(
+                    [
+                        "-c",
+                        str(
+                            config_file(
+                                textwrap.dedent(
+                                    f"""\
+                                    [stream]
+                                    url = {str(test_data_bad_path)}
+                                    timeout = 10
+                                    """
+                                )
+                            )
+                        ),
+                    ]
+                )
+            assert error.value.stream_name == "stream"
+
+        mock_problem_detected_callback.assert_called_once_with(
+            mock.ANY, "stream", _matchers.PitchConfidenceMatcher.name, mock.ANY,
+        )
+
+
+def test_monitor_workers(config_file, test_data_normal_path):
     with mock.patch(
-        "stream_monitor.monitor.multiprocessing.Process", wraps=_FakeProcess
+        "stream_monitor._supervisor._CONTEXT.Process", autospec=True
+    ) as mock_process:
+        mock_process.return_value.exitcode = 0
+        with mock.patch(
+            "stream_monitor.monitor._measure_costs",
+            return_value={"stream1": 2.0, "stream2": 1.0, "stream3": 1.0},
+        ):
+            monitor.main(
+                [
+                    "-c",
+                    str(
+                        config_file(
+                            textwrap.dedent(
+                                f"""\
+                                [stream1]
+                                url={str(test_data_normal_path)}
+                                [stream2]
+                                url={str(test_data_normal_path)}
+                                [stream3]
+                                url={str(test_data_normal_path)}
+                                """
+                            )
+                        )
+                    ),
+                    "--workers",
+                    "2",
+                ]
+            )
+
+    assert mock_process.call_count == 2
+    mock_process.assert_has_calls(
+        [
+            mock.call(
+                target=_supervisor._bootstrap,
+                args=(
+                    mock.ANY,
+                    mock.ANY,
+                    monitor._run_many,
+                    (mock.ANY, [mock.ANY], False, None),
+                ),
+            ),
+            mock.call(
+                target=_supervisor._bootstrap,
+                args=(
+                    mock.ANY,
+                    mock.ANY,
+                    monitor._run_many,
+                    (mock.ANY, [mock.ANY, mock.ANY], False, None),
+                ),
+            ),
+        ],
+        any_order=True,
+    )
+
+
+def test_monitor_workers_bad(test_data_bad_path, config_file):
+    with mock.patch("stream_monitor._supervisor._CONTEXT.Process", wraps=_FakeProcess):
+        with mock.patch.object(
+            _notification_service.Forwarder, "problem_detected_callback", autospec=True,
+        ) as mock_problem_detected_callback:
+            with pytest.raises(_errors.EndOfStreamError) as error:
+                monitor.main(
+                    [
+                        "-c",
+                        str(
+                            config_file(
+                                textwrap.dedent(
+                                    f"""\
+                                    [stream]
+                                    url = {str(test_data_bad_path)}
+                                    timeout = 10
+                                    """
+                                )
+                            )
+                        ),
+                        "--workers",
+                    ]
+                )
+            assert error.value.stream_name == "stream"
+
+        mock_problem_detected_callback.assert_called_once_with(
+            mock.ANY, "stream", _matchers.PitchConfidenceMatcher.name, mock.ANY,
+        )
+
+
+def test_measure_cost(stream_config, test_data_normal_path):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            """
+        ),
+        stream_name="stream",
+    )
+
+    assert monitor._measure_cost("stream", config) > 0
+
+
+def test_measure_cost_invalid_stream(stream_config):
+    config = stream_config(
+        textwrap.dedent(
+            """\
+            [stream]
+            url = /does/not/exist
+            """
+        ),
+        stream_name="stream",
+    )
+
+    assert monitor._measure_cost("stream", config) is None
+
+
+def test_measure_cost_stream_fails(stream_config, test_data_normal_path):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            """
+        ),
+        stream_name="stream",
+    )
+
+    with mock.patch(
+        "stream_monitor.monitor._stream.Stream.process_hop",
+        side_effect=RuntimeError("decoding failed"),
     ):
+        assert monitor._measure_cost("stream", config) is None
+
+
+@pytest.mark.parametrize("batch_streams", [False, True])
+def test_run_many_stream_fails(stream_config, test_data_normal_path, batch_streams):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [good]
+            url = {str(test_data_normal_path)}
+            """
+        ),
+        stream_name="good",
+    )
+    bad_config = stream_config(
+        textwrap.dedent(
+            """\
+            [bad]
+            url = /does/not/exist
+            """
+        ),
+        stream_name="bad",
+    )
+    plot_queue = queue.Queue()
+
+    with mock.patch.object(
+        monitor, "_create_stream", wraps=monitor._create_stream
+    ) as mock_create_stream:
+        # The good stream is monitored to its end, despite the bad one
+        with pytest.raises(_errors.EndOfStreamError) as error:
+            monitor._run_many(
+                mock.MagicMock(),
+                [("bad", bad_config, None), ("good", config, plot_queue)],
+                batch_streams,
+            )
+        assert error.value.stream_name == "good"
+
+    assert not plot_queue.empty()
+
+    # Pooled streams read ahead by default
+    for call in mock_create_stream.call_args_list:
+        assert call[1]["default_read_ahead"] == monitor._POOLED_READ_AHEAD
+
+
+@pytest.mark.parametrize("batch_streams", [False, True])
+def test_run_many_slow_stream(stream_config, test_data_normal_path, batch_streams):
+    stream_args = [
+        (
+            name,
+            stream_config(
+                textwrap.dedent(
+                    f"""\
+                    [{name}]
+                    url = {str(test_data_normal_path)}
+                    """
+                ),
+                stream_name=name,
+            ),
+            None,
+        )
+        for name in ("slow", "fast")
+    ]
+
+    # The slow stream's source stalls until the fast stream has been read to
+    # its end
+    fast_done = threading.Event()
+    stalled = list()
+    read_source = _stream.Stream._read_source
+
+    def _read_source(self):
+        if self.name == "slow":
+            stalled.append(fast_done.wait(timeout=5))
+            raise OSError("stalled")
+
+        hop = read_source(self)
+        if hop[1] < self.hop_size:
+            fast_done.set()
+        return hop
+
+    with mock.patch.object(_stream.Stream, "_read_source", _read_source):
+        with mock.patch.object(monitor, "_STREAM_RETRY_DELAY", 60):
+            with pytest.raises(Exception):
+                monitor._run_many(mock.MagicMock(), stream_args, batch_streams)
+
+    # The fast stream didn't wait for the slow one
+    assert stalled == [True]
+
+
+def test_assign_streams():
+    assignments = monitor._assign_streams(
+        {"a": 5.0, "b": 4.0, "c": 3.0, "d": 3.0, "e": 1.0}, 2
+    )
+
+    assert assignments == [["a", "d"], ["b", "c", "e"]]
+
+
+def test_assign_streams_more_workers_than_streams():
+    assert monitor._assign_streams({"a": 1.0}, 4) == [["a"]]
+
+
+def test_monitor_batch_streams_bad(test_data_bad_path, config_file):
+    with mock.patch("stream_monitor._supervisor._CONTEXT.Process", wraps=_FakeProcess):
         with mock.patch.object(
-            _notifier.Notifier, "problem_detected_callback", autospec=True,
+            _notification_service.Forwarder, "problem_detected_callback", autospec=True,
         ) as mock_problem_detected_callback:
             with pytest.raises(_errors.EndOfStreamError) as error:
                 monitor.main(
@@ -169,6 +435,9 @@ def test_monitor_bad(test_data_bad_path, config_file):
                                 )
                             )
                         ),
+                        "--workers",
+                        "1",
+                        "--batch-streams",
                     ]
                 )
             assert error.value.stream_name == "stream"
@@ -176,3 +445,92 @@ def test_monitor_bad(test_data_bad_path, config_file):
         mock_problem_detected_callback.assert_called_once_with(
             mock.ANY, "stream", _matchers.PitchConfidenceMatcher.name, mock.ANY,
         )
+
+
+def test_monitor_metrics_port(config_file, test_data_normal_path):
+    with mock.patch(
+        "stream_monitor._supervisor._CONTEXT.Process", autospec=True
+    ) as mock_process:
+        mock_process.return_value.exitcode = 0
+        with mock.patch(
+            "stream_monitor.monitor._metrics_server.MetricsServer", autospec=True
+        ) as mock_server:
+            monitor.main(
+                [
+                    "-c",
+                    str(
+                        config_file(
+                            textwrap.dedent(
+                                f"""\
+                                [stream]
+                                url={str(test_data_normal_path)}
+                                """
+                            )
+                        )
+                    ),
+                    "--metrics-port",
+                    "9999",
+                ]
+            )
+
+    metrics_queue = mock_process.call_args[1]["args"][3][4]
+    assert metrics_queue is not None
+    mock_server.assert_called_once_with(
+        metrics_queue, 9999, notifications=mock.ANY, supervision=mock.ANY
+    )
+    mock_server.return_value.close.assert_called_once_with()
+
+
+def test_run_one_publishes_metrics(stream_config, test_data_bad_path):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_bad_path)}
+            timeout = 10
+            """
+        ),
+        stream_name="stream",
+    )
+    metrics_queue = queue.Queue()
+
+    with mock.patch.object(
+        _notification_service.Forwarder, "problem_detected_callback"
+    ):
+        with pytest.raises(_errors.EndOfStreamError):
+            monitor._run_one("stream", mock.MagicMock(), config, None, metrics_queue)
+
+    # Metrics are published as soon as the stream starts
+    stream_name, snapshot = metrics_queue.get_nowait()
+    assert stream_name == "stream"
+    assert snapshot["hops"] == 1
+    assert set(snapshot["matcher_values"]) == {_matchers.PitchConfidenceMatcher.name}
+
+
+def test_run_one_skips_plotting_during_cooldown(stream_config, test_data_bad_path):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_bad_path)}
+            timeout = 1
+            """
+        ),
+        stream_name="stream",
+    )
+    plot_queue = queue.Queue()
+
+    with mock.patch.object(
+        _notification_service.Forwarder, "problem_detected_callback"
+    ) as mock_callback:
+        with pytest.raises(_errors.EndOfStreamError):
+            monitor._run_one("stream", mock.MagicMock(), config, plot_queue)
+
+    data = list()
+    while not plot_queue.empty():
+        data.append(plot_queue.get_nowait())
+
+    # Once the stream alerts, it cools down until the end
+    mock_callback.assert_called_once()
+    assert data
+    assert None not in data
@@ -0,0 +1,320 @@
+import queue
+import smtplib
+import textwrap
+import threading
+import time
+
+import mock
+
+from stream_monitor import _alerter, _config, _notification_service, _notifier, _outbox
+
+_CLIP = _alerter.Clip("stream.mp3", b"mp3 data", "audio/mpeg")
+
+
+def _mock_notifier():
+    notifier = mock.MagicMock()
+    notifier.digest_window.return_value = 0.0
+    notifier.digest_key.return_value = None
+    return notifier
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_forwarder():
+    notification_queue = queue.Queue()
+    forwarder = _notification_service.Forwarder(notification_queue)
+
+    forwarder.problem_detected_callback("stream", "matcher", _CLIP)
+
+    assert notification_queue.get_nowait() == ("stream", "matcher", _CLIP, mock.ANY)
+
+
+def test_notification_service_sends_notifications():
+    notifier = _mock_notifier()
+    notification_queue = queue.Queue()
+    service = _notification_service.NotificationService(notifier, notification_queue)
+
+    forwarder = _notification_service.Forwarder(notification_queue)
+    for index in range(10):
+        forwarder.problem_detected_callback(f"stream{index}", "matcher", _CLIP)
+    _wait_for(lambda: service.sent == 10)
+    service.close()
+
+    notifier.notify.assert_has_calls(
+        [
+            mock.call(channel, [(f"stream{index}", "matcher", _CLIP)])
+            for index in range(10)
+            for channel in _notifier.CHANNELS
+        ],
+        any_order=True,
+    )
+    notifier.close.assert_called_once_with()
+
+    snapshot = service.metrics_snapshot()
+    assert snapshot["outbox_depth"] == 0
+    assert snapshot["notifications"] == {"sent": 10, "failed": 0, "rejected": 0}
+    assert sum(snapshot["delivery"][0]) == 10
+
+
+def test_notification_service_retries():
+    notifier = _mock_notifier()
+    notifier.notify.side_effect = [OSError(), OSError(), None, None]
+    notification_queue = queue.Queue()
+    service = _notification_service.NotificationService(notifier, notification_queue)
+
+    forwarder = _notification_service.Forwarder(notification_queue)
+    with mock.patch("stream_monitor._notification_service._RETRY_DELAY", 0.01):
+        forwarder.problem_detected_callback("stream", "matcher", _CLIP)
+        _wait_for(lambda: service.sent == 1)
+    service.close()
+
+    assert service.failed == 2
+    assert notifier.notify.call_count == 4
+
+    # The problem is logged once, not on every attempt
+    notifier.log_problem.assert_called_once_with("stream", "matcher")
+
+
+def test_notification_service_retries_failed_channels_only(tmp_path):
+    notifier = _mock_notifier()
+    notifier.notify.side_effect = [None, OSError()]
+    notification_queue = queue.Queue()
+    service = _notification_service.NotificationService(
+        notifier, notification_queue, _outbox.Outbox(tmp_path)
+    )
+
+    forwarder = _notification_service.Forwarder(notification_queue)
+    forwarder.problem_detected_callback("stream", "matcher", _CLIP)
+    _wait_for(lambda: service.failed == 1)
+    service.close()
+
+    # The SMS went out; only the email is sent again, after a restart too
+    notifier = _mock_notifier()
+    service = _notification_service.NotificationService(
+        notifier, queue.Queue(), _outbox.Outbox(tmp_path)
+    )
+    _wait_for(lambda: service.sent == 1)
+    service.close()
+
+    notifier.notify.assert_called_once_with(
+        _notifier.EMAIL, [("stream", "matcher", _CLIP)]
+    )
+
+
+def test_notification_service_drops_rejected_notifications():
+    notifier = _mock_notifier()
+    notifier.notify.side_effect = smtplib.SMTPDataError(552, b"Message too large")
+    notification_queue = queue.Queue()
+    service = _notification_service.NotificationService(notifier, notification_queue)
+
+    forwarder = _notification_service.Forwarder(notification_queue)
+    forwarder.problem_detected_callback("stream", "matcher", _CLIP)
+    _wait_for(lambda: service.rejected == 1)
+    service.close()
+
+    assert service.metrics_snapshot()["outbox_depth"] == 0
+    notifier.notify.assert_called_once_with(
+        _notifier.SMS, [("stream", "matcher", _CLIP)]
+    )
+
+
+def test_notification_service_drops_misconfigured_notifications():
+    notifier = _mock_notifier()
+    notifier.notify.side_effect = ValueError(
+        "could not convert string to float: '10MB'"
+    )
+    notification_queue = queue.Queue()
+    service = _notification_service.NotificationService(notifier, notification_queue)
+
+    forwarder = _notification_service.Forwarder(notification_queue)
+    forwarder.problem_detected_callback("stream", "matcher", _CLIP)
+    _wait_for(lambda: service.rejected == 1)
+    service.close()
+
+    assert service.failed == 0
+    assert notifier.notify.call_count == 1
+
+
+def test_notification_service_resumes_outbox(tmp_path):
+    # Notifications still in the outbox from last time are sent on start
+    outbox = _outbox.Outbox(tmp_path)
+    outbox.add("stream", "matcher", _CLIP, time.time())
+    outbox.close()
+
+    notifier = _mock_notifier()
+    service = _notification_service.NotificationService(
+        notifier, queue.Queue(), _outbox.Outbox(tmp_path)
+    )
+    _wait_for(lambda: service.sent == 1)
+    service.close()
+
+    notifier.notify.assert_has_calls(
+        [
+            mock.call(channel, [("stream", "matcher", _CLIP)])
+            for channel in _notifier.CHANNELS
+        ]
+    )
+    assert not _outbox.Outbox(tmp_path).entries()
+
+
+def test_notification_service_keeps_unsent_notifications(tmp_path):
+    notifier = _mock_notifier()
+    notifier.notify.side_effect = OSError()
+    notification_queue = queue.Queue()
+    service = _notification_service.NotificationService(
+        notifier, notification_queue, _outbox.Outbox(tmp_path)
+    )
+
+    forwarder = _notification_service.Forwarder(notification_queue)
+    forwarder.problem_detected_callback("stream", "matcher", _CLIP)
+    _wait_for(lambda: service.failed == 1)
+    service.close()
+
+    # Waiting to be retried next time, backing off from where it left off
+    (entry,) = _outbox.Outbox(tmp_path).entries()
+    assert entry.stream_name == "stream"
+    assert entry.attempts == 1
+
+
+def test_notification_service_closes_without_sending_queue(tmp_path):
+    sending = threading.Event()
+    release = threading.Event()
+
+    def _send(*args):
+        sending.set()
+        release.wait()
+
+    notifier = _mock_notifier()
+    notifier.notify.side_effect = _send
+    notification_queue = queue.Queue()
+    service = _notification_service.NotificationService(
+        notifier, notification_queue, _outbox.Outbox(tmp_path), senders=1
+    )
+
+    forwarder = _notification_service.Forwarder(notification_queue)
+    for index in range(3):
+        forwarder.problem_detected_callback(f"stream{index}", "matcher", _CLIP)
+    sending.wait()
+
+    closer = threading.Thread(target=service.close)
+    closer.start()
+    _wait_for(lambda: service._closing)
+    release.set()
+    closer.join()
+
+    # Only the notification being sent went out; the rest wait for next time
+    assert notifier.notify.call_count == len(_notifier.CHANNELS)
+    assert len(_outbox.Outbox(tmp_path)) == 2
+
+
+def test_notification_service_survives_stream_errors():
+    notifier = _mock_notifier()
+
+    def _digest_window(stream_name):
+        if stream_name == "bad":
+            raise ValueError("could not convert string to float: '30s'")
+        return 0.0
+
+    notifier.digest_window.side_effect = _digest_window
+    notification_queue = queue.Queue()
+    service = _notification_service.NotificationService(notifier, notification_queue)
+
+    # The bad stream's digest window can't be compared, so it's sent right away
+    forwarder = _notification_service.Forwarder(notification_queue)
+    forwarder.problem_detected_callback("bad", "matcher", _CLIP)
+    forwarder.problem_detected_callback("good", "matcher", _CLIP)
+    _wait_for(lambda: service.sent == 2)
+    service.close()
+
+
+def test_notification_service_survives_outbox_errors(tmp_path):
+    notifier = _mock_notifier()
+    notification_queue = queue.Queue()
+    outbox = _outbox.Outbox(tmp_path)
+    service = _notification_service.NotificationService(
+        notifier, notification_queue, outbox
+    )
+
+    # Notifications that can't be journaled are still sent
+    forwarder = _notification_service.Forwarder(notification_queue)
+    with mock.patch.object(outbox, "_journal") as mock_journal:
+        mock_journal.write.side_effect = OSError("No space left on device")
+        mock_journal.flush.side_effect = OSError("No space left on device")
+        forwarder.problem_detected_callback("stream", "matcher", _CLIP)
+        _wait_for(lambda: service.sent == 1)
+    service.close()
+
+
+def test_notification_service_sends_digests():
+    notifier = _mock_notifier()
+    notifier.digest_window.return_value = 0.1
+    notifier.digest_key.side_effect = lambda stream_name: stream_name[0]
+    notification_queue = queue.Queue()
+    service = _notification_service.NotificationService(notifier, notification_queue)
+
+    forwarder = _notification_service.Forwarder(notification_queue)
+    for stream_name in ("a1", "a2", "b1", "a3"):
+        forwarder.problem_detected_callback(stream_name, "matcher", _CLIP)
+    _wait_for(lambda: service.sent == 4)
+    service.close()
+
+    # The problems of streams sharing recipients are sent together
+    for channel in _notifier.CHANNELS:
+        notifier.notify.assert_any_call(
+            channel,
+            [(stream_name, "matcher", _CLIP) for stream_name in ("a1", "a2", "a3")],
+        )
+        notifier.notify.assert_any_call(channel, [("b1", "matcher", _CLIP)])
+    assert notifier.notify.call_count == 2 * len(_notifier.CHANNELS)
+    assert service.metrics_snapshot()["digests"] == 1
+
+
+def test_notification_service_delivers_over_smtp(config_file, smtp_server, tmp_path):
+    # End to end, against a server rejecting the first attempt
+    server = smtp_server(tls="starttls", latency=0.01)
+    server.fail_next()
+    notifier = _notifier.Notifier(
+        _config.Config(
+            config_file(
+                textwrap.dedent(
+                    f"""\
+                [DEFAULT]
+                smtp_server = {server.host}
+                smtp_server_port = {server.port}
+                smtp_login = login
+                smtp_password = password
+                from_email = from@example.com
+                to_emails = ["to@example.com"]
+                to_sms_emails = ["1234567890@example.com"]
+                [stream1]
+                url = foo
+                [stream2]
+                url = bar
+                """
+                ),
+                smtp_settings=False,
+            )
+        )
+    )
+    notification_queue = queue.Queue()
+    service = _notification_service.NotificationService(
+        notifier, notification_queue, _outbox.Outbox(tmp_path)
+    )
+
+    forwarder = _notification_service.Forwarder(notification_queue)
+    with mock.patch("stream_monitor._notification_service._RETRY_DELAY", 0.01):
+        forwarder.problem_detected_callback("stream1", "matcher", _CLIP)
+        forwarder.problem_detected_callback("stream2", "matcher", _CLIP)
+        _wait_for(lambda: service.sent == 2)
+    service.close()
+
+    # An SMS and an email each, one of which was retried
+    assert len(server.messages) == 4
+    assert server.rejected == 1
+    assert service.failed == 1
+    assert not _outbox.Outbox(tmp_path).entries()
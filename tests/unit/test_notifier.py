@@ -1,12 +1,14 @@
 import ssl
 import textwrap
 
-from stream_monitor import _notifier
+from stream_monitor import _alerter, _notifier
 
 import mock
 
+_CLIP = _alerter.Clip("stream.mp3", b"mp3 data", "audio/mpeg")
 
-def test_notifier_sends_email(config, test_data_normal_path):
+
+def test_notifier_sends_email(config):
     notifier = _notifier.Notifier(
         config(
             textwrap.dedent(
@@ -29,9 +31,10 @@ def test_notifier_sends_email(config, test_data_normal_path):
         "stream_monitor._notifier.EmailMessage", autospec=True
     ) as mock_email_message:
         with mock.patch(
-            "stream_monitor._notifier.smtplib.SMTP_SSL", autospec=True
+            "stream_monitor._smtp_pool.smtplib.SMTP_SSL", autospec=True
         ) as mock_smtp:
-            notifier.problem_detected_callback("stream", "foo", test_data_normal_path)
+            notifier.problem_detected_callback("stream", "foo", _CLIP)
+            notifier.close()
 
     assert len(mock_email_message.mock_calls) == 6
     mock_email_message.assert_has_calls(
@@ -44,10 +47,7 @@ def test_notifier_sends_email(config, test_data_normal_path):
             mock.call().__setitem__("To", "to@example.com"),
             mock.call().set_content(mock.ANY),
             mock.call().add_attachment(
-                mock.ANY,
-                filename=test_data_normal_path.name,
-                maintype="audio",
-                subtype="mpeg",
+                b"mp3 data", filename="stream.mp3", maintype="audio", subtype="mpeg",
             ),
         ]
     )
@@ -55,7 +55,7 @@ def test_notifier_sends_email(config, test_data_normal_path):
     assert len(mock_smtp.mock_calls) == 4
     mock_smtp.assert_has_calls(
         [
-            mock.call("smtp.example.com", 25),
+            mock.call("smtp.example.com", 25, timeout=mock.ANY),
             mock.call().login("login", "password"),
             mock.call().send_message(mock_email_message()),
             mock.call().quit(),
@@ -63,7 +63,7 @@ def test_notifier_sends_email(config, test_data_normal_path):
     )
 
 
-def test_notifier_ssl_v3(config, test_data_normal_path):
+def test_notifier_ssl_v3(config):
     notifier = _notifier.Notifier(
         config(
             textwrap.dedent(
@@ -88,16 +88,15 @@ def test_notifier_ssl_v3(config, test_data_normal_path):
         "stream_monitor._notifier.EmailMessage", autospec=True
     ) as mock_email_message:
         with mock.patch(
-            "stream_monitor._notifier.smtplib.SMTP_SSL",
+            "stream_monitor._smtp_pool.smtplib.SMTP_SSL",
             autospec=True,
             side_effect=error,
         ):
             with mock.patch(
-                "stream_monitor._notifier.smtplib.SMTP", autospec=True
+                "stream_monitor._smtp_pool.smtplib.SMTP", autospec=True
             ) as mock_smtp:
-                notifier.problem_detected_callback(
-                    "stream", "foo", test_data_normal_path
-                )
+                notifier.problem_detected_callback("stream", "foo", _CLIP)
+            notifier.close()
 
     assert len(mock_email_message.mock_calls) == 6
     mock_email_message.assert_has_calls(
@@ -110,17 +109,14 @@ def test_notifier_ssl_v3(config, test_data_normal_path):
             mock.call().__setitem__("To", "to@example.com"),
             mock.call().set_content(mock.ANY),
             mock.call().add_attachment(
-                mock.ANY,
-                filename=test_data_normal_path.name,
-                maintype="audio",
-                subtype="mpeg",
+                b"mp3 data", filename="stream.mp3", maintype="audio", subtype="mpeg",
             ),
         ]
     )
     assert len(mock_smtp.mock_calls) == 7
     mock_smtp.assert_has_calls(
         [
-            mock.call("smtp.example.com", 25),
+            mock.call("smtp.example.com", 25, timeout=mock.ANY),
             mock.call().ehlo(),
             mock.call().starttls(context=mock.ANY),
             mock.call().ehlo(),
@@ -131,7 +127,7 @@ def test_notifier_ssl_v3(config, test_data_normal_path):
     )
 
 
-def test_notifier_sends_sms(config, test_data_normal_path):
+def test_notifier_sends_sms(config):
     notifier = _notifier.Notifier(
         config(
             textwrap.dedent(
@@ -152,34 +148,179 @@ def test_notifier_sends_sms(config, test_data_normal_path):
     )
 
     with mock.patch(
-        "stream_monitor._notifier._send_email", autospec=True
-    ) as mock_send_email:
-        notifier.problem_detected_callback("stream", "foo", test_data_normal_path)
+        "stream_monitor._smtp_pool.smtplib.SMTP_SSL", autospec=True
+    ) as mock_smtp:
+        notifier.problem_detected_callback("stream", "foo", _CLIP)
+        notifier.close()
+
+    # The SMS and the email are sent over the same session
+    mock_smtp.assert_called_once_with("smtp.example.com", 25, timeout=mock.ANY)
+    sms, email = [call[1][0] for call in mock_smtp.return_value.send_message.mock_calls]
+    assert sms["To"] == "1234567890@example.com"
+    assert not sms["Subject"]
+    assert email["To"] == "to@example.com"
+    assert email["Subject"] == "Stream Monitor: problem detected on stream"
+
+
+def test_notifier_notifies_per_channel(config):
+    notifier = _notifier.Notifier(_digest_config(config))
+
+    with mock.patch(
+        "stream_monitor._smtp_pool.smtplib.SMTP_SSL", autospec=True
+    ) as mock_smtp:
+        notifier.notify(_notifier.EMAIL, [("stream1", "foo", _CLIP)])
+        notifier.close()
+
+    # Only the email; the SMS is left for a channel of its own
+    (email,) = [call[1][0] for call in mock_smtp.return_value.send_message.mock_calls]
+    assert email["Subject"] == "Stream Monitor: problem detected on stream1"
+
+
+def test_notifier_reuses_session(config):
+    notifier = _notifier.Notifier(
+        config(
+            textwrap.dedent(
+                """\
+                [stream1]
+                url = foo
+                [stream2]
+                url = bar
+                """
+            )
+        )
+    )
+
+    with mock.patch(
+        "stream_monitor._smtp_pool.smtplib.SMTP_SSL", autospec=True
+    ) as mock_smtp:
+        notifier.problem_detected_callback("stream1", "foo", _CLIP)
+        notifier.problem_detected_callback("stream2", "foo", _CLIP)
+        notifier.close()
+
+    # Streams sharing a server and login share a session
+    mock_smtp.assert_called_once_with("smtp.example.com", 25, timeout=mock.ANY)
+    mock_smtp.return_value.login.assert_called_once_with("login", "password")
+    assert mock_smtp.return_value.send_message.call_count == 2
+    mock_smtp.return_value.quit.assert_called_once_with()
+
+
+def _digest_config(config, digest_settings=""):
+    return config(
+        textwrap.dedent(
+            """\
+            [DEFAULT]
+            digest_window = 30
+            to_sms_emails = ["1234567890@example.com"]
+            """
+        )
+        + digest_settings
+        + textwrap.dedent(
+            """\
+            [stream1]
+            url = foo
+            [stream2]
+            url = bar
+            [stream3]
+            url = baz
+            """
+        )
+    )
+
+
+def _digest_messages(notifier, problems):
+    with mock.patch(
+        "stream_monitor._smtp_pool.smtplib.SMTP_SSL", autospec=True
+    ) as mock_smtp:
+        notifier.problems_detected_callback(problems)
+        notifier.close()
+
+    mock_smtp.assert_called_once_with("smtp.example.com", 25, timeout=mock.ANY)
+    return [call[1][0] for call in mock_smtp.return_value.send_message.mock_calls]
+
 
-    mock_send_email.assert_has_calls(
+def test_notifier_sends_digest(config):
+    notifier = _notifier.Notifier(_digest_config(config))
+    sms, email = _digest_messages(
+        notifier,
         [
-            mock.call(
-                "smtp.example.com",
-                25,
-                "login",
-                "password",
-                "from@example.com",
-                ["1234567890@example.com"],
-                None,
-                mock.ANY,
-                None,
-            ),
-            mock.call(
-                "smtp.example.com",
-                25,
-                "login",
-                "password",
-                "from@example.com",
-                ["to@example.com"],
-                "Stream Monitor: problem detected on stream",
-                mock.ANY,
-                mock.ANY,
-            ),
+            ("stream1", "foo", _alerter.Clip("stream1.mp3", b"1", "audio/mpeg")),
+            ("stream2", "bar", _alerter.Clip("stream2.mp3", b"2", "audio/mpeg")),
+        ],
+    )
+
+    assert sms["To"] == "1234567890@example.com"
+    assert "2 streams: stream1, stream2" in sms.get_content()
+
+    assert email["Subject"] == "Stream Monitor: problems detected on 2 streams"
+    body = email.get_body(("plain",)).get_content()
+    assert "stream1: flagged by foo" in body
+    assert "stream2: flagged by bar" in body
+    assert [attachment.get_filename() for attachment in email.iter_attachments()] == [
+        "stream1.mp3",
+        "stream2.mp3",
+    ]
+
+
+def test_notifier_digest_attachments(config):
+    notifier = _notifier.Notifier(
+        _digest_config(config, "digest_max_attachment_size = 0.000002\n")
+    )
+    _, email = _digest_messages(
+        notifier,
+        [
+            ("stream1", "foo", _alerter.Clip("stream1.mp3", b"1", "audio/mpeg")),
+            ("stream2", "foo", _alerter.Clip("stream2.mp3", b"1", "audio/mpeg")),
+            ("stream3", "foo", _alerter.Clip("stream3.mp3", b"22", "audio/mpeg")),
         ],
-        any_order=True,
     )
+
+    # The duplicate isn't attached, and the last clip doesn't fit
+    assert [attachment.get_filename() for attachment in email.iter_attachments()] == [
+        "stream1.mp3"
+    ]
+    assert "1 sample(s) weren't attached" in email.get_body(("plain",)).get_content()
+
+
+def test_notifier_digest_attachment_policies(config):
+    problems = [
+        ("stream1", "foo", _alerter.Clip("stream1.mp3", b"1", "audio/mpeg")),
+        ("stream2", "foo", _alerter.Clip("stream2.mp3", b"2", "audio/mpeg")),
+    ]
+
+    notifier = _notifier.Notifier(
+        _digest_config(config, "digest_attachments = first\n")
+    )
+    _, email = _digest_messages(notifier, problems)
+    assert len(list(email.iter_attachments())) == 1
+
+    notifier = _notifier.Notifier(_digest_config(config, "digest_attachments = none\n"))
+    _, email = _digest_messages(notifier, problems)
+    assert not list(email.iter_attachments())
+
+
+def test_notifier_digest_key(config):
+    notifier = _notifier.Notifier(
+        config(
+            textwrap.dedent(
+                """\
+                [stream1]
+                url = foo
+                digest_window = 30
+                [stream2]
+                url = bar
+                digest_window = 10
+                [stream3]
+                url = baz
+                digest_window = 30
+                to_emails = ["other@example.com"]
+                [stream4]
+                url = qux
+                """
+            )
+        )
+    )
+
+    assert notifier.digest_window("stream1") == 30
+    assert notifier.digest_key("stream1") == notifier.digest_key("stream2")
+    assert notifier.digest_key("stream1") != notifier.digest_key("stream3")
+    assert notifier.digest_key("stream4") is None
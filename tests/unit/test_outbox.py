@@ -0,0 +1,116 @@
+import json
+
+import mock
+
+from stream_monitor import _alerter, _outbox
+
+_CLIP = _alerter.Clip("stream.mp3", b"mp3 data", "audio/mpeg")
+
+
+def test_outbox_in_memory():
+    outbox = _outbox.Outbox()
+    entry = outbox.add("stream", "matcher", _CLIP, 1000.0)
+    outbox.sync()
+
+    assert len(outbox) == 1
+    assert outbox.entries() == [entry]
+    assert entry.clip == _CLIP
+
+    outbox.remove(entry)
+    outbox.close()
+    assert len(outbox) == 0
+
+
+def test_outbox_survives_restarts(tmp_path):
+    outbox = _outbox.Outbox(tmp_path)
+    first = outbox.add("stream1", "matcher", _CLIP, 1000.0)
+    outbox.add("stream2", "matcher", _CLIP, 1001.0)
+    outbox.sync()
+    outbox.remove(first)
+    outbox.close()
+
+    outbox = _outbox.Outbox(tmp_path)
+    (entry,) = outbox.entries()
+    outbox.close()
+
+    assert entry.stream_name == "stream2"
+    assert entry.matcher_name == "matcher"
+    assert entry.clip == _CLIP
+    assert entry.created == 1001.0
+
+
+def test_outbox_journals_attempts(tmp_path):
+    outbox = _outbox.Outbox(tmp_path)
+    entry = outbox.add("stream", "matcher", _CLIP, 1000.0)
+    entry.attempts = 2
+    entry.channels.add("sms")
+    outbox.update(entry)
+    outbox.close()
+
+    outbox = _outbox.Outbox(tmp_path)
+    (entry,) = outbox.entries()
+    outbox.close()
+
+    # Rewritten into the entry's own record on restart, too
+    assert entry.attempts == 2
+    assert entry.channels == {"sms"}
+    assert len((tmp_path / "outbox.jsonl").read_text().splitlines()) == 1
+
+
+def test_outbox_syncs_in_batches(tmp_path):
+    outbox = _outbox.Outbox(tmp_path)
+    with mock.patch("stream_monitor._outbox.os.fsync") as mock_fsync:
+        for index in range(10):
+            outbox.add(f"stream{index}", "matcher", _CLIP, 1000.0)
+        outbox.sync()
+        outbox.sync()
+
+    mock_fsync.assert_called_once_with(mock.ANY)
+    assert len(_outbox.Outbox(tmp_path)) == 10
+    outbox.close()
+
+
+def test_outbox_compacts(tmp_path):
+    outbox = _outbox.Outbox(tmp_path)
+    entries = [
+        outbox.add(f"stream{index}", "matcher", _CLIP, 1000.0) for index in range(3)
+    ]
+    outbox.sync()
+    journal = tmp_path / "outbox.jsonl"
+    assert len(journal.read_text().splitlines()) == 3
+
+    # Deliveries are appended
+    outbox.remove(entries[0])
+    outbox.remove(entries[1])
+    outbox.sync()
+    outbox.compact()
+    assert len(journal.read_text().splitlines()) == 5
+
+    with mock.patch("stream_monitor._outbox._COMPACT_THRESHOLD", 0):
+        # Until they're most of the journal
+        outbox.compact()
+        assert len(journal.read_text().splitlines()) == 1
+
+        outbox.remove(entries[2])
+        outbox.compact()
+        outbox.close()
+        assert journal.read_text() == ""
+
+
+def test_outbox_ignores_corrupt_records(tmp_path):
+    outbox = _outbox.Outbox(tmp_path)
+    outbox.add("stream", "matcher", _CLIP, 1000.0)
+    outbox.close()
+
+    # As if it crashed writing the second record
+    journal = tmp_path / "outbox.jsonl"
+    record = json.dumps({"id": "second", "stream": "stream2"})
+    with open(journal, "a") as f:
+        f.write(record[:20])
+
+    outbox = _outbox.Outbox(tmp_path)
+    assert [entry.stream_name for entry in outbox.entries()] == ["stream"]
+    outbox.close()
+
+    # The corrupt record is gone once the journal is rewritten
+    assert len(journal.read_text().splitlines()) == 1
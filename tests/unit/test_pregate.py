@@ -0,0 +1,48 @@
+import numpy
+import pytest
+
+from stream_monitor import _pregate
+
+
+def _suspicious(gate, samples):
+    samples = numpy.asarray(samples, dtype=numpy.float32)
+    return gate.suspicious(samples, len(samples))
+
+
+def _noise(level, sample_count=2048):
+    generator = numpy.random.RandomState(0)
+    return level * generator.standard_normal(sample_count)
+
+
+def test_pregate_healthy():
+    gate = _pregate.PreGate()
+
+    assert not _suspicious(gate, _noise(0.1))
+    assert not _suspicious(gate, _noise(0.05))
+
+
+@pytest.mark.parametrize(
+    "samples",
+    [
+        # Silence, or nearly
+        numpy.zeros(2048),
+        _noise(1e-3),
+        # A steady tone
+        0.5 * numpy.sin(2 * numpy.pi * 440 * numpy.arange(2048) / 44100),
+        # Clipping
+        numpy.clip(_noise(2), -1, 1),
+    ],
+)
+def test_pregate_suspicious(samples):
+    assert _suspicious(_pregate.PreGate(), samples)
+
+
+def test_pregate_level_jump():
+    gate = _pregate.PreGate()
+
+    assert not _suspicious(gate, _noise(0.1))
+    assert _suspicious(gate, _noise(0.005))
+
+
+def test_pregate_empty_hop():
+    assert not _suspicious(_pregate.PreGate(), [])
@@ -0,0 +1,114 @@
+import threading
+
+import numpy
+import pytest
+
+from stream_monitor import _reader
+
+
+class _FakeSource:
+    def __init__(self, hop_count, hop_size=4, last_hop_size=2):
+        self._hops = [
+            numpy.full(hop_size, index, dtype=numpy.float32)
+            for index in range(hop_count)
+        ]
+        self._hop_size = hop_size
+        self._last_hop_size = last_hop_size
+        self.read_count = 0
+
+    def __call__(self):
+        hop = self._hops[self.read_count]
+        self.read_count += 1
+        if self.read_count == len(self._hops):
+            return hop, self._last_hop_size
+        return hop, self._hop_size
+
+
+def test_reader_reads_in_order():
+    reader = _reader.Reader(_FakeSource(10), 4, 3)
+
+    for index in range(9):
+        samples, sample_count = reader.read()
+        assert sample_count == 4
+        numpy.testing.assert_array_equal(samples, [index] * 4)
+
+    samples, sample_count = reader.read()
+    assert sample_count == 2
+    numpy.testing.assert_array_equal(samples[:2], [9, 9])
+
+    reader.close()
+
+
+def test_reader_reads_ahead():
+    source = _FakeSource(100)
+    reader = _reader.Reader(source, 4, 5)
+    reader.read()
+
+    # Wait for the queue to fill up
+    for _ in range(100):
+        if reader.stats().depth == 5:
+            break
+        threading.Event().wait(0.01)
+
+    stats = reader.stats()
+    assert stats.depth == 5
+    assert stats.capacity == 5
+    assert stats.consumed_hops == 1
+    assert stats.decoded_hops == source.read_count
+
+    reader.close()
+
+
+def test_reader_raises_source_errors():
+    def _read():
+        raise RuntimeError("boom")
+
+    reader = _reader.Reader(_read, 4, 2)
+    with pytest.raises(RuntimeError):
+        reader.read()
+
+    reader.close()
+
+
+def test_reader_ready():
+    release = threading.Event()
+    source = _FakeSource(10)
+
+    def _read():
+        release.wait()
+        return source()
+
+    reader = _reader.Reader(_read, 4, 2)
+
+    # Nothing decoded yet: reading would wait on the source
+    assert not reader.ready()
+
+    release.set()
+    for _ in range(100):
+        if reader.ready():
+            break
+        threading.Event().wait(0.01)
+
+    assert reader.ready()
+    reader.read()
+    reader.close()
+
+
+def test_reader_counts_underruns():
+    release = threading.Event()
+    source = _FakeSource(10)
+
+    def _read():
+        release.wait()
+        return source()
+
+    reader = _reader.Reader(_read, 4, 2)
+
+    # Found empty however many times, the queue only ran dry once
+    assert not reader.ready()
+    assert not reader.ready()
+    release.set()
+    reader.read()
+
+    assert reader.stats().underruns == 1
+    reader.close()
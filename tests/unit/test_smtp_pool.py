@@ -0,0 +1,113 @@
+import smtplib
+import threading
+import time
+
+import mock
+import pytest
+
+from stream_monitor import _smtp_pool
+
+
+def _send(pool, message="message", login="login"):
+    pool.send("smtp.example.com", 465, login, "password", [message])
+
+
+def test_pool_reuses_sessions():
+    pool = _smtp_pool.SmtpPool()
+    with mock.patch(
+        "stream_monitor._smtp_pool.smtplib.SMTP_SSL", autospec=True
+    ) as mock_smtp:
+        _send(pool, "first")
+        _send(pool, "second")
+        _send(pool, "other", login="other")
+        pool.close()
+
+    # One session per login
+    assert pool.connections == 2
+    assert mock_smtp.call_count == 2
+    mock_smtp.return_value.send_message.assert_has_calls(
+        [mock.call("first"), mock.call("second"), mock.call("other")]
+    )
+    assert mock_smtp.return_value.quit.call_count == 2
+
+
+def test_pool_reconnects_dropped_sessions():
+    pool = _smtp_pool.SmtpPool()
+    with mock.patch(
+        "stream_monitor._smtp_pool.smtplib.SMTP_SSL", autospec=True
+    ) as mock_smtp:
+        _send(pool, "first")
+        mock_smtp.return_value.send_message.side_effect = [
+            smtplib.SMTPServerDisconnected(),
+            None,
+        ]
+        _send(pool, "second")
+        pool.close()
+
+    assert pool.connections == 2
+    mock_smtp.return_value.send_message.assert_has_calls(
+        [mock.call("first"), mock.call("second"), mock.call("second")]
+    )
+
+
+def test_pool_closes_idle_sessions():
+    pool = _smtp_pool.SmtpPool(idle_timeout=0)
+    with mock.patch(
+        "stream_monitor._smtp_pool.smtplib.SMTP_SSL", autospec=True
+    ) as mock_smtp:
+        _send(pool)
+        time.sleep(0.01)
+        _send(pool)
+
+    # The first session was idle too long to be reused
+    assert pool.connections == 2
+    mock_smtp.return_value.quit.assert_called_once_with()
+
+
+def test_pool_discards_failed_sessions():
+    pool = _smtp_pool.SmtpPool()
+    with mock.patch(
+        "stream_monitor._smtp_pool.smtplib.SMTP_SSL", autospec=True
+    ) as mock_smtp:
+        mock_smtp.return_value.send_message.side_effect = smtplib.SMTPDataError(
+            554, b"Rejected"
+        )
+        with pytest.raises(smtplib.SMTPDataError):
+            _send(pool)
+
+        mock_smtp.return_value.quit.assert_called_once_with()
+        mock_smtp.return_value.send_message.side_effect = None
+        _send(pool)
+
+    assert pool.connections == 2
+
+
+def test_pool_limits_connections():
+    pool = _smtp_pool.SmtpPool(max_connections=2)
+    lock = threading.Lock()
+    active = 0
+    most_active = 0
+
+    def _send_message(message):
+        nonlocal active, most_active
+        with lock:
+            active += 1
+            most_active = max(most_active, active)
+        time.sleep(0.01)
+        with lock:
+            active -= 1
+
+    with mock.patch(
+        "stream_monitor._smtp_pool.smtplib.SMTP_SSL", autospec=True
+    ) as mock_smtp:
+        mock_smtp.return_value.send_message.side_effect = _send_message
+        threads = [threading.Thread(target=_send, args=(pool,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        pool.close()
+
+    assert most_active == 2
+    assert pool.connections <= 2
+    assert mock_smtp.return_value.send_message.call_count == 8
@@ -0,0 +1,132 @@
+import email
+import smtplib
+import ssl
+import time
+from email.message import EmailMessage
+
+import mock
+import pytest
+
+from stream_monitor import _errors, _smtp_pool, _smtp_server
+
+
+def _message(content="Hello"):
+    message = EmailMessage()
+    message["Subject"] = "Subject"
+    message["From"] = "from@example.com"
+    message["To"] = "to@example.com"
+    message.set_content(content)
+    return message
+
+
+@pytest.mark.parametrize("tls", ["ssl", "starttls"])
+def test_smtp_server_receives_messages(smtp_server, tls):
+    server = smtp_server(tls=tls)
+    pool = _smtp_pool.SmtpPool()
+    pool.send(server.host, server.port, "login", "password", [_message()] * 2)
+    pool.close()
+
+    assert server.connections >= 1
+    assert server.logins == 1
+    assert len(server.messages) == 2
+    assert server.messages[0].mail_from == "<from@example.com>"
+    assert server.messages[0].rcpt_tos == ["<to@example.com>"]
+
+    received = email.message_from_bytes(server.messages[0].data)
+    assert received["Subject"] == "Subject"
+    assert received.get_payload().strip() == "Hello"
+
+
+def test_smtp_server_undoes_dot_stuffing(smtp_server):
+    server = smtp_server()
+    pool = _smtp_pool.SmtpPool()
+    pool.send(server.host, server.port, "login", "password", [_message(".\n..")])
+    pool.close()
+
+    assert server.messages[0].data.endswith(b"\r\n.\r\n..\r\n")
+
+
+def test_smtp_server_login_mechanisms(smtp_server):
+    server = smtp_server()
+    for mechanism in ("PLAIN", "LOGIN"):
+        session = smtplib.SMTP_SSL(server.host, server.port, timeout=5)
+        session.ehlo()
+        session.esmtp_features["auth"] = mechanism
+        session.login("login", "password")
+        session.quit()
+
+    assert server.logins == 2
+
+
+def test_smtp_server_failures(smtp_server):
+    server = smtp_server()
+    server.fail_next()
+    pool = _smtp_pool.SmtpPool()
+
+    with pytest.raises(smtplib.SMTPDataError) as error:
+        pool.send(server.host, server.port, "login", "password", [_message()])
+    assert error.value.smtp_code == 451
+
+    pool.send(server.host, server.port, "login", "password", [_message()])
+    pool.close()
+
+    assert server.rejected == 1
+    assert len(server.messages) == 1
+
+
+def test_smtp_server_failure_rate(smtp_server):
+    server = smtp_server(failure_rate=0.5)
+    pool = _smtp_pool.SmtpPool()
+
+    for _ in range(20):
+        try:
+            pool.send(server.host, server.port, "login", "password", [_message()])
+        except smtplib.SMTPDataError:
+            pass
+    pool.close()
+
+    assert 0 < server.rejected < 20
+    assert len(server.messages) == 20 - server.rejected
+
+
+def test_smtp_server_latency(smtp_server):
+    server = smtp_server(latency=0.05)
+    session = smtplib.SMTP_SSL(server.host, server.port, timeout=5)
+
+    start = time.monotonic()
+    session.noop()
+    assert time.monotonic() - start >= 0.05
+    session.quit()
+
+
+def test_smtp_server_wait_for_messages(smtp_server):
+    server = smtp_server()
+    assert not server.wait_for_messages(1, timeout=0.01)
+
+    pool = _smtp_pool.SmtpPool()
+    pool.send(server.host, server.port, "login", "password", [_message()])
+    pool.close()
+    assert server.wait_for_messages(1, timeout=1)
+
+
+def test_smtp_server_requires_openssl():
+    with mock.patch(
+        "stream_monitor._smtp_server.subprocess.run", side_effect=FileNotFoundError()
+    ):
+        with pytest.raises(_errors.OpensslNotAvailableError):
+            _smtp_server.SmtpServer()
+
+
+def test_smtp_server_invalid_tls():
+    with pytest.raises(ValueError):
+        _smtp_server.SmtpServer(tls="none")
+
+
+def test_smtp_server_speaks_tls(smtp_server):
+    server = smtp_server()
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    session = smtplib.SMTP_SSL(server.host, server.port, context=context, timeout=5)
+    assert session.sock.version()
+    session.quit()
@@ -1,9 +1,12 @@
+import math
 import textwrap
 
 import mock
+import numpy
 import pytest
 
-from stream_monitor import _errors, _matchers, _stream
+from stream_monitor import _errors, _matchers, _sources, _stream
+from stream_monitor._config import _errors as _config_errors
 
 
 class _TestFalseMatcher(_matchers.Matcher):
@@ -20,6 +23,22 @@ class _TestTrueMatcher(_matchers.Matcher):
         return 2, True
 
 
+class _TestFramedMatcher(_matchers.Matcher):
+    name = "test framed matcher"
+    frame_size = 512
+    hop_size = 256
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.frame_count = 0
+
+    def _process_samples(self, samples, sample_count):
+        assert len(samples) == self.frame_size
+        assert sample_count == self.hop_size
+        self.frame_count += 1
+        return 3, True
+
+
 def test_stream_good(test_data_normal_path, stream_config):
     config = stream_config(
         textwrap.dedent(
@@ -48,13 +67,15 @@ def test_stream_good(test_data_normal_path, stream_config):
     callback.assert_not_called()
 
 
-def test_stream_bad(test_data_normal_path, stream_config):
+@pytest.mark.parametrize("source", ["aubio", "ffmpeg"])
+def test_stream_bad(test_data_normal_path, stream_config, source):
     config = stream_config(
         textwrap.dedent(
             f"""\
             [stream]
             url = {str(test_data_normal_path)}
             timeout = 1
+            source = {source}
             """
         ),
         stream_name="stream",
@@ -108,3 +129,793 @@ def test_stream_bad_short_cooldown(test_data_normal_path, stream_config):
             mock.call("stream", _TestTrueMatcher.name, mock.ANY),
         ]
     )
+
+
+def test_stream_framed_matcher(test_data_normal_path, stream_config):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            timeout = 1
+            """
+        ),
+        stream_name="stream",
+    )
+
+    callback = mock.MagicMock()
+    matcher = _TestFramedMatcher(config)
+    stream = _stream.Stream(
+        name="stream", config=config, problem_callback=callback, matchers=[matcher],
+    )
+
+    _, data = stream.process_hop()
+    assert data == {_TestFramedMatcher.name: 3}
+
+    # A 2048-sample hop yields seven overlapping 512-sample frames at first,
+    # and eight per hop after that
+    assert matcher.frame_count == 7
+    stream.process_hop()
+    assert matcher.frame_count == 15
+
+    with pytest.raises(_errors.EndOfStreamError):
+        while True:
+            stream.process_hop()
+
+    stream.close()
+    callback.assert_called_once_with("stream", _TestFramedMatcher.name, mock.ANY)
+
+
+class _TestHopSizeMatcher(_matchers.Matcher):
+    name = "test hop size matcher"
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.hop_sizes = set()
+
+    def _process_samples(self, samples, sample_count):
+        self.hop_sizes.add(len(samples))
+        return 4, True
+
+
+@pytest.mark.parametrize(
+    "samplerate, analysis_samplerate, factor",
+    [
+        (44100, None, 1),
+        (44100, 44100, 1),
+        (44100, 22050, 2),
+        (44100, 16000, 2),
+        (48000, 16000, 2),
+        (48000, 12000, 4),
+        (22050, 44100, 1),
+    ],
+)
+def test_decimation_factor(samplerate, analysis_samplerate, factor):
+    assert _stream._decimation_factor(samplerate, analysis_samplerate) == factor
+
+
+@pytest.mark.parametrize("block", [False, True])
+def test_stream_analysis_samplerate(test_data_normal_path, stream_config, block):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            timeout = 1
+            analysis_samplerate = 8000
+            """
+        ),
+        stream_name="stream",
+    )
+
+    callback = mock.MagicMock()
+    matcher = _TestHopSizeMatcher(config)
+    stream = _stream.Stream(
+        name="stream", config=config, problem_callback=callback, matchers=[matcher],
+    )
+
+    # The matchers see smaller hops, but timing is unchanged
+    assert stream.analysis_hop_size < stream.hop_size
+    with pytest.raises(_errors.EndOfStreamError):
+        while True:
+            if block:
+                stream.process_hops(16)
+            else:
+                data = stream.process_hop()
+                if data is not None:
+                    assert data[0] == stream.hop_size / stream._source.samplerate
+
+    stream.close()
+    assert max(matcher.hop_sizes) == stream.analysis_hop_size
+    callback.assert_called_once_with("stream", _TestHopSizeMatcher.name, mock.ANY)
+
+
+def test_stream_analysis_samplerate_too_low(test_data_normal_path, stream_config):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            analysis_samplerate = 1
+            """
+        ),
+        stream_name="stream",
+    )
+
+    # Decimating that far would leave hops smaller than the pitch frames
+    with pytest.raises(_config_errors.StreamConfigInvalidValueError) as error:
+        _stream.Stream(
+            name="stream",
+            config=config,
+            problem_callback=mock.MagicMock(),
+            matchers=[_matchers.PitchConfidenceMatcher(config)],
+        )
+
+    # Half the source samplerate would already halve the hop
+    source = _sources.create_source("aubio", str(test_data_normal_path), 2048)
+    source.close()
+    assert str(error.value) == (
+        "invalid 'analysis_samplerate': 1. It should be greater than "
+        f"{source.samplerate / 2:g} for the matchers' frames of 2048 samples"
+    )
+
+
+@pytest.mark.parametrize("hop_count", [1, 7, 64])
+def test_stream_process_hops(test_data_normal_path, stream_config, hop_count):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            timeout = 5
+            cooldown = 5
+            """
+        ),
+        stream_name="stream",
+    )
+
+    callback = mock.MagicMock()
+    matcher = _TestFramedMatcher(config)
+    stream = _stream.Stream(
+        name="stream",
+        config=config,
+        problem_callback=callback,
+        matchers=[_TestTrueMatcher(config), matcher],
+    )
+
+    data = stream.process_hops(hop_count)
+    assert len(data) == hop_count
+    assert data[0][1] == {_TestTrueMatcher.name: 2, _TestFramedMatcher.name: 3}
+
+    with pytest.raises(_errors.EndOfStreamError):
+        while True:
+            stream.process_hops(hop_count)
+
+    stream.close()
+    callback.assert_has_calls(
+        [
+            mock.call("stream", mock.ANY, mock.ANY),
+            mock.call("stream", mock.ANY, mock.ANY),
+        ]
+    )
+
+
+def test_stream_read_ahead(test_data_normal_path, stream_config):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            timeout = 1
+            read_ahead = 8
+            """
+        ),
+        stream_name="stream",
+    )
+
+    callback = mock.MagicMock()
+    stream = _stream.Stream(
+        name="stream",
+        config=config,
+        problem_callback=callback,
+        matchers=[_TestTrueMatcher(config)],
+    )
+
+    with pytest.raises(_errors.EndOfStreamError):
+        while True:
+            stream.process_hop()
+
+    stats = stream.reader_stats
+    assert stats.capacity == 8
+    assert stats.consumed_hops == stats.decoded_hops
+
+    # Published with the stream's metrics, too
+    reader = stream.metrics_snapshot()["reader"]
+    assert reader["capacity"] == 8
+    assert reader["depth"] == 0
+    assert reader["underruns"] >= 0
+
+    stream.close()
+    callback.assert_called_once_with("stream", _TestTrueMatcher.name, mock.ANY)
+
+
+@pytest.mark.parametrize("block", [False, True])
+def test_stream_metrics(test_data_normal_path, stream_config, block):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            timeout = 1
+            cooldown = 1
+            """
+        ),
+        stream_name="stream",
+    )
+
+    callback = mock.MagicMock()
+    stream = _stream.Stream(
+        name="stream",
+        config=config,
+        problem_callback=callback,
+        matchers=[_TestTrueMatcher(config)],
+        instrument=True,
+    )
+
+    with pytest.raises(_errors.EndOfStreamError):
+        while True:
+            if block:
+                stream.process_hops(16)
+            else:
+                stream.process_hop()
+
+    stream.close()
+    metrics = stream.metrics
+    assert metrics.hops == metrics.read.count
+    assert metrics.window.count == metrics.hops
+    # Some alerts are dropped, since they come faster than they're delivered
+    assert metrics.alert.count >= callback.call_count > 0
+    assert metrics.cooldown_skipped_hops > 0
+    assert metrics.reconnects == 0
+
+    matcher_count = metrics.matchers[_TestTrueMatcher.name].count
+    if block:
+        assert 0 < matcher_count < metrics.hops
+    else:
+        # Except for a partial last hop, which doesn't complete a frame
+        analyzed_hops = metrics.hops - metrics.cooldown_skipped_hops
+        assert analyzed_hops - 1 <= matcher_count <= analyzed_hops
+
+
+def test_stream_metrics_reconnects(test_data_normal_path, stream_config):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            """
+        ),
+        stream_name="stream",
+    )
+
+    stream = _stream.Stream(
+        name="stream",
+        config=config,
+        problem_callback=mock.MagicMock(),
+        matchers=[_TestFalseMatcher(config)],
+        instrument=True,
+    )
+    with mock.patch.object(
+        stream, "_source", side_effect=RuntimeError("connection lost")
+    ):
+        stream.process_hop()
+
+    stream.close()
+    assert stream.metrics.reconnects == 1
+
+
+def test_stream_not_instrumented(test_data_normal_path, stream_config):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            """
+        ),
+        stream_name="stream",
+    )
+
+    stream = _stream.Stream(
+        name="stream",
+        config=config,
+        problem_callback=mock.MagicMock(),
+        matchers=[_TestFalseMatcher(config)],
+    )
+    stream.process_hop()
+    stream.close()
+
+    assert stream.metrics is None
+
+
+def test_stream_metrics_snapshot(test_data_normal_path, stream_config):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            """
+        ),
+        stream_name="stream",
+    )
+
+    stream = _stream.Stream(
+        name="stream",
+        config=config,
+        problem_callback=mock.MagicMock(),
+        matchers=[_TestTrueMatcher(config)],
+        instrument=True,
+    )
+    for _ in range(10):
+        stream.process_hop()
+    stream.close()
+
+    snapshot = stream.metrics_snapshot()
+    assert snapshot["hops"] == 10
+    assert snapshot["matcher_values"] == {_TestTrueMatcher.name: 2}
+    assert snapshot["match_seconds"] == pytest.approx(
+        10 * stream.hop_size / stream._source.samplerate
+    )
+    assert not snapshot["in_cooldown"]
+    assert snapshot["alerts"] == {"sent": 0, "dropped": 0, "failed": 0}
+    assert snapshot["matchers"][_TestTrueMatcher.name][0][0] >= 0
+
+    # A file is read much faster than real time, so it never lags
+    assert snapshot["lag"] == 0
+
+
+class _TestCountingMatcher(_matchers.Matcher):
+    name = "test counting matcher"
+
+    def __init__(self, config, name):
+        super().__init__(config)
+        self.name = name
+        self.hop_count = 0
+
+    def _process_samples(self, samples, sample_count):
+        self.hop_count += 1
+        return 5, False
+
+
+class _TestSlowMatcher(_TestCountingMatcher):
+    def __init__(self, config, name, clock):
+        super().__init__(config, name)
+        self._clock = clock
+
+    def _process_samples(self, samples, sample_count):
+        self._clock["now"] += self._clock["cost"]
+        return super()._process_samples(samples, sample_count)
+
+
+def test_stream_sheds_load(test_data_normal_path, stream_config):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            max_lag = 0.1
+            """
+        ),
+        stream_name="stream",
+    )
+
+    # A live source: each hop can only be read once it's been broadcast, and
+    # the matchers take longer than that to analyze it
+    clock = {"now": 0.0, "cost": 0.0, "broadcast": 0.0}
+    read_source = _stream.Stream._read_source
+
+    def _read_live(stream):
+        hop = read_source(stream)
+        clock["broadcast"] += hop[1] / stream._source.samplerate
+        clock["now"] = max(clock["now"], clock["broadcast"])
+        return hop
+
+    primary = _TestSlowMatcher(config, "primary", clock)
+    secondary = _TestSlowMatcher(config, "secondary", clock)
+    with mock.patch.object(_stream, "_SHED_CHECK_INTERVAL", 0.2), mock.patch(
+        "stream_monitor._stream.time.perf_counter", side_effect=lambda: clock["now"]
+    ), mock.patch.object(_stream.Stream, "_read_source", _read_live):
+        stream = _stream.Stream(
+            name="stream",
+            config=config,
+            problem_callback=mock.MagicMock(),
+            matchers=[primary, secondary],
+        )
+        clock["cost"] = 5 * stream.hop_size / stream._source.samplerate
+
+        # Shed more and more load, until only one in eight hops is analyzed
+        # by the primary matcher
+        hop_count = 0
+        while stream.shed_level < 4:
+            data = stream.process_hop()
+            hop_count += 1
+        assert stream.lag > 0.1
+        assert secondary.hop_count < primary.hop_count < hop_count
+
+        primary.hop_count = 0
+        secondary.hop_count = 0
+        for _ in range(16):
+            data = stream.process_hop()
+        assert primary.hop_count == 2
+        assert secondary.hop_count == 0
+        assert data[1] == {
+            "primary": 5,
+            "secondary": pytest.approx(float("nan"), nan_ok=True),
+        }
+
+        # Once analysis is cheap again, the stream recovers, even though its
+        # source stalls and only keeps pace with live from then on
+        clock["cost"] = 0.0
+        clock["broadcast"] += 10
+        for _ in range(100):
+            if stream.shed_level == 0:
+                break
+            stream.process_hop()
+        assert stream.shed_level == 0
+        assert stream.lag < 0.05
+
+    snapshot = stream.metrics_snapshot()
+    stream.close()
+
+    assert snapshot["shed_events"] == 4
+    assert snapshot["shed_hops"] > 0
+
+
+@pytest.mark.parametrize("shed_level", [1, 3])
+def test_stream_shedding_keeps_matcher_values(
+    test_data_normal_path, stream_config, shed_level
+):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            timeout = 1000
+            """
+        ),
+        stream_name="stream",
+    )
+
+    def _values(level):
+        with mock.patch.object(_stream.Stream, "_update_shedding"):
+            stream = _stream.Stream(
+                name="stream",
+                config=config,
+                problem_callback=mock.MagicMock(),
+                matchers=[_matchers.PitchConfidenceMatcher(config)],
+            )
+            stream._shed_level = level
+            values = list()
+            with pytest.raises(_errors.EndOfStreamError):
+                while True:
+                    data = stream.process_hop()
+                    values.append(data[1][_matchers.PitchConfidenceMatcher.name])
+            stream.close()
+        return numpy.array(values)
+
+    # Hops analyzed while shedding see the same audio they would otherwise
+    # have, rather than YIN joining hops far apart
+    expected = _values(0)
+    values = _values(shed_level)
+    stride = 2 ** shed_level
+    analyzed = numpy.arange(stride - 1, len(values), stride)
+    numpy.testing.assert_allclose(values[analyzed], expected[analyzed], atol=1e-3)
+
+
+class _TestExpensiveMatcher(_TestCountingMatcher):
+    expensive = True
+
+    def __init__(self, config, name, match=False):
+        super().__init__(config, name)
+        self.match = match
+        self.resynchronize_count = 0
+
+    def _process_samples(self, samples, sample_count):
+        self.hop_count += 1
+        return 6, self.match
+
+    def resynchronize(self, samples, sample_count):
+        assert sample_count == len(samples)
+        self.resynchronize_count += 1
+
+
+def test_stream_pregate(test_data_normal_path, stream_config):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            pregate_interval = 4
+            """
+        ),
+        stream_name="stream",
+    )
+
+    cheap = _TestCountingMatcher(config, "cheap")
+    expensive = _TestExpensiveMatcher(config, "expensive")
+    stream = _stream.Stream(
+        name="stream",
+        config=config,
+        problem_callback=mock.MagicMock(),
+        matchers=[cheap, expensive],
+    )
+
+    with pytest.raises(_errors.EndOfStreamError):
+        while True:
+            stream.process_hop()
+    snapshot = stream.metrics_snapshot()
+    stream.close()
+
+    # Healthy hops only get one in four checked by the expensive matcher
+    assert cheap.hop_count // 4 <= expensive.hop_count < cheap.hop_count / 2
+    # The last, partial hop doesn't complete a frame
+    assert 0 <= expensive.hop_count + snapshot["pregated_hops"] - cheap.hop_count <= 1
+    assert expensive.resynchronize_count > 0
+
+
+def test_stream_pregate_matches_at_full_rate(test_data_normal_path, stream_config):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            pregate_interval = 4
+            """
+        ),
+        stream_name="stream",
+    )
+
+    expensive = _TestExpensiveMatcher(config, "expensive", match=True)
+    stream = _stream.Stream(
+        name="stream",
+        config=config,
+        problem_callback=mock.MagicMock(),
+        matchers=[expensive],
+    )
+
+    for _ in range(20):
+        stream.process_hop()
+    stream.close()
+
+    # Once the first sampled hop matches, every hop is checked and counted
+    assert expensive.hop_count >= 17
+    assert stream.metrics_snapshot()["match_seconds"] == pytest.approx(
+        expensive.hop_count * stream.hop_size / stream._source.samplerate
+    )
+
+
+class _TestExpensiveFramedMatcher(_matchers.Matcher):
+    name = "test expensive framed matcher"
+    frame_size = 4096
+    hop_size = 2048
+    expensive = True
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.frames = list()
+
+    def _process_samples(self, samples, sample_count):
+        self.frames.append(numpy.array(samples))
+        return 8, False
+
+
+def _read_all(path):
+    source = _sources.create_source("aubio", str(path), 2048)
+    hops = list()
+    try:
+        while True:
+            samples, count = source()
+            hops.append(numpy.array(samples[:count]))
+            if count < 2048:
+                break
+    finally:
+        source.close()
+    return numpy.concatenate(hops)
+
+
+def test_stream_pregate_keeps_framing(test_data_normal_path, stream_config):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            pregate_interval = 4
+            """
+        ),
+        stream_name="stream",
+    )
+
+    # The only matcher using this framing is gated on most hops
+    framed = _TestExpensiveFramedMatcher(config)
+    stream = _stream.Stream(
+        name="stream",
+        config=config,
+        problem_callback=mock.MagicMock(),
+        matchers=[_TestCountingMatcher(config, "cheap"), framed],
+    )
+    with pytest.raises(_errors.EndOfStreamError):
+        while True:
+            stream.process_hop()
+    stream.close()
+
+    # Frames are still contiguous audio, never joining hops far apart
+    audio = _read_all(test_data_normal_path)
+    starts = range(0, len(audio) - framed.frame_size + 1, framed.hop_size)
+    assert framed.frames
+    assert len(framed.frames) < len(starts) / 2
+    for frame in framed.frames:
+        assert any(
+            numpy.array_equal(frame, audio[start : start + framed.frame_size])
+            for start in starts
+        )
+
+
+class _TestResynchronizedMatcher(_TestCountingMatcher):
+    def __init__(self, config, name):
+        super().__init__(config, name)
+        self.resynchronized_hops = list()
+
+    def _process_samples(self, samples, sample_count):
+        self.hop_count += 1
+        return 7, True
+
+    def resynchronize(self, samples, sample_count):
+        self.resynchronized_hops.append(self.hop_count)
+
+
+def test_stream_cooldown_fast_path(test_data_normal_path, stream_config):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            timeout = 1
+            cooldown = 10
+            preceding_duration = 1
+            """
+        ),
+        stream_name="stream",
+    )
+
+    callback = mock.MagicMock()
+    matcher = _TestResynchronizedMatcher(config, "resynchronized")
+    stream = _stream.Stream(
+        name="stream",
+        config=config,
+        problem_callback=callback,
+        matchers=[matcher],
+        instrument=True,
+    )
+
+    while not stream.in_cooldown:
+        stream.process_hop()
+    analyzed_hops = matcher.hop_count
+    window_writes = stream.metrics.window.count
+
+    cooldown_hops = 0
+    while stream.in_cooldown:
+        assert stream.process_hop() is None
+        cooldown_hops += 1
+
+    # Only the end of the cooldown is kept for the window, and the matcher is
+    # only given the last couple of hops to catch up on
+    assert matcher.hop_count == analyzed_hops
+    assert 0 < stream.metrics.window.count - window_writes < cooldown_hops / 2
+    assert matcher.resynchronized_hops == [analyzed_hops] * 2
+
+    # The next hop is analyzed afresh
+    data = stream.process_hop()
+    stream.close()
+    assert data[1] == {"resynchronized": 7}
+    assert matcher.hop_count == analyzed_hops + 1
+    assert stream.metrics_snapshot()["match_seconds"] == pytest.approx(
+        stream.hop_size / stream._source.samplerate
+    )
+
+
+@pytest.mark.parametrize("window_storage", ["int16", "zlib"])
+def test_stream_window_storage(test_data_normal_path, stream_config, window_storage):
+    def _alert_samples(storage):
+        config = stream_config(
+            textwrap.dedent(
+                f"""\
+                [stream]
+                url = {str(test_data_normal_path)}
+                timeout = 5
+                window_storage = {storage}
+                """
+            ),
+            stream_name="stream",
+        )
+        stream = _stream.Stream(
+            name="stream",
+            config=config,
+            problem_callback=mock.MagicMock(),
+            matchers=[_TestTrueMatcher(config)],
+        )
+        with mock.patch.object(stream._alerter, "submit") as mock_submit:
+            while not stream.in_cooldown:
+                stream.process_hop()
+        stream.close()
+
+        _, samples, _, _ = mock_submit.call_args[0]
+        return samples
+
+    expected = _alert_samples("float32")
+    samples = _alert_samples(window_storage)
+
+    # Samples are quantized to 16 bits, as they are when written to a clip
+    assert samples.dtype == numpy.float32
+    assert len(samples) == len(expected)
+    numpy.testing.assert_allclose(samples, expected, atol=1 / 32768)
+
+
+def test_stream_clip_segments(test_data_normal_path, stream_config):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            timeout = 5
+            preceding_duration = 5
+            clip_segment_duration = 1
+            """
+        ),
+        stream_name="stream",
+    )
+    stream = _stream.Stream(
+        name="stream",
+        config=config,
+        problem_callback=mock.MagicMock(),
+        matchers=[_TestTrueMatcher(config)],
+    )
+    with mock.patch.object(stream._alerter, "submit") as mock_submit:
+        while not stream.in_cooldown:
+            stream.process_hop()
+    window_length = len(stream._window_samples)
+    stream.close()
+
+    # The clip is made of the segments already encoded, plus a short tail
+    _, tail, samplerate, segments = mock_submit.call_args[0]
+    assert len(tail) < samplerate
+    assert len(segments) == math.ceil((window_length - len(tail)) / samplerate)
+
+
+def test_stream_clip_segments_unsupported_format(test_data_normal_path, stream_config):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [stream]
+            url = {str(test_data_normal_path)}
+            timeout = 5
+            preceding_duration = 5
+            clip_segment_duration = 1
+            clip_format = flac
+            """
+        ),
+        stream_name="stream",
+    )
+    stream = _stream.Stream(
+        name="stream",
+        config=config,
+        problem_callback=mock.MagicMock(),
+        matchers=[_TestTrueMatcher(config)],
+    )
+    with mock.patch.object(stream._alerter, "submit") as mock_submit:
+        while not stream.in_cooldown:
+            stream.process_hop()
+    stream.close()
+
+    # FLAC can't be encoded in segments, so the whole window is submitted
+    _, samples, _, segments = mock_submit.call_args[0]
+    assert samples.dtype == numpy.float32
+    assert not segments
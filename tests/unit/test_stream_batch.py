@@ -0,0 +1,179 @@
+import textwrap
+
+import mock
+import pytest
+
+from stream_monitor import _errors, _matchers, _stream, _stream_batch
+
+
+def _create_stream(stream_config, path, name, extra_config="", matcher_types=None):
+    config = stream_config(
+        textwrap.dedent(
+            f"""\
+            [{name}]
+            url = {str(path)}
+            timeout = 10
+            """
+        )
+        + extra_config,
+        stream_name=name,
+    )
+
+    callback = mock.MagicMock()
+    stream = _stream.Stream(
+        name=name,
+        config=config,
+        problem_callback=callback,
+        matchers=[
+            matcher_type(config)
+            for matcher_type in matcher_types
+            or [_matchers.PitchConfidenceMatcher, _matchers.VocoderMatcher]
+        ],
+    )
+    return stream, callback
+
+
+def _process_all(process):
+    hop_data = []
+    with pytest.raises(_errors.EndOfStreamError):
+        while True:
+            hop_data.append(process())
+    return hop_data
+
+
+@pytest.mark.parametrize(
+    "extra_config, matcher_types",
+    [
+        ("", None),
+        # Pitch confidence frames don't fit in a hop at this samplerate
+        ("analysis_samplerate = 11025\n", [_matchers.VocoderMatcher]),
+    ],
+)
+def test_stream_batch_matches_individual_streams(
+    test_data_bad_path, stream_config, extra_config, matcher_types
+):
+    normal_path = sorted((test_data_bad_path.parent.parent / "normal").iterdir())[0]
+    paths = [test_data_bad_path, normal_path]
+
+    streams = [
+        _create_stream(
+            stream_config, path, f"stream{index}", extra_config, matcher_types
+        )
+        for index, path in enumerate(paths)
+    ]
+    batch = _stream_batch.StreamBatch([stream for stream, _ in streams])
+    batch_data = _process_all(batch.process_hop)
+
+    for (stream, callback), path, index in zip(streams, paths, range(len(paths))):
+        stream.close()
+
+        expected_stream, expected_callback = _create_stream(
+            stream_config, path, f"stream{index}", extra_config, matcher_types
+        )
+        expected_data = _process_all(expected_stream.process_hop)
+        expected_stream.close()
+
+        assert callback.call_count == expected_callback.call_count
+
+        # The batch stops when the shortest stream ends
+        for data, expected in zip(batch_data, expected_data):
+            data = data[index]
+            if expected is None:
+                assert data is None
+                continue
+
+            assert data[0] == expected[0]
+            for name, value in expected[1].items():
+                assert data[1][name] == pytest.approx(value, abs=1e-4, nan_ok=True)
+
+
+class _TestCountingMatcher(_matchers.Matcher):
+    name = "test counting matcher"
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.hop_count = 0
+
+    def _process_samples(self, samples, sample_count):
+        self.hop_count += 1
+        return 1, False
+
+
+def test_stream_batch_sheds_matchers(test_data_normal_path, stream_config):
+    streams = list()
+    for name in ("stream1", "stream2"):
+        config = stream_config(
+            textwrap.dedent(
+                f"""\
+                [{name}]
+                url = {str(test_data_normal_path)}
+                """
+            ),
+            stream_name=name,
+        )
+        streams.append(
+            _stream.Stream(
+                name=name,
+                config=config,
+                problem_callback=mock.MagicMock(),
+                matchers=[_TestCountingMatcher(config), _TestCountingMatcher(config)],
+                instrument=True,
+            )
+        )
+
+    # The first stream only runs its first matcher
+    with mock.patch.object(_stream.Stream, "_update_shedding"):
+        streams[0]._shed_level = 1
+        batch = _stream_batch.StreamBatch(streams)
+        for _ in range(10):
+            batch.process_hop()
+    for stream in streams:
+        stream.close()
+
+    assert [matcher.hop_count for matcher in streams[0].matchers] == [10, 0]
+    assert [matcher.hop_count for matcher in streams[1].matchers] == [10, 10]
+
+    # Batched matchers are timed too (both matchers share a name)
+    counts = [
+        sum(stream.metrics.matchers[_TestCountingMatcher.name].snapshot()[0])
+        for stream in streams
+    ]
+    assert counts == [10, 20]
+
+
+def test_stream_batch_matches_individual_streams_shedding(
+    test_data_normal_path, stream_config
+):
+    def _process(batched):
+        stream, _ = _create_stream(stream_config, test_data_normal_path, "stream")
+        with mock.patch.object(_stream.Stream, "_update_shedding"):
+            # Only the pitch matcher, on one in two hops
+            stream._shed_level = 2
+            if batched:
+                hop_data = _process_all(_stream_batch.StreamBatch([stream]).process_hop)
+            else:
+                hop_data = [[data] for data in _process_all(stream.process_hop)]
+        stream.close()
+        return hop_data
+
+    for data, expected in zip(_process(True), _process(False)):
+        assert data[0][1] == pytest.approx(expected[0][1], abs=1e-4, nan_ok=True)
+
+
+def test_stream_batch_names_failed_stream(test_data_normal_path, stream_config):
+    streams = [
+        _create_stream(stream_config, test_data_normal_path, f"stream{index}")[0]
+        for index in range(2)
+    ]
+    batch = _stream_batch.StreamBatch(streams)
+
+    with mock.patch.object(
+        streams[1], "read_hop", side_effect=RuntimeError("connection lost")
+    ):
+        with pytest.raises(_errors.StreamFailedError) as error:
+            batch.process_hop()
+
+    for stream in streams:
+        stream.close()
+    assert error.value.stream_name == "stream1"
+    assert str(error.value) == ("Stream with name 'stream1' failed: connection lost")
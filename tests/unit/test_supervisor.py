@@ -0,0 +1,204 @@
+import contextlib
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Iterator, List
+
+import mock
+
+from stream_monitor import _supervisor
+
+
+class _FakeProcess:
+    created: List["_FakeProcess"] = list()
+
+    def __init__(self, target, args):
+        self.exitcode = None
+        self.pid = None
+        self.sentinel = None
+        _FakeProcess.created.append(self)
+
+    def start(self) -> None:
+        pass
+
+
+@contextlib.contextmanager
+def _fake_processes() -> Iterator[None]:
+    # Each test starts without the processes of the previous ones
+    _FakeProcess.created.clear()
+    with mock.patch("stream_monitor._supervisor._CONTEXT.Process", _FakeProcess):
+        yield
+
+
+def _crash() -> None:
+    sys.exit(1)
+
+
+def _run_until_stopped(started) -> None:
+    signal.signal(signal.SIGINT, lambda *args: sys.exit(0))
+    started.set()
+    while True:
+        time.sleep(0.01)
+
+
+def _ignore_stop(started) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    started.set()
+    while True:
+        time.sleep(0.01)
+
+
+def _report_files_and_crash(files) -> None:
+    # Which files this process has open, by device and inode
+    opened = list()
+    for fd in os.listdir("/proc/self/fd"):
+        with contextlib.suppress(OSError):
+            stat = os.fstat(int(fd))
+            opened.append((stat.st_dev, stat.st_ino))
+    files.put(opened)
+    sys.exit(1)
+
+
+def _crash_until_restart_due(supervisor):
+    # Crash the current process, and return the delay before it's restarted
+    _FakeProcess.created[-1].exitcode = 1
+    with mock.patch("stream_monitor._supervisor.random.uniform", return_value=1):
+        supervisor.check()
+
+    (supervised,) = supervisor._supervised
+    delay = round(supervised.restart_at - time.monotonic())
+
+    # Skip the wait
+    supervised.restart_at = time.monotonic()
+    supervisor.check()
+    return delay
+
+
+def test_supervisor_backs_off():
+    supervisor = _supervisor.Supervisor(
+        restart_delay=10, max_restart_delay=40, crash_loop_restarts=100
+    )
+    with _fake_processes():
+        supervisor.add(["stream"], _crash, ())
+        supervisor.start()
+        delays = [_crash_until_restart_due(supervisor) for _ in range(5)]
+
+    assert delays == [10, 20, 40, 40, 40]
+    snapshot = supervisor.metrics_snapshot()["stream"]
+    assert snapshot["restarts"] == 5
+    assert not snapshot["crash_looping"]
+    assert snapshot["uptime"] >= 0
+
+
+def test_supervisor_forgets_crashes_after_stable_uptime():
+    supervisor = _supervisor.Supervisor(restart_delay=10, stable_uptime=0)
+    with _fake_processes():
+        supervisor.add(["stream"], _crash, ())
+        supervisor.start()
+        delays = [_crash_until_restart_due(supervisor) for _ in range(3)]
+
+    assert delays == [10, 10, 10]
+
+
+def test_supervisor_detects_crash_loops():
+    supervisor = _supervisor.Supervisor(
+        restart_delay=10, max_restart_delay=100, crash_loop_restarts=3
+    )
+    with _fake_processes():
+        supervisor.add(["stream1", "stream2"], _crash, ())
+        supervisor.start()
+        delays = [_crash_until_restart_due(supervisor) for _ in range(4)]
+
+    # Restarted after the maximum delay once it's crash looping
+    assert delays == [10, 20, 100, 100]
+    snapshot = supervisor.metrics_snapshot()
+    assert snapshot["stream1"]["crash_looping"]
+    assert snapshot["stream2"]["crash_looping"]
+
+
+def test_supervisor_doesnt_restart_stopped_processes():
+    supervisor = _supervisor.Supervisor()
+    with _fake_processes():
+        supervisor.add(["stream"], _crash, ())
+        supervisor.start()
+        assert supervisor.running()
+
+        _FakeProcess.created[-1].exitcode = 0
+        supervisor.check()
+
+    assert not supervisor.running()
+    assert supervisor.metrics_snapshot()["stream"] == {
+        "uptime": 0.0,
+        "restarts": 0,
+        "crash_looping": False,
+    }
+
+
+def test_supervisor_restarts_only_crashed_processes():
+    supervisor = _supervisor.Supervisor(restart_delay=0.01)
+    started = supervisor.context.Event()
+    supervisor.add(["crashing"], _crash, ())
+    supervisor.add(["healthy"], _run_until_stopped, (started,))
+    supervisor.start()
+
+    deadline = time.monotonic() + 10
+    while supervisor.metrics_snapshot()["crashing"]["restarts"] < 2:
+        assert time.monotonic() < deadline
+        supervisor.check(timeout=0.1)
+    assert started.wait(10)
+
+    snapshot = supervisor.metrics_snapshot()
+    assert snapshot["healthy"]["restarts"] == 0
+    assert snapshot["healthy"]["uptime"] > 0
+
+    # The healthy process is asked to stop, and does
+    (healthy,) = [s for s in supervisor._supervised if s.stream_names == ["healthy"]]
+    supervisor.stop()
+    assert healthy.process.exitcode == 0
+    assert not supervisor.running()
+
+
+def test_supervisor_terminates_processes_that_dont_stop():
+    supervisor = _supervisor.Supervisor(stop_timeout=0.1)
+    started = supervisor.context.Event()
+    supervisor.add(["stream"], _ignore_stop, (started,))
+    supervisor.start()
+    assert started.wait(10)
+
+    supervisor.stop()
+    (supervised,) = supervisor._supervised
+    assert supervised.process.exitcode == -signal.SIGTERM
+
+
+def test_supervisor_restarts_without_inheriting_files():
+    supervisor = _supervisor.Supervisor(restart_delay=0.01)
+    files = supervisor.context.Queue()
+    supervisor.add(["stream"], _report_files_and_crash, (files,))
+    supervisor.start()
+    files.get(timeout=10)
+
+    # Once running, the supervising process serves sockets from threads (e.g.
+    # metrics), which processes restarted later must not hold on to
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 10
+        while supervisor.metrics_snapshot()["stream"]["restarts"] < 1:
+            assert time.monotonic() < deadline
+            supervisor.check(timeout=0.1)
+        opened = files.get(timeout=10)
+    finally:
+        supervisor.stop()
+        stop.set()
+        thread.join()
+        stat = os.fstat(server.fileno())
+        server.close()
+
+    assert (stat.st_dev, stat.st_ino) not in opened
@@ -0,0 +1,139 @@
+import wave
+
+import aubio
+import numpy
+import pytest
+
+from stream_monitor import _window
+
+
+def _contents(window):
+    return numpy.concatenate(window.views())
+
+
+def test_window_partially_filled():
+    window = _window.Window(8)
+    assert len(window) == 0
+    assert len(_contents(window)) == 0
+
+    window.write(numpy.arange(3, dtype=numpy.float32), 3)
+    assert len(window) == 3
+    numpy.testing.assert_array_equal(_contents(window), [0, 1, 2])
+
+
+def test_window_wraps_in_chronological_order():
+    window = _window.Window(8)
+    samples = numpy.arange(12, dtype=numpy.float32)
+    for start in range(0, 12, 3):
+        window.write(samples[start : start + 3], 3)
+
+    assert len(window) == 8
+    numpy.testing.assert_array_equal(_contents(window), numpy.arange(4, 12))
+
+
+def test_window_partial_hop():
+    window = _window.Window(8)
+    samples = numpy.arange(4, dtype=numpy.float32)
+    window.write(samples, 4)
+    window.write(samples + 4, 2)
+
+    numpy.testing.assert_array_equal(_contents(window), [0, 1, 2, 3, 4, 5])
+
+
+def test_window_views_do_not_copy():
+    window = _window.Window(8)
+    window.write(numpy.arange(10, dtype=numpy.float32), 10)
+
+    for view in window.views():
+        assert view.base is not None
+
+
+def test_window_write_larger_than_capacity():
+    window = _window.Window(4)
+    window.write(numpy.arange(10, dtype=numpy.float32), 10)
+
+    numpy.testing.assert_array_equal(_contents(window), [6, 7, 8, 9])
+
+
+def test_window_clear():
+    window = _window.Window(4)
+    window.write(numpy.arange(4, dtype=numpy.float32), 4)
+    window.clear()
+
+    assert len(window) == 0
+    window.write(numpy.ones(2, dtype=numpy.float32), 2)
+    numpy.testing.assert_array_equal(_contents(window), [1, 1])
+
+
+def _audio(sample_count):
+    # Noisy tone, with some samples out of range to check they wrap like aubio
+    generator = numpy.random.RandomState(0)
+    time = numpy.arange(sample_count) / 44100
+    samples = 0.5 * numpy.sin(2 * numpy.pi * 440 * time)
+    samples += 0.05 * generator.standard_normal(sample_count)
+    samples[::1000] = 1.2
+    return samples.astype(numpy.float32)
+
+
+def _wav_frames(path, samples):
+    with aubio.sink(str(path), 44100) as output:
+        for start in range(0, len(samples), 2048):
+            hop = samples[start : start + 2048]
+            output(hop, len(hop))
+    with wave.open(str(path)) as wav:
+        return wav.readframes(wav.getnframes())
+
+
+@pytest.mark.parametrize("storage", ["int16", "zlib"])
+def test_compact_window_clips_are_identical(storage, tmp_path):
+    samples = _audio(200000)
+    window = _window.create_window(storage, 150000)
+    expected = _window.create_window("float32", 150000)
+    for start in range(0, len(samples), 2048):
+        hop = samples[start : start + 2048]
+        window.write(hop, len(hop))
+        expected.write(hop, len(hop))
+
+    assert len(window) == len(expected) == 150000
+    assert window.samples().dtype == numpy.float32
+    assert _wav_frames(tmp_path / "window.wav", window.samples()) == _wav_frames(
+        tmp_path / "expected.wav", expected.samples()
+    )
+
+
+@pytest.mark.parametrize("storage", ["float32", "int16", "zlib"])
+def test_window_samples_partially_filled(storage):
+    window = _window.create_window(storage, 8)
+    window.write(numpy.array([0.5, -0.25, 0.125], dtype=numpy.float32), 3)
+
+    assert len(window) == 3
+    numpy.testing.assert_array_equal(window.samples(), [0.5, -0.25, 0.125])
+
+
+def test_compressed_window_blocks():
+    window = _window.CompressedWindow(10, block_size=4)
+    samples = numpy.arange(23, dtype=numpy.float32) / 32768
+    window.write(samples, 23)
+
+    numpy.testing.assert_array_equal(window.samples(), samples[-10:])
+
+    # Only the blocks holding the last ten samples are kept
+    assert len(window._blocks) == 3
+
+    window.clear()
+    assert len(window) == 0
+    assert len(window.samples()) == 0
+
+
+def test_compact_window_memory():
+    capacity = 30 * 44100
+    samples = _audio(capacity)
+    windows = {
+        storage: _window.create_window(storage, capacity)
+        for storage in ("float32", "int16", "zlib")
+    }
+    for window in windows.values():
+        window.write(samples, len(samples))
+
+    assert windows["int16"].nbytes == windows["float32"].nbytes / 2
+    assert windows["zlib"].nbytes < windows["int16"].nbytes